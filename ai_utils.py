@@ -5,8 +5,11 @@ from models import AISettings
 
 logger = logging.getLogger(__name__)
 
-def get_ai_response(message, conversation=None):
-    """Get a response from either OpenAI or Gemini."""
+def get_ai_response(message, conversation=None, timeout=None):
+    """Get a response from either OpenAI or Gemini.
+
+    `timeout` bounds the provider request in seconds.
+    """
     ai_settings = AISettings.query.first()
     if not ai_settings or not ai_settings.is_enabled:
         logger.warning("AI settings not found or AI is not enabled")
@@ -19,7 +22,9 @@ def get_ai_response(message, conversation=None):
             logger.warning("OpenAI API key is missing")
             return None
         try:
-            client = openai.OpenAI(api_key=ai_settings.openai_api_key)
+            # No retries when bounded, so the whole call fits in `timeout`
+            client_options = {'timeout': timeout, 'max_retries': 0} if timeout else {}
+            client = openai.OpenAI(api_key=ai_settings.openai_api_key, **client_options)
             messages = [{"role": "system", "content": ai_settings.system_prompt}]
             if conversation and conversation.is_active():
                 messages.extend(conversation.messages)
@@ -55,7 +60,8 @@ def get_ai_response(message, conversation=None):
             prompt = ai_settings.system_prompt + "\n\n" + "\n".join(messages) + "\n" + message
             
             logger.info(f"Sending request to Gemini with prompt: {prompt}")
-            response = model.generate_content(prompt)
+            request_options = {'timeout': timeout} if timeout else None
+            response = model.generate_content(prompt, request_options=request_options)
             
             if response and response.text:
                 result = response.text.strip()
@@ -2,7 +2,7 @@ from functools import wraps
 from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from models import User, BotSettings, AISettings, init_db, URLWatcherSettings, Module, ChannelManagementSettings
-from irc_bouncer import IRCBouncer, Channel
+from irc_bouncer import IRCBouncer
 from extensions import app, db, socketio, login_manager
 from flask_socketio import emit, join_room, leave_room
 import os
@@ -12,6 +12,8 @@ import openai
 import google.generativeai as genai
 from datetime import datetime
 from ai_utils import get_ai_response
+from history_store import MAX_PAGE_SIZE, get_history_store
+from scrollback import DEFAULT_DEPTH, MAX_DEPTH
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -92,7 +94,8 @@ def load_user(user_id):
 def index():
     settings = BotSettings.query.first()
     channels = settings.channels.split(',') if settings and settings.channels else []
-    return render_template('index.html', settings=settings, channels=channels)
+    stats = irc_bot.get_stats() if irc_bot else None
+    return render_template('index.html', settings=settings, channels=channels, stats=stats)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -154,6 +157,7 @@ def settings():
         settings.username = request.form.get('username')
         settings.realname = request.form.get('realname')
         settings.nickserv_password = request.form.get('nickserv_password')
+        settings.client_cert = request.form.get('client_cert') or None
         settings.channels = request.form.get('channels')
         db.session.commit()
         
@@ -182,7 +186,8 @@ def connect():
                 nick=settings.nick,
                 username=settings.username,
                 realname=settings.realname,
-                use_ssl=settings.use_ssl
+                use_ssl=settings.use_ssl,
+                client_cert=settings.client_cert
             )
             settings.is_connected = True
             db.session.commit()
@@ -352,9 +357,9 @@ def webchat_init():
         join_room(channel)
         emit('webchat_joined_channel', {'channel': channel})
         # Send users and messages
-        emit('webchat_users', {'users': irc_bot.webchat_channels[channel].get_users()})
+        emit('webchat_users', irc_bot.webchat_channels[channel].snapshot())
         emit('webchat_messages', {'messages': get_channel_messages(channel)})
-        emit('webchat_topic', {'topic': get_channel_topic(channel)})
+        emit('webchat_topic', {'topic': get_channel_topic(channel), 'channel': channel})
 
 @socketio.on('webchat_part_channel')
 def webchat_part_channel(data):
@@ -386,11 +391,7 @@ def webchat_open_query(data):
     if not irc_bot or not irc_bot.is_actually_connected() or not nick:
         return
     # Get private message history
-    pm_key = nick
-    messages = []
-    if hasattr(irc_bot, 'webchat_messages') and pm_key in irc_bot.webchat_messages:
-        messages = irc_bot.webchat_messages[pm_key]
-    emit('webchat_opened_query', {'nick': nick, 'messages': messages})
+    emit('webchat_opened_query', {'nick': nick, 'messages': get_channel_messages(nick)})
 
 @socketio.on('webchat_join_channel')
 def webchat_join_channel(data):
@@ -422,9 +423,9 @@ def webchat_join_channel(data):
     emit('webchat_joined_channel', {'channel': channel})
     # Request initial data for the channel
     if channel in irc_bot.webchat_channels:
-        emit('webchat_users', {'users': irc_bot.webchat_channels[channel].get_users()})
+        emit('webchat_users', irc_bot.webchat_channels[channel].snapshot())
         emit('webchat_messages', {'messages': get_channel_messages(channel)})
-        emit('webchat_topic', {'topic': get_channel_topic(channel)})
+        emit('webchat_topic', {'topic': get_channel_topic(channel), 'channel': channel})
 
 @socketio.on('webchat_send_message')
 def webchat_send_message(data):
@@ -446,14 +447,11 @@ def webchat_get_topic(data):
     global irc_bot
     if not irc_bot or not irc_bot.is_actually_connected() or not channel:
         return
-    # Get topic from local storage or request from server
-    topic = ''
-    if hasattr(irc_bot, 'topics') and channel in irc_bot.topics:
-        topic = irc_bot.topics[channel]
-    else:
-        # Request topic from server
-        irc_bot.connection.topic(channel)
-    emit('webchat_topic', {'topic': topic, 'channel': channel})
+    # Answer from channel state; only ask the server if we never learned the topic
+    chan = irc_bot.webchat_channels.get(channel)
+    if chan is not None and not chan.topic_known:
+        irc_bot.resync_channel(channel, topic=True)
+    emit('webchat_topic', {'topic': get_channel_topic(channel), 'channel': channel})
 
 @socketio.on('webchat_users_request')
 def webchat_users_request(data):
@@ -462,7 +460,7 @@ def webchat_users_request(data):
     if not irc_bot or not irc_bot.is_actually_connected() or not channel:
         return
     if channel in irc_bot.webchat_channels:
-        emit('webchat_users', {'users': irc_bot.webchat_channels[channel].get_users()})
+        emit('webchat_users', irc_bot.webchat_channels[channel].snapshot())
 
 @socketio.on('webchat_messages_request')
 def webchat_messages_request(data):
@@ -472,6 +470,13 @@ def webchat_messages_request(data):
         return
     emit('webchat_messages', {'messages': get_channel_messages(channel)})
 
+@socketio.on('webchat_history_request')
+def webchat_history_request(data):
+    channel = data.get('channel')
+    if not current_user.is_authenticated or not channel:
+        return
+    emit('webchat_history', get_history_page(channel, data.get('before'), data.get('after'), data.get('limit', 50)))
+
 @socketio.on('webchat_set_topic')
 def webchat_set_topic(data):
     channel = data.get('channel')
@@ -480,25 +485,37 @@ def webchat_set_topic(data):
     if not irc_bot or not irc_bot.is_actually_connected() or not channel:
         return
     logger.info(f"Setting topic for {channel}: {topic}")
-    # Send TOPIC command to IRC server
+    # Send TOPIC command to IRC server; its echo updates channel state and the webchat
     irc_bot.connection.topic(channel, topic)
-    # Update local topic storage
-    if hasattr(irc_bot, 'topics'):
-        irc_bot.topics[channel] = topic
-    # Emit topic update to all clients in the channel
-    emit('webchat_topic', {'topic': topic}, room=channel)
 
 # --- Helper functions for webchat ---
-def get_channel_messages(channel):
-    # You may want to store messages in IRCBouncer for this to work
-    if hasattr(irc_bot, 'webchat_messages') and channel in irc_bot.webchat_messages:
-        return irc_bot.webchat_messages[channel]
+def get_channel_messages(channel, limit=None):
+    # Serialises straight out of the scrollback ring buffer
+    if hasattr(irc_bot, 'webchat_messages'):
+        return list(irc_bot.webchat_messages.iter_messages(channel, limit))
     return []
 
+def get_history_page(channel, before=None, after=None, limit=50):
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        limit = 50
+    # Clamp as the store does, or a request over MAX_PAGE_SIZE would never see has_more
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    records = get_history_store().records(channel, before=before, after=after, limit=limit)
+    messages = [record.to_dict() for record in records]
+    return {
+        'channel': channel,
+        'messages': messages,
+        # A full page means there may be more in that direction
+        'has_more': len(messages) >= limit,
+        'before': messages[0]['cursor'] if messages else None,
+        'after': messages[-1]['cursor'] if messages else None
+    }
+
 def get_channel_topic(channel):
-    if hasattr(irc_bot, 'topics') and channel in irc_bot.topics:
-        return irc_bot.topics[channel]
-    return ''
+    chan = irc_bot.webchat_channels.get(channel) if irc_bot else None
+    return chan.topic if chan is not None else ''
 
 def now_str():
     return datetime.now().strftime('%H:%M:%S')
@@ -509,6 +526,19 @@ def now_str():
 #   from extensions import socketio
 #   socketio.emit('webchat_message', {...}, room=channel)
 
+@app.route('/history')
+@login_required
+def history():
+    channel = request.args.get('channel')
+    if not channel:
+        return jsonify({'error': 'channel is required'}), 400
+    return jsonify(get_history_page(
+        channel,
+        before=request.args.get('before'),
+        after=request.args.get('after'),
+        limit=request.args.get('limit', 50)
+    ))
+
 @app.route('/url_settings', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -547,11 +577,12 @@ def create_module():
     db.session.add(module)
     db.session.commit()
     
-    # Reload modules after creating a new one
+    # Load, unload or reload only the modules this changed
+    sync = None
     if irc_bot and hasattr(irc_bot, 'module_loader'):
-        irc_bot.module_loader.load_modules()
+        sync = irc_bot.module_loader.sync_modules()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'sync': sync})
 
 @app.route('/modules/<int:id>', methods=['GET'])
 @login_required
@@ -576,11 +607,12 @@ def update_module(id):
     module.code = data['code']
     db.session.commit()
     
-    # Reload modules after updating
+    # Load, unload or reload only the modules this changed
+    sync = None
     if irc_bot and hasattr(irc_bot, 'module_loader'):
-        irc_bot.module_loader.load_modules()
+        sync = irc_bot.module_loader.sync_modules()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'sync': sync})
 
 @app.route('/modules/<int:id>', methods=['DELETE'])
 @login_required
@@ -590,11 +622,12 @@ def delete_module(id):
     db.session.delete(module)
     db.session.commit()
     
-    # Reload modules after deletion
+    # Load, unload or reload only the modules this changed
+    sync = None
     if irc_bot and hasattr(irc_bot, 'module_loader'):
-        irc_bot.module_loader.load_modules()
+        sync = irc_bot.module_loader.sync_modules()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'sync': sync})
 
 @app.route('/modules/<int:id>/toggle', methods=['POST'])
 @login_required
@@ -604,11 +637,12 @@ def toggle_module(id):
     module.is_enabled = not module.is_enabled
     db.session.commit()
     
-    # Reload modules after toggling
+    # Load, unload or reload only the modules this changed
+    sync = None
     if irc_bot and hasattr(irc_bot, 'module_loader'):
-        irc_bot.module_loader.load_modules()
+        sync = irc_bot.module_loader.sync_modules()
     
-    return jsonify({'success': True})
+    return jsonify({'success': True, 'sync': sync})
 
 @app.route('/modules/generate', methods=['POST'])
 @login_required
@@ -656,7 +690,14 @@ def generate_module():
 5. To send messages, ALWAYS use self.bot.send_message(connection, channel, message) instead of connection.privmsg().
    This ensures messages appear in both IRC and the webchat interface.
 
-6. Important notes about command handling:
+6. For HTTP requests, use self.bot.http.get(url) / self.bot.http.post(url, ...) instead of requests.get() or a new requests.Session().
+   It is a shared requests session with pooled keep-alive connections and default timeouts.
+
+7. If handle_message only reacts to certain words or regexes, declare them as class attributes
+   keywords = ["word", ...] (case-insensitive substrings) and/or patterns = [r"regex", ...];
+   handle_message is then only called for messages that match one of them.
+
+8. Important notes about command handling:
    - The module loader automatically strips command prefixes (!@#) from commands
    - When checking commands in handle_command, use the command name without the prefix
    - Example: If trigger is set to "coffee" in database, handle_command will receive "coffee" (not "!coffee")
@@ -700,7 +741,14 @@ Keep the code concise and focused on the described functionality."""},
 5. To send messages, ALWAYS use self.bot.send_message(connection, channel, message) instead of connection.privmsg().
    This ensures messages appear in both IRC and the webchat interface.
 
-6. Important notes about command handling:
+6. For HTTP requests, use self.bot.http.get(url) / self.bot.http.post(url, ...) instead of requests.get() or a new requests.Session().
+   It is a shared requests session with pooled keep-alive connections and default timeouts.
+
+7. If handle_message only reacts to certain words or regexes, declare them as class attributes
+   keywords = ["word", ...] (case-insensitive substrings) and/or patterns = [r"regex", ...];
+   handle_message is then only called for messages that match one of them.
+
+8. Important notes about command handling:
    - The module loader automatically strips command prefixes (!@#) from commands
    - When checking commands in handle_command, use the command name without the prefix
    - Example: If trigger is set to "coffee" in database, handle_command will receive "coffee" (not "!coffee")
@@ -753,6 +801,11 @@ def update_channel_management():
     flood_threshold = int(request.form.get('flood_threshold', 8))
     flood_timeframe = int(request.form.get('flood_timeframe', 60))
     caps_percentage = int(request.form.get('caps_percentage', 70))
+    try:
+        history_depth = int(request.form.get('history_depth', DEFAULT_DEPTH))
+    except (TypeError, ValueError):
+        history_depth = DEFAULT_DEPTH
+    history_depth = max(1, min(history_depth, MAX_DEPTH))
     
     settings = ChannelManagementSettings.query.filter_by(channel=channel).first()
     if not settings:
@@ -763,16 +816,23 @@ def update_channel_management():
     settings.flood_threshold = flood_threshold
     settings.flood_timeframe = flood_timeframe
     settings.caps_percentage = caps_percentage
+    settings.history_depth = history_depth
     
+    # Committing invalidates the bot's channel settings cache
     db.session.commit()
     
-    # Reload settings in the bot
-    global irc_bot
-    if irc_bot:
-        irc_bot.reload_channel_settings()
-    
     return jsonify({'success': True})
 
+@app.route('/stats')
+@login_required
+@admin_required
+def stats():
+    if not irc_bot:
+        return jsonify({'connected': False})
+    data = irc_bot.get_stats()
+    data['connected'] = irc_bot.is_actually_connected()
+    return jsonify(data)
+
 if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == 'initdb':
@@ -0,0 +1,71 @@
+"""Time "which users does this ban hit" on a 5k-user channel.
+
+"naive" is the old _match_ban_mask: a regex rebuilt from the mask with
+str.replace for every nick, matching nicks only. "compiled" is
+BanList.hits: the mask is compiled once (cached) and matched against
+case-folded nick!user@host.
+
+Run from the repository root:  python benchmarks/bench_ban_match.py
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel_state import ChannelRegistry
+
+ROUNDS = 20
+USERS = 5000
+MASKS = [
+    '*!*@*.example.com',
+    'Guest*!*@*',
+    '*!~bad?user@*',
+    '*!*@192.168.1.*',
+    'user04999!*@*',
+]
+
+
+def make_channel(users):
+    registry = ChannelRegistry()
+    channel = registry.add('#big')
+    channel.reset({f"User{i:05d}": '' for i in range(users)})
+    for i, user in enumerate(channel.members.values()):
+        user.user = f"~ident{i % 97}"
+        user.host = f"host{i}.example.com" if i % 3 else f"192.168.{i % 4}.{i % 250}"
+    return channel
+
+
+def naive_hits(mask, users):
+    hits = []
+    for user in users:
+        pattern = mask.replace('*', '.*').replace('?', '.')
+        try:
+            if re.match(pattern, user.nick, re.IGNORECASE):
+                hits.append(user)
+        except re.error:
+            pass
+    return hits
+
+
+def measure(func, mask, users):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = func(mask, users)
+    return result, (time.perf_counter() - start) / ROUNDS
+
+
+def main():
+    channel = make_channel(USERS)
+    users = list(channel.members.values())
+    print(f"{USERS} users")
+    print(f"{'mask':<22} {'method':<10} {'time ms':>10} {'hits':>6}")
+    for mask in MASKS:
+        for label, func in (('naive', naive_hits), ('compiled', channel.bans.hits)):
+            result, elapsed = measure(func, mask, users)
+            print(f"{mask:<22} {label:<10} {elapsed * 1000:>10.2f} {len(result):>6}")
+
+
+if __name__ == '__main__':
+    main()
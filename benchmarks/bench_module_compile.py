@@ -0,0 +1,93 @@
+"""Cold-start cost of loading a large set of database-stored modules.
+
+"source" is the old load path: exec() of the raw source text, which
+compiles every module on every start. "cache cold" goes through
+CompileCache with an empty cache directory (compile plus writing the
+marshalled code), "cache warm" is every later start, which only unmarshals
+the stored code objects. Each run executes the module body and
+instantiates its Module class, like ModuleLoader does.
+
+Run from the repository root:  python benchmarks/bench_module_compile.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compile_cache import CompileCache
+
+ROUNDS = 3
+MODULES = 300
+HANDLERS = 25  # Extra command handlers per module, for a few hundred lines each
+
+TEMPLATE = open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'templates', 'module_template.py')).read()
+
+
+def make_source(index):
+    handlers = []
+    for i in range(HANDLERS):
+        handlers.append(f'''
+    def command_{i}(self, connection, channel, nick, args):
+        """Answer !cmd{index}_{i}."""
+        if not args:
+            self.bot.send_message(connection, channel, f"{{nick}}: usage: !cmd{index}_{i} <text>")
+            return
+        words = [word.strip(".,!?") for word in args if word]
+        counts = {{}}
+        for word in words:
+            counts[word.lower()] = counts.get(word.lower(), 0) + 1
+        top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:3]
+        self.bot.send_message(connection, channel, ", ".join(f"{{w}}={{c}}" for w, c in top))
+''')
+    return TEMPLATE + f"\n\nclass Extra{index}(Module):\n" + ''.join(handlers)
+
+
+def load(code):
+    module_obj = types.ModuleType('bench_module')
+    exec(code, module_obj.__dict__)
+    return module_obj.Module(None)
+
+
+def from_source(sources, cache):
+    for filename, source in sources:
+        load(source)
+
+
+def from_cache(sources, cache):
+    for filename, source in sources:
+        load(cache.compile(source, filename))
+
+
+def measure(func, sources, cache):
+    start = time.perf_counter()
+    func(sources, cache)
+    return time.perf_counter() - start
+
+
+def main():
+    sources = [(f"<module_{i}>", make_source(i)) for i in range(MODULES)]
+    lines = sum(source.count('\n') for _, source in sources)
+    print(f"{MODULES} modules, {lines} lines of source")
+    print(f"{'method':<12} {'ms':>10}")
+    results = {'source': [], 'cache cold': [], 'cache warm': []}
+    for _ in range(ROUNDS):
+        directory = tempfile.mkdtemp(prefix='module_cache_')
+        try:
+            results['source'].append(measure(from_source, sources, None))
+            cache = CompileCache(directory)
+            results['cache cold'].append(measure(from_cache, sources, cache))
+            cache = CompileCache(directory)  # A restart: new process state, same directory
+            results['cache warm'].append(measure(from_cache, sources, cache))
+        finally:
+            shutil.rmtree(directory)
+    for label, times in results.items():
+        print(f"{label:<12} {min(times) * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Per-message module dispatch cost as the number of keyword modules grows.
+
+"scan" is the old contract: every module's handle_message is called for
+every line and runs its own `"word" in message.lower()` check. "declared"
+has the same modules declare `keywords = ["word"]` instead, so the loader
+finds the few modules to call with one Aho-Corasick pass over the line.
+Messages are ordinary chat lines; one in ten contains a module's keyword.
+
+Run from the repository root:  python benchmarks/bench_module_dispatch.py
+"""
+import contextlib
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from module_loader import ModuleLoader
+
+MESSAGES = 2000
+MODULE_COUNTS = (10, 100, 500)
+WORDS = ['the', 'build', 'is', 'green', 'again', 'anyone', 'seen', 'my', 'keys', 'lunch', 'at', 'noon',
+         'deploy', 'went', 'fine', 'thanks', 'for', 'help', 'see', 'you', 'tomorrow', 'ok']
+
+
+class QuietQueue:
+    def lane(self, name):
+        return contextlib.nullcontext()
+
+
+class Bot:
+    def __init__(self):
+        self.send_queue = QuietQueue()
+        self.sent = 0
+
+    def send_message(self, connection, channel, message):
+        self.sent += 1
+
+
+class BenchLoader(ModuleLoader):
+    def load_modules(self):
+        pass
+
+    def _submit(self, hook, module_id, name, handler, *args):
+        # Call inline rather than on the worker pool so only dispatch is measured
+        handler(*args)
+
+
+def scan_module(bot, keyword):
+    class Module:
+        def handle_message(self, connection, event, channel, nick, message):
+            if keyword in message.lower():
+                bot.send_message(connection, channel, keyword)
+    return Module()
+
+
+def declared_module(bot, keyword):
+    class Module:
+        keywords = [keyword]
+
+        def handle_message(self, connection, event, channel, nick, message):
+            bot.send_message(connection, channel, keyword)
+    return Module()
+
+
+class Event:
+    def __init__(self, message):
+        self.target = '#chat'
+        self.source = self
+        self.nick = 'alice'
+        self.arguments = [message]
+
+
+def make_loader(factory, count):
+    bot = Bot()
+    loader = BenchLoader(bot)
+    for module_id in range(count):
+        loader.loaded_modules[module_id] = factory(bot, f"kw{module_id:04d}")
+        loader.module_names[module_id] = f"module {module_id}"
+    loader.rebuild_dispatch()
+    return loader, bot
+
+
+def make_messages(count):
+    rng = random.Random(7)
+    messages = []
+    for i in range(MESSAGES):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(4, 14))]
+        if i % 10 == 0:
+            words.insert(rng.randrange(len(words)), f"kw{rng.randrange(count):04d}")
+        messages.append(' '.join(words))
+    return [Event(message) for message in messages]
+
+
+def measure(loader, events):
+    start = time.perf_counter()
+    for event in events:
+        loader.handle_message(None, event)
+    return (time.perf_counter() - start) / len(events)
+
+
+def main():
+    logging.disable(logging.INFO)
+    print(f"{MESSAGES} messages per run")
+    print(f"{'modules':>8} {'method':<10} {'us/message':>12} {'replies':>8}")
+    for count in MODULE_COUNTS:
+        events = make_messages(count)
+        for label, factory in (('scan', scan_module), ('declared', declared_module)):
+            loader, bot = make_loader(factory, count)
+            elapsed = measure(loader, events)
+            print(f"{count:>8} {label:<10} {elapsed * 1e6:>12.1f} {bot.sent:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Compare NAMES handling for a 10k-user channel.
+
+"per-chunk" mirrors the old on_namreply: every 353 line logged its
+arguments, replaced the whole userlist (so only the last chunk survived)
+and emitted a full snapshot. "merged" is the same handler fixed to add
+each chunk's users one by one instead, which is correct but logs every
+user and re-sends a growing snapshot per line. "staged" accumulates the
+chunks and swaps them in once on 366, with one log line and one snapshot.
+
+Run from the repository root:  python benchmarks/bench_names.py
+"""
+import gc
+import json
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import channel_state
+from channel_state import ChannelRegistry
+
+ROUNDS = 5
+USERS = 10000
+LINE_BYTES = 400  # Roughly what servers fit into one 353 line
+PREFIX = OrderedDict([('~', 'q'), ('&', 'a'), ('@', 'o'), ('%', 'h'), ('+', 'v')])
+
+logger = logging.getLogger('bench_names')
+
+
+class CountingStream:
+    """Write target for a StreamHandler formatted like the app's basicConfig."""
+
+    def __init__(self):
+        self.records = 0
+        self.bytes = 0
+
+    def write(self, text):
+        self.records += text.count('\n')
+        self.bytes += len(text)
+
+    def flush(self):
+        pass
+
+
+def make_chunks(users):
+    prefixes = ['', '', '', '', '+', '@', '@+', '%']
+    chunks, line = [], []
+    size = 0
+    for i in range(users):
+        entry = f"{prefixes[i % len(prefixes)]}user{i:05d}"
+        if size + len(entry) + 1 > LINE_BYTES:
+            chunks.append(' '.join(line))
+            line, size = [], 0
+        line.append(entry)
+        size += len(entry) + 1
+    if line:
+        chunks.append(' '.join(line))
+    return chunks
+
+
+def per_chunk(chunks):
+    users = {}
+    for chunk in chunks:
+        logger.info("Received NAMES list for #big")
+        logger.info(f"NAMES list arguments: {['=', '#big', chunk]}")
+        users = {}
+        for nick in chunk.split():
+            mode = ""
+            if nick[0] in '~&@%+':
+                mode = nick[0]
+                nick = nick[1:]
+            users[nick] = mode
+        logger.info(f"Replacing userlist for #big with {len(users)} users")
+        json.dumps({'channel': '#big', 'users': [{'nick': n, 'mode': m} for n, m in users.items()]})
+    return len(users)
+
+
+def merged(chunks):
+    channel = ChannelRegistry().add('#big')
+    for chunk in chunks:
+        logger.info("Received NAMES list for #big")
+        logger.info(f"NAMES list arguments: {['=', '#big', chunk]}")
+        for nick in chunk.split():
+            mode = ""
+            if nick[0] in '~&@%+':
+                mode = nick[0]
+                nick = nick[1:]
+            channel.add_user(nick, mode)
+        json.dumps(channel.snapshot())
+    return len(channel.members)
+
+
+def staged(chunks):
+    channel = ChannelRegistry().add('#big')
+    for chunk in chunks:
+        channel.stage_names(chunk, PREFIX)
+    channel.finish_names()
+    logger.info(f"Received NAMES list for #big: {len(channel.members)} users")
+    json.dumps(channel.snapshot())
+    return len(channel.members)
+
+
+def measure(func, chunks):
+    stream = CountingStream()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    for log in (logger, channel_state.logger):
+        log.addHandler(handler)
+    gc.collect()
+    start = time.process_time()
+    for _ in range(ROUNDS):
+        result = func(chunks)
+    elapsed = (time.process_time() - start) / ROUNDS
+    for log in (logger, channel_state.logger):
+        log.removeHandler(handler)
+    return result, elapsed, stream.records // ROUNDS, stream.bytes // ROUNDS
+
+
+def main():
+    for log in (logger, channel_state.logger):
+        log.setLevel(logging.DEBUG)  # app.py runs with basicConfig(level=DEBUG)
+        log.propagate = False
+    chunks = make_chunks(USERS)
+    print(f"{USERS} users in {len(chunks)} RPL_NAMREPLY lines")
+    print(f"{'method':<12} {'cpu ms':>10} {'log lines':>10} {'log KB':>10}  users kept")
+    for label, func in (('per-chunk', per_chunk), ('merged', merged), ('staged', staged)):
+        result, elapsed, records, size = measure(func, chunks)
+        print(f"{label:<12} {elapsed * 1000:>10.2f} {records:>10} {size / 1024:>10.1f}  {result}")
+
+
+if __name__ == '__main__':
+    main()
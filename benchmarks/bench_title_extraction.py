@@ -0,0 +1,75 @@
+"""Compare streaming title extraction with parsing the whole page in BeautifulSoup.
+
+Run from the repository root:  python benchmarks/bench_title_extraction.py
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from title_extractor import CHUNK_SIZE, extract_title
+
+ROUNDS = 3
+
+
+def make_page(body_bytes, title_in_head=True):
+    head = '<html><head><meta charset="utf-8">'
+    title = '<title>Benchmark page &amp; friends</title>'
+    row = '<div class="row"><p>Lorem ipsum dolor sit amet, <a href="/x">link</a></p></div>\n'
+    rows = row * (body_bytes // len(row))
+    if title_in_head:
+        page = f"{head}{title}</head><body>{rows}</body></html>"
+    else:
+        page = f"{head}</head><body>{rows}{title}</body></html>"
+    return page.encode('utf-8')
+
+
+def chunks(data):
+    for i in range(0, len(data), CHUNK_SIZE):
+        yield data[i:i + CHUNK_SIZE]
+
+
+def soup_title(data):
+    body = bytearray()
+    for chunk in chunks(data):
+        body += chunk
+    tag = BeautifulSoup(bytes(body), 'html.parser').find('title')
+    return tag.get_text().strip() if tag else None
+
+
+def streaming_title(data):
+    return extract_title(chunks(data))
+
+
+def measure(func, data):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = func(data)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    cases = [
+        ('100 KB page', make_page(100 * 1024)),
+        ('2 MB page', make_page(2 * 1024 * 1024)),
+        ('5 MB page', make_page(5 * 1024 * 1024)),
+        ('2 MB page, title at end', make_page(2 * 1024 * 1024, title_in_head=False)),
+    ]
+    print(f"{'case':<26} {'method':<12} {'time ms':>10} {'peak KB':>10}  title")
+    for name, data in cases:
+        for label, func in (('streaming', streaming_title), ('soup', soup_title)):
+            result, elapsed, peak = measure(func, data)
+            print(f"{name:<26} {label:<12} {elapsed * 1000:>10.2f} {peak / 1024:>10.0f}  {result!r}")
+
+
+if __name__ == '__main__':
+    main()
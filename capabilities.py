@@ -0,0 +1,220 @@
+import base64
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CAP_TIMEOUT = 15  # Seconds registration may be held for CAP/SASL before we send CAP END
+SASL_CHUNK = 400  # AUTHENTICATE payloads are sent in pieces of this many bytes
+
+# Requested whenever offered: they let channel and user state come from the
+# messages themselves instead of follow-up WHO/NAMES queries
+WANTED_CAPS = {'server-time', 'multi-prefix', 'away-notify', 'extended-join',
+               'userhost-in-names', 'chghost', 'account-notify', 'cap-notify'}
+
+# SASL numerics that end an attempt with the current mechanism
+SASL_FAILURES = {'902': 'nick locked', '904': 'authentication failed', '905': 'message too long',
+                 '906': 'aborted'}
+
+
+def server_time(event):
+    """Return the event's server-time tag as a Unix timestamp, or None."""
+    for tag in event.tags or ():
+        if tag.get('key') == 'time' and tag.get('value'):
+            try:
+                return datetime.fromisoformat(tag['value'].replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                return None
+    return None
+
+
+def parse_caps(text):
+    """Parse "a b=c -d" into {name: value}; a leading '-' is kept on the name."""
+    caps = {}
+    for token in text.split():
+        name, _, value = token.partition('=')
+        caps[name] = value or None
+    return caps
+
+
+class CapNegotiator:
+    """IRCv3 capability negotiation (CAP LS 302) and SASL during registration.
+
+    connecting() arranges for CAP LS 302 to go out before NICK/USER, which
+    makes the server hold registration until we send CAP END. Offered caps
+    from `wanted` are requested, and if the server offers sasl and we have
+    credentials we authenticate with EXTERNAL (client certificate) and/or
+    PLAIN before 001. `sasl_result` tells the welcome handler whether the
+    NickServ fallback is still needed.
+    """
+
+    def __init__(self, bot, wanted=()):
+        self.bot = bot
+        self.wanted = set(wanted)  # Caps requested whenever the server offers them
+        self.available = {}  # {cap: value} from CAP LS / NEW
+        self.enabled = set()
+        self.negotiating = False
+        self.generation = 0
+        self.account = None
+        self.password = None
+        self.mechanisms = []  # SASL mechanisms still to try, in order
+        self.mechanism = None
+        self.sasl_result = None  # None, 'success' or 'failed'
+        self.last_error = None
+        self.outstanding = 0  # CAP REQs not yet ACKed or NAKed
+
+    def connecting(self, account=None, password=None, external=False):
+        """Prepare negotiation for a new connection attempt."""
+        self.generation += 1
+        self.available = {}
+        self.enabled = set()
+        self.negotiating = True
+        self.account = account
+        self.password = password
+        self.mechanisms = (['EXTERNAL'] if external else []) + (['PLAIN'] if account and password else [])
+        self.mechanism = None
+        self.sasl_result = None
+        self.last_error = None
+        self.outstanding = 0
+        self.bot.send_queue.before_registration('CAP LS 302')
+        generation = self.generation
+        self.bot.reactor.scheduler.execute_after(CAP_TIMEOUT, lambda: self._timeout(generation))
+
+    def has(self, cap):
+        return cap in self.enabled
+
+    def on_cap(self, connection, event):
+        """Handle a CAP reply; event.arguments is [subcommand, ...]."""
+        if not event.arguments:
+            return
+        subcommand = event.arguments[0].upper()
+        more = len(event.arguments) > 2 and event.arguments[1] == '*'
+        caps = parse_caps(event.arguments[-1] if len(event.arguments) > 1 else '')
+        if subcommand == 'LS':
+            self.available.update(caps)
+            if not more:
+                self._request(connection, self.available)
+        elif subcommand == 'NEW':
+            self.available.update(caps)
+            self._request(connection, caps)
+        elif subcommand == 'DEL':
+            for cap in caps:
+                self.available.pop(cap, None)
+                self.enabled.discard(cap)
+        elif subcommand == 'ACK':
+            if not more:
+                self.outstanding = max(0, self.outstanding - 1)
+            for cap in caps:
+                if cap.startswith('-'):
+                    self.enabled.discard(cap[1:])
+                else:
+                    self.enabled.add(cap)
+            logger.info(f"Enabled capabilities: {', '.join(sorted(self.enabled)) or 'none'}")
+            if 'sasl' in caps and self.negotiating:
+                self._next_mechanism(connection)
+            elif not more:
+                self._maybe_end(connection)
+        elif subcommand == 'NAK':
+            self.outstanding = max(0, self.outstanding - 1)
+            logger.warning(f"Server refused capabilities: {' '.join(caps)}")
+            retry = [cap for cap in caps if cap != 'sasl' or self.negotiating]
+            if len(caps) > 1 and retry:
+                # CAP REQ is all-or-nothing: ask for each cap on its own so one refusal
+                # does not lose the rest; sasl goes last so the others are settled first
+                for cap in sorted(retry, key=lambda cap: cap == 'sasl'):
+                    self._send_request(connection, [cap])
+            else:
+                self._maybe_end(connection)
+
+    def _request(self, connection, offered):
+        wanted = [cap for cap in offered if cap in self.wanted and cap not in self.enabled]
+        if self.negotiating and self._sasl_usable(offered):
+            wanted.append('sasl')
+        if wanted:
+            self._send_request(connection, wanted)
+        else:
+            self._maybe_end(connection)
+
+    def _send_request(self, connection, caps):
+        self.outstanding += 1
+        connection.send_raw(f"CAP REQ :{' '.join(caps)}")
+
+    def _sasl_usable(self, offered):
+        if 'sasl' not in offered or not self.mechanisms:
+            return False
+        advertised = offered['sasl']  # CAP 302 lists the mechanisms, e.g. sasl=PLAIN,EXTERNAL
+        if advertised:
+            self.mechanisms = [m for m in self.mechanisms if m in advertised.upper().split(',')]
+        return bool(self.mechanisms)
+
+    def _next_mechanism(self, connection):
+        if not self.mechanisms:
+            self.sasl_result = 'failed'
+            self.mechanism = None
+            self._maybe_end(connection)
+            return
+        self.mechanism = self.mechanisms.pop(0)
+        logger.info(f"Starting SASL {self.mechanism} authentication")
+        connection.send_raw(f"AUTHENTICATE {self.mechanism}")
+
+    def on_authenticate(self, connection, event):
+        """The server is ready for our SASL payload ("AUTHENTICATE +")."""
+        if event.target != '+' or not self.mechanism:
+            return
+        if self.mechanism == 'EXTERNAL':
+            connection.send_raw('AUTHENTICATE +')
+            return
+        credentials = f"{self.account}\0{self.account}\0{self.password}".encode('utf-8')
+        payload = base64.b64encode(credentials).decode('ascii')
+        for i in range(0, len(payload), SASL_CHUNK):
+            connection.send_raw(f"AUTHENTICATE {payload[i:i + SASL_CHUNK]}")
+        if len(payload) % SASL_CHUNK == 0:
+            connection.send_raw('AUTHENTICATE +')
+
+    def sasl_success(self, connection):
+        """903 RPL_SASLSUCCESS (or 907, already authenticated)."""
+        logger.info(f"SASL {self.mechanism} authentication succeeded")
+        self.sasl_result = 'success'
+        self.mechanism = None
+        self._maybe_end(connection)
+
+    def sasl_failed(self, connection, numeric, message=''):
+        """One of SASL_FAILURES: try the next mechanism or give up."""
+        if self.mechanism is None:
+            return
+        self.last_error = f"{self.mechanism}: {message or SASL_FAILURES.get(numeric, numeric)}"
+        logger.warning(f"SASL {self.last_error}")
+        self._next_mechanism(connection)
+
+    def _maybe_end(self, connection):
+        """End negotiation once every CAP REQ is answered and no SASL attempt is running."""
+        if self.outstanding == 0 and self.mechanism is None:
+            self._end(connection)
+
+    def _end(self, connection):
+        if self.negotiating:
+            self.negotiating = False
+            connection.send_raw('CAP END')
+
+    def _timeout(self, generation):
+        if generation == self.generation and self.negotiating:
+            logger.warning(f"Capability negotiation not finished after {CAP_TIMEOUT}s, ending it")
+            if self.mechanism:
+                self.sasl_result = 'failed'
+                self.mechanism = None
+            try:
+                self._end(self.bot.connection)
+            except Exception as e:
+                logger.error(f"Error ending capability negotiation: {e}")
+
+    def registered(self):
+        """001 arrived: whatever was not negotiated by now is not coming."""
+        self.negotiating = False
+        self.mechanism = None
+
+    def get_stats(self):
+        return {
+            'enabled': sorted(self.enabled),
+            'sasl': self.sasl_result,
+            'sasl_error': self.last_error
+        }
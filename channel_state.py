@@ -0,0 +1,571 @@
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# CHANMODES when the server does not advertise them: list, always-arg, set-arg, no-arg
+DEFAULT_CHANMODES = ['beI', 'k', 'l', 'imnpst']
+
+_UPPER = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_LOWER = 'abcdefghijklmnopqrstuvwxyz'
+# ISUPPORT CASEMAPPING values: the RFC 1459 ones also fold []\~ to {}|^
+CASEMAPPINGS = {
+    'ascii': str.maketrans(_UPPER, _LOWER),
+    'strict-rfc1459': str.maketrans(_UPPER + '[]\\', _LOWER + '{}|'),
+    'rfc1459': str.maketrans(_UPPER + '[]\\~', _LOWER + '{}|^'),
+}
+DEFAULT_CASEMAPPING = 'rfc1459'
+
+RESYNC_RATE = 0.5  # TOPIC/NAMES resync requests sent per second
+RESYNC_BURST = 3  # Resync requests allowed to go out back to back
+MATCHER_CACHE_SIZE = 4096  # Compiled ban masks kept across all channels
+
+
+def irc_lower(name, casemapping=DEFAULT_CASEMAPPING):
+    """Fold a nick or channel name the way the server compares them."""
+    return name.translate(CASEMAPPINGS.get(casemapping, CASEMAPPINGS[DEFAULT_CASEMAPPING]))
+
+
+def parse_modes(modes, args, features):
+    """Yield (sign, mode, argument) for a channel MODE change.
+
+    Which modes take an argument comes from the server's PREFIX and
+    CHANMODES, so halfop, owner and admin modes are handled too.
+    """
+    chanmodes = getattr(features, 'chanmodes', None) or DEFAULT_CHANMODES
+    always = set(features.prefix.values()) | set(''.join(chanmodes[:2]))
+    when_set = set(chanmodes[2]) if len(chanmodes) > 2 else set()
+    args = iter(args)
+    sign = '+'
+    for mode in modes:
+        if mode in '+-':
+            sign = mode
+            continue
+        argument = None
+        if mode in always or (sign == '+' and mode in when_set):
+            argument = next(args, None)
+        yield sign, mode, argument
+
+
+def parse_names(names, ranks):
+    """Yield (nick, prefixes, user@host or '') for the entries of a 353 reply.
+
+    Handles multi-prefix entries such as "@+nick" and userhost-in-names
+    entries such as "@nick!user@host"; prefixes come back in the server's
+    rank order (`ranks`, highest first).
+    """
+    prefix_chars = ''.join(ranks)
+    for entry in names.split():
+        nick = entry.lstrip(prefix_chars)
+        mode = entry[:len(entry) - len(nick)]
+        if len(mode) > 1:
+            mode = ''.join(p for p in ranks if p in mode)
+        nick, _, userhost = nick.partition('!')
+        if nick:
+            yield nick, mode, userhost
+
+
+def normalize_mask(mask):
+    """Expand a short ban mask to nick!user@host form, as servers do."""
+    if '!' not in mask and '@' not in mask:
+        if '.' in mask or ':' in mask:
+            return f"*!*@{mask}"
+        return f"{mask}!*@*"
+    if '!' not in mask:
+        return f"*!{mask}"
+    if '@' not in mask:
+        return f"{mask}@*"
+    return mask
+
+
+def _fold_pairs(table):
+    """{char: its non-letter equivalent} for a casemapping, in both directions."""
+    pairs = {}
+    for upper, lower in table.items():
+        upper = chr(upper)
+        lower = lower if isinstance(lower, str) else chr(lower)
+        if not upper.isalpha():
+            pairs[upper] = lower
+            pairs[lower] = upper
+    return pairs
+
+
+FOLD_PAIRS = {name: _fold_pairs(table) for name, table in CASEMAPPINGS.items()}
+
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def compile_mask(mask, casemapping=DEFAULT_CASEMAPPING):
+    """Compile a ban mask into a match function over nick!user@host strings.
+
+    `*` matches any run of characters and `?` exactly one; everything else
+    is literal and compared using `casemapping`, so hostmasks are matched
+    as-is without folding each one. Extended bans ($a:..., ~a:...) are not
+    hostmasks and get a matcher that never matches.
+    """
+    if mask[:1] in '$~' and ':' in mask[:4]:
+        return lambda hostmask: False
+    pairs = FOLD_PAIRS.get(casemapping, FOLD_PAIRS[DEFAULT_CASEMAPPING])
+    pattern = []
+    for c in normalize_mask(mask):
+        if c == '*':
+            pattern.append('.*')
+        elif c == '?':
+            pattern.append('.')
+        elif c in pairs:
+            pattern.append(f"[{re.escape(c)}{re.escape(pairs[c])}]")
+        else:
+            pattern.append(re.escape(c))
+    return re.compile(''.join(pattern) + r'\Z', re.IGNORECASE | re.ASCII | re.DOTALL).match
+
+
+class BanList:
+    """A channel's +b list, kept from MODE +b/-b and 367/368 replies."""
+
+    def __init__(self, registry):
+        self.registry = registry
+        self.bans = {}  # {mask: (set_by, set_at)}
+        self.pending = None  # Bans staged from 367 until 368
+        self.synced = False  # True once a full list has been received
+
+    def add(self, mask, set_by=None, set_at=None):
+        self.bans[mask] = (set_by, set_at)
+
+    def remove(self, mask):
+        return self.bans.pop(mask, None) is not None
+
+    def stage(self, mask, set_by=None, set_at=None):
+        """One RPL_BANLIST (367) entry."""
+        if self.pending is None:
+            self.pending = {}
+        self.pending[mask] = (set_by, set_at)
+
+    def finish(self):
+        """RPL_ENDOFBANLIST (368): swap the staged list in."""
+        self.bans, self.pending = self.pending or {}, None
+        self.synced = True
+
+    def matcher(self, mask):
+        return compile_mask(mask, self.registry.casemapping)
+
+    def hits(self, mask, users):
+        """The users among `users` whose tracked hostmask `mask` matches."""
+        match = self.matcher(mask)
+        return [user for user in users if user.host and match(user.hostmask)]
+
+    def is_banned(self, user):
+        """The first ban matching `user`, or None."""
+        if not user.host:
+            return None
+        hostmask = user.hostmask
+        for mask in list(self.bans):
+            if self.matcher(mask)(hostmask):
+                return mask
+        return None
+
+    def __len__(self):
+        return len(self.bans)
+
+    def __contains__(self, mask):
+        return mask in self.bans
+
+
+class User:
+    """A nick we share at least one channel with."""
+
+    __slots__ = ('nick', 'channels', 'user', 'host', 'account', 'realname', 'away')
+
+    def __init__(self, nick):
+        self.nick = nick
+        self.channels = {}  # {Channel: prefixes, highest rank first}
+        self.user = None
+        self.host = None
+        self.account = None  # Services account, from extended-join/account-notify/WHO
+        self.realname = None
+        self.away = None  # Away message ('' if not known) while away, from away-notify/WHO
+
+    @property
+    def hostmask(self):
+        """nick!user@host, or None until we have seen the user's host."""
+        return f"{self.nick}!{self.user}@{self.host}" if self.host else None
+
+
+class Channel:
+    """A class to represent an IRC channel and its users.
+
+    Members are User entries of the registry's global user table, keyed by
+    case-folded nick. Every change to the member list bumps `version` and
+    returns a delta ({'op', 'version', ...}) for the webchat, which applies
+    deltas in order and asks for a full snapshot() when it sees a gap.
+    """
+
+    def __init__(self, name, registry):
+        self.name = name
+        self.registry = registry
+        self.members = {}  # {folded nick: User}
+        self.version = 0
+        self.pending_names = None  # {nick: prefixes} staged from 353 until 366
+        self.pending_hosts = {}  # {nick: user@host} from userhost-in-names
+        self.synced = False  # True once a complete NAMES list has been swapped in
+        self.who_requested = False  # Set once the WHO that fills in hostmasks after joining is queued
+        self.topic = ''
+        self.topic_known = False  # True once the server told us the topic (or that there is none)
+        self.topic_set_by = None
+        self.topic_set_at = None
+        self.bans = BanList(registry)
+        logger.info(f"Created new Channel instance for {name}")
+
+    def _delta(self, op, **fields):
+        self.version += 1
+        fields['op'] = op
+        fields['version'] = self.version
+        return fields
+
+    def has_user(self, nick):
+        return self.registry.fold(nick) in self.members
+
+    def get_mode(self, nick):
+        """Return the user's prefixes in this channel, or None if they are not here."""
+        user = self.members.get(self.registry.fold(nick))
+        return user.channels.get(self) if user else None
+
+    def _join(self, nick, mode):
+        key = self.registry.fold(nick)
+        user = self.registry._user(nick, key)
+        self.members[key] = user
+        user.channels[self] = mode
+
+    def _leave(self, user):
+        user.channels.pop(self, None)
+        self.registry._release(user)
+
+    def add_user(self, nick, mode=""):
+        """Add a user to the channel with their mode."""
+        logger.debug(f"Adding user {nick} with mode {mode} to channel {self.name}")
+        with self.registry.lock:
+            self._join(nick, mode)
+            return self._delta('add', nick=nick, mode=mode[:1])
+
+    def remove_user(self, nick):
+        """Remove a user from the channel."""
+        logger.debug(f"Removing user {nick} from channel {self.name}")
+        with self.registry.lock:
+            user = self.members.pop(self.registry.fold(nick), None)
+            if user is None:
+                return None
+            self._leave(user)
+            return self._delta('remove', nick=user.nick)
+
+    def set_prefix(self, nick, prefix, present, ranks):
+        """Add or remove a status prefix (@, +, ...) using the server's rank order."""
+        with self.registry.lock:
+            user = self.members.get(self.registry.fold(nick))
+            if user is None:
+                return None
+            current = user.channels[self]
+            if present == (prefix in current):
+                return None
+            prefixes = set(current) ^ {prefix}
+            mode = ''.join(p for p in ranks if p in prefixes)
+            user.channels[self] = mode
+            return self._delta('mode', nick=user.nick, mode=mode[:1])
+
+    def reset(self, users):
+        """Replace the member list wholesale, e.g. from NAMES ({nick: prefixes})."""
+        with self.registry.lock:
+            old = self.members
+            self.members = {}
+            for nick, mode in users.items():
+                self._join(nick, mode)
+            # Users still present keep their User entry (hostmask, account, ...)
+            for key, user in old.items():
+                if key not in self.members:
+                    self._leave(user)
+            self.version += 1
+
+    def stage_names(self, names, ranks):
+        """Accumulate one RPL_NAMREPLY (353) chunk; returns how many nicks it held."""
+        if self.pending_names is None:
+            self.pending_names = {}
+            self.pending_hosts = {}
+        pending = self.pending_names
+        hosts = self.pending_hosts
+        before = len(pending)
+        for nick, mode, userhost in parse_names(names, ranks):
+            pending[nick] = mode
+            if userhost:
+                hosts[nick] = userhost
+        return len(pending) - before
+
+    def finish_names(self):
+        """Swap the staged NAMES in on RPL_ENDOFNAMES (366); False if nothing was staged."""
+        users, self.pending_names = self.pending_names, None
+        hosts, self.pending_hosts = self.pending_hosts, {}
+        if users is None:
+            return False
+        with self.registry.lock:
+            self.reset(users)
+            for nick, userhost in hosts.items():
+                user = self.members.get(self.registry.fold(nick))
+                if user is not None:
+                    user.user, _, user.host = userhost.partition('@')
+        self.synced = True
+        return True
+
+    def missing_hosts(self):
+        """How many members we have no user@host for yet."""
+        return sum(1 for user in list(self.members.values()) if user.host is None)
+
+    def set_topic(self, topic, set_by=None, set_at=None):
+        """Record the topic from TOPIC or RPL_TOPIC (332); 333 fills in who and when."""
+        self.topic = topic
+        self.topic_known = True
+        self.topic_set_by = set_by
+        self.topic_set_at = set_at
+
+    def topic_info(self):
+        return {
+            'channel': self.name,
+            'topic': self.topic,
+            'set_by': self.topic_set_by,
+            'set_at': self.topic_set_at
+        }
+
+    def clear(self):
+        """Drop every member, releasing users not seen in any other channel."""
+        with self.registry.lock:
+            members = self.members
+            self.members = {}
+            for user in members.values():
+                self._leave(user)
+
+    def get_users(self):
+        """Return a list of dicts: {nick, mode}, mode being the highest prefix."""
+        with self.registry.lock:
+            return [
+                {"nick": user.nick, "mode": user.channels[self][:1]}
+                for user in self.members.values()
+            ]
+
+    def snapshot(self):
+        """Full member list for the webchat, tagged with the current version."""
+        with self.registry.lock:
+            return {'channel': self.name, 'version': self.version, 'users': self.get_users()}
+
+
+class ChannelRegistry:
+    """Joined channels plus a global nick -> channels user table.
+
+    Behaves like a dict of channel name -> Channel, with names compared
+    using the server's CASEMAPPING. Quit, nick changes and server bans look
+    the user up once and touch only the channels they are actually in.
+    """
+
+    def __init__(self, casemapping=DEFAULT_CASEMAPPING):
+        self.casemapping = casemapping
+        self.table = CASEMAPPINGS[casemapping]
+        self.lock = threading.RLock()
+        self.channels = {}  # {folded channel name: Channel}
+        self.users = {}  # {folded nick: User}
+
+    def fold(self, name):
+        return name.translate(self.table)
+
+    def set_casemapping(self, casemapping):
+        """Switch to the server's CASEMAPPING (from ISUPPORT) and re-key everything."""
+        casemapping = (casemapping or DEFAULT_CASEMAPPING).lower()
+        if casemapping not in CASEMAPPINGS:
+            logger.warning(f"Unknown CASEMAPPING {casemapping}, using {DEFAULT_CASEMAPPING}")
+            casemapping = DEFAULT_CASEMAPPING
+        with self.lock:
+            if casemapping == self.casemapping:
+                return
+            self.casemapping = casemapping
+            self.table = CASEMAPPINGS[casemapping]
+            self.channels = {self.fold(c.name): c for c in self.channels.values()}
+            self.users = {self.fold(u.nick): u for u in self.users.values()}
+            for channel in self.channels.values():
+                channel.members = {self.fold(u.nick): u for u in channel.members.values()}
+
+    def add(self, name):
+        """Return the Channel for `name`, creating it if it is not tracked yet."""
+        with self.lock:
+            key = self.fold(name)
+            channel = self.channels.get(key)
+            if channel is None:
+                channel = self.channels[key] = Channel(name, self)
+            return channel
+
+    def get(self, name, default=None):
+        return self.channels.get(self.fold(name), default)
+
+    def __getitem__(self, name):
+        return self.channels[self.fold(name)]
+
+    def __contains__(self, name):
+        return self.fold(name) in self.channels
+
+    def __delitem__(self, name):
+        with self.lock:
+            self.channels.pop(self.fold(name)).clear()
+
+    def __len__(self):
+        return len(self.channels)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        return [channel.name for channel in list(self.channels.values())]
+
+    def values(self):
+        return list(self.channels.values())
+
+    def clear(self):
+        with self.lock:
+            self.channels.clear()
+            self.users.clear()
+
+    def _user(self, nick, key):
+        user = self.users.get(key)
+        if user is None:
+            user = self.users[key] = User(nick)
+        return user
+
+    def _release(self, user):
+        if not user.channels:
+            self.users.pop(self.fold(user.nick), None)
+
+    def get_user(self, nick):
+        return self.users.get(self.fold(nick))
+
+    def update_user(self, nick, **fields):
+        """Set attributes (user, host, account, realname, away) on a tracked user."""
+        with self.lock:
+            user = self.users.get(self.fold(nick))
+            if user is not None:
+                for name, value in fields.items():
+                    setattr(user, name, value)
+            return user
+
+    def seen(self, source):
+        """Fill in user@host for a tracked user from a message prefix (NickMask)."""
+        if not source or '!' not in source:
+            return
+        with self.lock:
+            user = self.users.get(self.fold(source.nick))
+            if user is not None and user.host != source.host:
+                user.user, user.host = source.user, source.host
+
+    def channels_of(self, nick):
+        """Channels `nick` is in (a copy, safe to modify the user while iterating)."""
+        with self.lock:
+            user = self.users.get(self.fold(nick))
+            return list(user.channels) if user else []
+
+    def remove_user(self, nick):
+        """Remove `nick` from every channel (QUIT, K/G-line); returns [(Channel, delta)]."""
+        with self.lock:
+            return [(channel, channel.remove_user(nick)) for channel in self.channels_of(nick)]
+
+    def rename_user(self, old_nick, new_nick):
+        """Apply a NICK change to every shared channel; returns [(Channel, delta)]."""
+        with self.lock:
+            old_key, new_key = self.fold(old_nick), self.fold(new_nick)
+            user = self.users.pop(old_key, None)
+            if user is None:
+                return []
+            changes = []
+            stale = self.users.get(new_key)
+            if stale is not None:
+                # The server only lets a free nick be taken, so we missed whatever freed it
+                logger.warning(f"{old_nick} is now {new_nick}, dropping the stale entry for {stale.nick}")
+                for channel in list(stale.channels):
+                    if channel.members.get(new_key) is stale:
+                        del channel.members[new_key]
+                    changes.append((channel, channel._delta('remove', nick=stale.nick)))
+                stale.channels.clear()
+            old_nick, user.nick = user.nick, new_nick  # Rename the nick as the webchat knows it
+            self.users[new_key] = user
+            for channel in user.channels:
+                channel.members.pop(old_key, None)
+                channel.members[new_key] = user
+                changes.append((channel, channel._delta('rename', nick=old_nick, new_nick=new_nick)))
+            return changes
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'casemapping': self.casemapping,
+                'channels': len(self.channels),
+                'users': len(self.users),
+                'memberships': sum(len(user.channels) for user in self.users.values())
+            }
+
+
+class ResyncQueue:
+    """De-duplicated, rate-limited queue of TOPIC, NAMES, WHO and ban list resync requests.
+
+    Requests are sent from drain(), run on the reactor, through `send(kind,
+    channel)` at no more than RESYNC_RATE per second after an initial burst,
+    so a burst of webchat clients cannot flood the server with queries.
+    """
+
+    KINDS = ('names', 'topic', 'who', 'bans')
+
+    def __init__(self, send, rate=RESYNC_RATE, burst=RESYNC_BURST):
+        self.send = send
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.pending = OrderedDict()  # {(kind, channel): None}
+        self.requested = 0
+        self.deduplicated = 0
+        self.sent = 0
+
+    def request(self, kind, channel):
+        """Queue a `kind` (one of KINDS) resync of `channel` unless one is pending."""
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown resync kind: {kind}")
+        with self.lock:
+            self.requested += 1
+            if (kind, channel) in self.pending:
+                self.deduplicated += 1
+                return False
+            self.pending[(kind, channel)] = None
+            return True
+
+    def drain(self):
+        """Send pending requests the rate limit allows (run on a timer)."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            ready = []
+            while self.pending and self.tokens >= 1:
+                ready.append(self.pending.popitem(last=False)[0])
+                self.tokens -= 1
+        for kind, channel in ready:
+            try:
+                self.send(kind, channel)
+                self.sent += 1
+            except Exception as e:
+                logger.error(f"Error sending {kind} resync for {channel}: {e}")
+
+    def clear(self):
+        with self.lock:
+            self.pending.clear()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'pending': len(self.pending),
+                'requested': self.requested,
+                'deduplicated': self.deduplicated,
+                'sent': self.sent
+            }
@@ -0,0 +1,150 @@
+import os
+import time
+import marshal
+import hashlib
+import linecache
+import threading
+import importlib.util
+import logging
+from extensions import app
+from worker_pool import Timing
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = '.codeobj'
+
+
+class CompileCache:
+    """On-disk cache of compiled module code, keyed by source and Python version.
+
+    compile() returns the code object for a source string, reading it with
+    marshal from `directory` when this exact source (under this filename)
+    has been compiled by this bytecode version before, and compiling and
+    storing it otherwise. An edit changes the key, so stale entries are
+    never used; prune() deletes the ones no loaded module refers to. The
+    source is registered with linecache under the same filename so
+    tracebacks show the module's real lines.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.in_use = {}  # {filename: cache key} of the sources compiled for loaded modules
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.load_time = Timing()
+        self.compile_time = Timing()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source, filename):
+        digest = hashlib.sha256(importlib.util.MAGIC_NUMBER)
+        digest.update(filename.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def compile(self, source, filename):
+        """Return the code object for source; raises SyntaxError like compile()."""
+        key = self.key(source, filename)
+        path = os.path.join(self.directory, key + CACHE_SUFFIX)
+        code = self._read(path)
+        if code is None:
+            start = time.perf_counter()
+            code = compile(source, filename, 'exec', dont_inherit=True)
+            with self.lock:
+                self.misses += 1
+                self.compile_time.add(time.perf_counter() - start)
+            self._write(path, code)
+        # Tracebacks and inspect look the source up here; mtime None keeps checkcache() from dropping it
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        with self.lock:
+            self.in_use[filename] = key
+        return code
+
+    def _read(self, path):
+        start = time.perf_counter()
+        try:
+            with open(path, 'rb') as f:
+                code = marshal.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError) as e:
+            logger.warning(f"Discarding unreadable compile cache entry {path}: {e}")
+            with self.lock:
+                self.errors += 1
+            self._remove(path)
+            return None
+        with self.lock:
+            self.hits += 1
+            self.load_time.add(time.perf_counter() - start)
+        return code
+
+    def _write(self, path, code):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                marshal.dump(code, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write compile cache entry {path}: {e}")
+            with self.lock:
+                self.errors += 1
+            self._remove(tmp)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def release(self, filename):
+        """The module compiled under filename was unloaded."""
+        linecache.cache.pop(filename, None)
+        with self.lock:
+            self.in_use.pop(filename, None)
+
+    def prune(self):
+        """Delete cache entries that no loaded module uses any more; returns how many."""
+        with self.lock:
+            keep = {key + CACHE_SUFFIX for key in self.in_use.values()}
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return 0
+        for name in names:
+            if name.endswith(CACHE_SUFFIX) and name not in keep:
+                self._remove(os.path.join(self.directory, name))
+                removed += 1
+        if removed:
+            logger.info(f"Pruned {removed} stale compile cache entries")
+        return removed
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'directory': self.directory,
+                'entries': len(self.in_use),
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'load_time': self.load_time.to_dict(),
+                'compile_time': self.compile_time.to_dict()
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_compile_cache():
+    """Return the process-wide module compile cache, creating its directory on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            directory = os.getenv('MODULE_CACHE_DIR') or os.path.join(app.instance_path, 'module_cache')
+            _cache = CompileCache(directory)
+        return _cache
@@ -0,0 +1,168 @@
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from send_queue import LINE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+IDENTIFY_TIMEOUT = 10  # Seconds to wait for NickServ to confirm before joining anyway
+JOIN_TIMEOUT = 120  # Seconds after which unanswered JOINs stop counting towards "fully joined"
+JOIN_HISTORY = 10  # Reconnects whose connect-to-joined time is kept for the dashboard
+
+# Lower-cased fragments of NickServ notices that settle an IDENTIFY either way
+IDENTIFIED_NOTICES = ('you are now identified', 'password accepted', 'you are now logged in',
+                      'you are already identified', 'you are already logged in')
+IDENTIFY_FAILED_NOTICES = ('invalid password', 'password incorrect', 'is not registered',
+                           "isn't registered", 'not a registered nickname')
+
+
+def pack_joins(channels, targmax=None, limit=LINE_LIMIT - 2):
+    """Pack channels into as few "JOIN #a,#b,..." lines as the line length and TARGMAX allow."""
+    lines = []
+    batch = []
+    size = len('JOIN ')
+    for channel in channels:
+        cost = len(channel.encode('utf-8')) + (1 if batch else 0)
+        if batch and (size + cost > limit or (targmax and len(batch) >= targmax)):
+            lines.append('JOIN ' + ','.join(batch))
+            batch = []
+            size = len('JOIN ')
+            cost -= 1
+        batch.append(channel)
+        size += cost
+    if batch:
+        lines.append('JOIN ' + ','.join(batch))
+    return lines
+
+
+class ConnectSequencer:
+    """Drives the bot from 001 to "in every configured channel".
+
+    After welcome it optionally identifies with NickServ and waits for the
+    confirmation notice (or IDENTIFY_TIMEOUT) on the reactor's scheduler
+    instead of sleeping, then sends the channel list as packed JOIN lines
+    through the send queue, which paces them. The time from connect() to
+    the last JOIN being answered is recorded for every (re)connect.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.state = 'idle'  # idle, registering, identifying, joining, joined
+        self.generation = 0  # Bumped per connect so stale timers do nothing
+        self.connect_started = None
+        self.channels = []
+        self.pending = {}  # {folded channel: channel} JOINs not answered yet
+        self.failed = {}  # {channel: reason}
+        self.join_lines = 0
+        self.history = deque(maxlen=JOIN_HISTORY)
+
+    def connecting(self):
+        """Called when a new connection attempt starts."""
+        self.generation += 1
+        self.state = 'registering'
+        self.connect_started = time.monotonic()
+        self.pending.clear()
+        self.failed.clear()
+
+    def welcome(self, connection, channels, password=None):
+        """Called on 001: identify if needed, then join `channels`."""
+        self.channels = [channel for channel in channels if channel]
+        if self.connect_started is None:
+            self.connect_started = time.monotonic()
+        if not password:
+            self.join_all(connection)
+            return
+        logger.info("Identifying with NickServ")
+        self.state = 'identifying'
+        connection.privmsg('NickServ', f"IDENTIFY {password}")
+        generation = self.generation
+        self.bot.reactor.scheduler.execute_after(
+            IDENTIFY_TIMEOUT, lambda: self._identify_timeout(connection, generation))
+
+    def nickserv_notice(self, connection, text):
+        """Feed a notice from NickServ; joins once it settles a pending IDENTIFY."""
+        if self.state != 'identifying':
+            return
+        lowered = text.lower()
+        if any(fragment in lowered for fragment in IDENTIFIED_NOTICES):
+            logger.info("Identified with NickServ")
+            self.identified(connection)
+        elif any(fragment in lowered for fragment in IDENTIFY_FAILED_NOTICES):
+            logger.warning(f"NickServ identification failed: {text}")
+            self.join_all(connection)
+
+    def identified(self, connection):
+        """Authentication confirmed (NickServ notice or 900): reclaim our nick and join."""
+        if self.state != 'identifying':
+            return
+        self.bot.reclaim_nick(connection)
+        self.join_all(connection)
+
+    def _identify_timeout(self, connection, generation):
+        if generation == self.generation and self.state == 'identifying':
+            logger.warning(f"No NickServ confirmation after {IDENTIFY_TIMEOUT}s, joining anyway")
+            self.join_all(connection)
+
+    def join_all(self, connection):
+        """Send the channel list as packed JOIN lines."""
+        self.state = 'joining'
+        fold = self.bot.webchat_channels.fold
+        self.pending = {fold(channel): channel for channel in self.channels}
+        targmax = connection.features.targmax.get('JOIN') if hasattr(connection.features, 'targmax') else None
+        lines = pack_joins(self.pending.values(), targmax)
+        logger.info(f"Joining {len(self.pending)} channels in {len(lines)} JOIN line(s)")
+        for line in lines:
+            connection.send_raw(line)
+        self.join_lines += len(lines)
+        if self.pending:
+            generation = self.generation
+            self.bot.reactor.scheduler.execute_after(JOIN_TIMEOUT, lambda: self._join_timeout(generation))
+        else:
+            self._finished()
+
+    def joined(self, channel):
+        """Our own JOIN for `channel` arrived."""
+        self._answered(channel)
+
+    def join_failed(self, channel, reason):
+        """The server refused one of our JOINs (banned, invite only, full, ...)."""
+        if self.bot.webchat_channels.fold(channel) in self.pending:
+            logger.warning(f"Could not join {channel}: {reason}")
+            self.failed[channel] = reason
+            self._answered(channel)
+
+    def _answered(self, channel):
+        if self.pending.pop(self.bot.webchat_channels.fold(channel), None) and not self.pending:
+            if self.state == 'joining':
+                self._finished()
+
+    def _join_timeout(self, generation):
+        if generation == self.generation and self.state == 'joining':
+            logger.warning(f"No answer to JOIN for {', '.join(self.pending.values())} after {JOIN_TIMEOUT}s")
+            for channel in self.pending.values():
+                self.failed[channel] = 'timeout'
+            self.pending.clear()
+            self._finished()
+
+    def _finished(self):
+        self.state = 'joined'
+        elapsed = time.monotonic() - self.connect_started
+        self.history.append({
+            'at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'seconds': round(elapsed, 2),
+            'channels': len(self.channels) - len(self.failed),
+            'failed': len(self.failed)
+        })
+        logger.info(f"Joined {len(self.channels) - len(self.failed)} of {len(self.channels)} channels {elapsed:.2f}s after connecting")
+
+    def get_stats(self):
+        last = self.history[-1] if self.history else None
+        return {
+            'state': self.state,
+            'pending': len(self.pending),
+            'failed': dict(self.failed),
+            'join_lines': self.join_lines,
+            'last_connect_to_joined': last['seconds'] if last else None,
+            'history': list(self.history)
+        }
@@ -0,0 +1,151 @@
+import time
+import threading
+import logging
+import traceback
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+EMIT_WINDOW = 0.05  # Seconds to gather events before flushing them to the webchat
+
+# Events that describe current state: only the newest one per room matters
+STATE_EVENTS = {'webchat_topic', 'webchat_channels', 'status_update'}
+
+# Events whose adjacent runs are combined into one frame when flushed
+BATCHED_EVENTS = {'webchat_message', 'webchat_users'}
+
+
+def merge_user_events(events):
+    """Reduce queued webchat_users events to a snapshot and/or one combined delta."""
+    start = 0
+    for i, data in enumerate(events):
+        if 'users' in data:
+            start = i  # A snapshot supersedes everything queued before it
+    merged = []
+    if 'users' in events[start]:
+        merged.append(events[start])
+        start += 1
+    deltas = events[start:]
+    if deltas:
+        merged.append({
+            'channel': deltas[-1].get('channel'),
+            'version': deltas[-1].get('version'),
+            'changes': [change for data in deltas for change in data['changes']]
+        })
+    return merged
+
+
+class EmitScheduler:
+    """Buffers Socket.IO emits per room and flushes them every `window` seconds.
+
+    Each room keeps one ordered list of pending events, so a JOIN line and
+    the userlist change it describes go out in the order they were emitted.
+    Only adjacent runs of the same event are combined: consecutive
+    webchat_message events become one webchat_message_batch frame and
+    consecutive userlist events are reduced to the newest snapshot plus one
+    combined delta. A state event replaces the pending one for its room
+    where it sits; everything else is passed through in order.
+    """
+
+    def __init__(self, socketio, window=EMIT_WINDOW):
+        self.socketio = socketio
+        self.window = window
+        self.cond = threading.Condition()
+        self.rooms = OrderedDict()  # {room: [[event, data or list of data for BATCHED_EVENTS], ...]}
+        self.states = {}  # {(room, event): pending entry of a STATE_EVENTS event}
+        self.first_pending = None
+        self.closed = False
+        self.events = 0
+        self.frames = 0
+        self.merged = 0
+        self.batched = 0
+        self.thread = threading.Thread(target=self._run, name='emit-scheduler')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def emit(self, event, data=None, room=None):
+        """Queue an event for `room` (or every client when room is None)."""
+        with self.cond:
+            self.events += 1
+            if self.closed:
+                self._send(event, data, room)
+                return
+            entries = self.rooms.setdefault(room, [])
+            if event in BATCHED_EVENTS:
+                # Extend the run only if it is the last thing queued, so ordering is kept
+                if entries and entries[-1][0] == event:
+                    entries[-1][1].append(data)
+                else:
+                    entries.append([event, [data]])
+            elif event in STATE_EVENTS:
+                pending = self.states.get((room, event))
+                if pending is not None:
+                    self.merged += 1
+                    pending[1] = data
+                else:
+                    pending = self.states[(room, event)] = [event, data]
+                    entries.append(pending)
+            else:
+                entries.append([event, data])
+            if self.first_pending is None:
+                self.first_pending = time.monotonic()
+                self.cond.notify()
+
+    def _send(self, event, data, room):
+        self.frames += 1
+        self.socketio.emit(event, data, room=room)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.first_pending is None and not self.closed:
+                    self.cond.wait()
+                while self.first_pending is not None and not self.closed:
+                    wait = self.first_pending + self.window - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self.cond.wait(wait)
+                rooms = self.rooms
+                self.rooms = OrderedDict()
+                self.states = {}
+                self.first_pending = None
+                closed = self.closed
+            self._flush(rooms)
+            if closed:
+                return
+
+    def _flush(self, rooms):
+        for room, entries in rooms.items():
+            for event, data in entries:
+                try:
+                    if event == 'webchat_message':
+                        if len(data) == 1:
+                            self._send(event, data[0], room)
+                        else:
+                            self.batched += len(data)
+                            self._send('webchat_message_batch', {'channel': room, 'messages': data}, room)
+                    elif event == 'webchat_users':
+                        merged = merge_user_events(data)
+                        self.merged += len(data) - len(merged)
+                        for users in merged:
+                            self._send(event, users, room)
+                    else:
+                        self._send(event, data, room)
+                except Exception as e:
+                    logger.error(f"Error emitting {event} to {room}: {e}\n{traceback.format_exc()}")
+
+    def shutdown(self):
+        """Flush what is pending and stop the flush thread."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def get_stats(self):
+        return {
+            'window_ms': round(self.window * 1000),
+            'events': self.events,
+            'frames': self.frames,
+            'merged': self.merged,
+            'batched_messages': self.batched,
+            'batching_ratio': round(self.events / self.frames, 2) if self.frames else 0.0
+        }
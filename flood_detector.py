@@ -0,0 +1,118 @@
+import os
+import time
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+MAX_NICKS_PER_CHANNEL = 1000  # Default cap; set FLOOD_MAX_NICKS_PER_CHANNEL to change it
+
+
+def max_nicks_per_channel():
+    """The per-channel nick cap from FLOOD_MAX_NICKS_PER_CHANNEL, or the default."""
+    value = os.getenv('FLOOD_MAX_NICKS_PER_CHANNEL')
+    if not value:
+        return MAX_NICKS_PER_CHANNEL
+    try:
+        cap = int(value)
+        if cap < 1:
+            raise ValueError("must be at least 1")
+    except ValueError as e:
+        logger.warning(f"Ignoring FLOOD_MAX_NICKS_PER_CHANNEL={value!r} ({e}), using {MAX_NICKS_PER_CHANNEL}")
+        return MAX_NICKS_PER_CHANNEL
+    return cap
+
+
+class FloodDetector:
+    """Sliding-window message rate tracker for flood detection.
+
+    Each nick gets a deque of monotonic timestamps capped at threshold + 1
+    entries, so a check only ever touches a handful of items. Nicks are kept
+    per channel in LRU order; idle nicks are dropped by a periodic sweep and
+    the least recently active nick is evicted once a channel hits its cap.
+    """
+
+    def __init__(self, max_nicks_per_channel=MAX_NICKS_PER_CHANNEL, sweep_interval=60, clock=time.monotonic):
+        self.max_nicks_per_channel = max_nicks_per_channel
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.channels = {}  # {channel: OrderedDict(nick: (deque, timeframe))}
+        self.next_sweep = clock() + sweep_interval
+        self.evicted_idle = 0
+        self.evicted_cap = 0
+
+    def check(self, channel, nick, threshold, timeframe):
+        """Record a message and return True if the nick exceeded the threshold."""
+        now = self.clock()
+        if now >= self.next_sweep:
+            self.sweep(now)
+
+        nicks = self.channels.get(channel)
+        if nicks is None:
+            nicks = self.channels[channel] = OrderedDict()
+
+        entry = nicks.get(nick)
+        if entry is None:
+            entry = nicks[nick] = (deque(maxlen=threshold + 1), timeframe)
+            if len(nicks) > self.max_nicks_per_channel:
+                nicks.popitem(last=False)
+                self.evicted_cap += 1
+        else:
+            # Keep LRU order: the sweep stops at the first nick still active
+            nicks.move_to_end(nick)
+            if entry[0].maxlen != threshold + 1:
+                # The threshold changed; keep the timestamps that still fit
+                entry = nicks[nick] = (deque(entry[0], maxlen=threshold + 1), timeframe)
+            elif entry[1] != timeframe:
+                entry = nicks[nick] = (entry[0], timeframe)
+
+        stamps = entry[0]
+        stamps.append(now)
+        cutoff = now - timeframe
+        while stamps and stamps[0] <= cutoff:
+            stamps.popleft()
+        return len(stamps) > threshold
+
+    def sweep(self, now=None):
+        """Drop nicks whose last message is older than their window."""
+        now = self.clock() if now is None else now
+        self.next_sweep = now + self.sweep_interval
+        removed = 0
+        for channel in list(self.channels):
+            nicks = self.channels[channel]
+            # Nicks are in LRU order, so stop at the first one still active
+            while nicks:
+                nick, (stamps, timeframe) = next(iter(nicks.items()))
+                if stamps and stamps[-1] > now - timeframe:
+                    break
+                del nicks[nick]
+                removed += 1
+            if not nicks:
+                del self.channels[channel]
+        if removed:
+            self.evicted_idle += removed
+            logger.debug(f"Flood detector swept {removed} idle nicks")
+
+    def forget(self, channel, nick):
+        """Stop tracking a nick in a channel (part/kick)."""
+        nicks = self.channels.get(channel)
+        if nicks is not None:
+            nicks.pop(nick, None)
+            if not nicks:
+                del self.channels[channel]
+
+    def forget_nick(self, nick):
+        """Stop tracking a nick in every channel (quit)."""
+        for channel in list(self.channels):
+            self.forget(channel, nick)
+
+    def forget_channel(self, channel):
+        self.channels.pop(channel, None)
+
+    def get_stats(self):
+        return {
+            'channels': len(self.channels),
+            'tracked_nicks': sum(len(nicks) for nicks in self.channels.values()),
+            'evicted_idle': self.evicted_idle,
+            'evicted_cap': self.evicted_cap
+        }
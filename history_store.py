@@ -0,0 +1,196 @@
+import os
+import queue
+import sqlite3
+import atexit
+import threading
+import itertools
+import logging
+from extensions import app
+from scrollback import MessageRecord
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    channel TEXT NOT NULL,
+    ts REAL NOT NULL,
+    nick TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_channel_ts ON messages (channel, ts, id);
+"""
+
+MAX_PAGE_SIZE = 500
+
+
+def parse_cursor(cursor):
+    """Decode a paging cursor, returning None if it is malformed."""
+    if not cursor:
+        return None
+    try:
+        ts, message_id = str(cursor).split(':', 1)
+        return float(ts), int(message_id)
+    except ValueError:
+        return None
+
+
+class HistoryStore:
+    """Append-only message log in a WAL-mode SQLite database.
+
+    Appends are queued and written in batches by a background thread, so
+    the IRC reactor never waits on disk. Reads page through the
+    (channel, ts, id) index using cursors and never load a whole channel.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=0.5, max_pending=100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.local = threading.local()
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        last_id = conn.execute("SELECT MAX(id) FROM messages").fetchone()[0] or 0
+        self.ids = itertools.count(last_id + 1)
+        self.id_lock = threading.Lock()
+
+        self.stopping = threading.Event()
+        self.writer = threading.Thread(target=self._write_loop, name='history-writer')
+        self.writer.daemon = True
+        self.writer.start()
+        atexit.register(self.close)
+        logger.info(f"History store opened at {path} (last id {last_id})")
+
+    def _connection(self):
+        """Return this thread's SQLite connection, opening it on first use."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def append(self, channel, nick, message, ts):
+        """Queue a message for writing and return its id."""
+        with self.id_lock:
+            message_id = next(self.ids)
+        try:
+            self.pending.put_nowait((message_id, channel, ts, nick, message))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"History write queue full, dropped message {message_id} for {channel}")
+        return message_id
+
+    def _write_loop(self):
+        conn = self._connection()
+        while not (self.stopping.is_set() and self.pending.empty()):
+            try:
+                batch = [self.pending.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO messages (id, channel, ts, nick, message) VALUES (?, ?, ?, ?, ?)",
+                        batch
+                    )
+                self.written += len(batch)
+                self.batches += 1
+            except sqlite3.Error as e:
+                self.dropped += len(batch)
+                logger.error(f"Failed to write {len(batch)} history messages: {e}")
+
+    def page(self, channel, before=None, after=None, limit=50):
+        """Return up to `limit` rows for a channel, oldest first.
+
+        `before` and `after` are cursors from a previous page. With neither,
+        the newest messages are returned.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        conn = self._connection()
+        before = parse_cursor(before)
+        after = parse_cursor(after)
+        if after is not None:
+            rows = conn.execute(
+                "SELECT id, ts, nick, message FROM messages "
+                "WHERE channel = ? AND (ts, id) > (?, ?) ORDER BY ts, id LIMIT ?",
+                (channel, after[0], after[1], limit)
+            ).fetchall()
+        else:
+            if before is not None:
+                rows = conn.execute(
+                    "SELECT id, ts, nick, message FROM messages "
+                    "WHERE channel = ? AND (ts, id) < (?, ?) ORDER BY ts DESC, id DESC LIMIT ?",
+                    (channel, before[0], before[1], limit)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT id, ts, nick, message FROM messages "
+                    "WHERE channel = ? ORDER BY ts DESC, id DESC LIMIT ?",
+                    (channel, limit)
+                ).fetchall()
+            rows.reverse()
+        return rows
+
+    def records(self, channel, before=None, after=None, limit=50):
+        """Like page(), but return MessageRecord objects."""
+        return [
+            MessageRecord(nick, message, ts, message_id)
+            for message_id, ts, nick, message in self.page(channel, before, after, limit)
+        ]
+
+    def recent(self, channel, limit):
+        """Return the newest `limit` messages for a channel as MessageRecords, oldest first.
+
+        Unlike page() this is not capped at MAX_PAGE_SIZE; it seeds scrollback
+        buffers, which may be up to scrollback.MAX_DEPTH lines deep.
+        """
+        rows = self._connection().execute(
+            "SELECT id, ts, nick, message FROM messages "
+            "WHERE channel = ? ORDER BY ts DESC, id DESC LIMIT ?",
+            (channel, max(1, int(limit)))
+        ).fetchall()
+        rows.reverse()
+        return [MessageRecord(nick, message, ts, message_id) for message_id, ts, nick, message in rows]
+
+    def close(self):
+        """Flush queued messages and stop the writer thread."""
+        if self.stopping.is_set():
+            return
+        self.stopping.set()
+        self.writer.join(timeout=10)
+
+    def get_stats(self):
+        return {
+            'pending': self.pending.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'avg_batch': round(self.written / self.batches, 1) if self.batches else 0.0
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Return the process-wide history store, opening it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            path = os.getenv('HISTORY_DB_PATH') or os.path.join(app.instance_path, 'history.db')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _store = HistoryStore(path)
+        return _store
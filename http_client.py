@@ -0,0 +1,209 @@
+import time
+import socket
+import threading
+import logging
+from collections import OrderedDict
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_HOSTS = 32  # Hosts with a kept-alive connection pool
+HTTP_POOL_SIZE = 4  # Idle connections kept per host
+HTTP_TIMEOUT = (5, 10)  # (connect, read) seconds when the caller gives none
+DNS_TTL = 300  # Seconds to reuse a resolved address
+DNS_MAX_ENTRIES = 1000
+REVALIDATE_MAX_ENTRIES = 500  # Responses kept for If-None-Match/If-Modified-Since
+REVALIDATE_MAX_BYTES = 1024 * 1024  # Larger bodies are not kept for revalidation
+
+
+class DNSCache:
+    """getaddrinfo results cached per (host, port, family) for a short TTL."""
+
+    def __init__(self, ttl=DNS_TTL, max_entries=DNS_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # {(host, port, family): (expires_at, addrinfo list)}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, host, port, family=socket.AF_UNSPEC):
+        key = (host, port, family)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        infos = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+        with self.lock:
+            self.entries[key] = (now + self.ttl, infos)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return infos
+
+    def get_stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class CachedDNSConnection:
+    """Mixin for urllib3 connections that resolves the host through `dns_cache`.
+
+    Each cached address is tried in turn by pointing the socket at it; the
+    hostname itself is still used for the Host header, SNI and certificate
+    checks. Lookups that fail are left to urllib3 so it reports them.
+    """
+    dns_cache = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            infos = self.dns_cache.resolve(host.strip('[]'), self.port, allowed_gai_family())
+        except OSError:
+            return super()._new_conn()
+        error = None
+        for _, _, _, _, sockaddr in infos:
+            self._dns_host = sockaddr[0]
+            try:
+                return super()._new_conn()
+            except ConnectTimeoutError as e:  # Also covers NewConnectionError
+                error = e
+            finally:
+                self._dns_host = host
+        if error is not None:
+            raise error
+        return super()._new_conn()
+
+
+class DNSCachingAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools resolve hosts through a DNSCache.
+
+    Only connections made through this adapter use the cache; other urllib3
+    users in the process are left alone.
+    """
+
+    def __init__(self, dns_cache, **kwargs):
+        self.dns_cache = dns_cache  # Set first: HTTPAdapter.__init__ calls init_poolmanager()
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attrs = {'dns_cache': self.dns_cache}
+        http = type('CachedDNSHTTPConnection', (CachedDNSConnection, HTTPConnection), attrs)
+        https = type('CachedDNSHTTPSConnection', (CachedDNSConnection, HTTPSConnection), attrs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('CachedDNSHTTPConnectionPool', (HTTPConnectionPool,), {'ConnectionCls': http}),
+            'https': type('CachedDNSHTTPSConnectionPool', (HTTPSConnectionPool,), {'ConnectionCls': https})
+        }
+
+
+class HTTPClient:
+    """Shared requests session with per-host keep-alive pools.
+
+    Modules reach it as `bot.http` and should use it instead of bare
+    `requests` calls or sessions of their own. Every request gets a
+    timeout, hostnames are resolved through a small DNS cache, and GETs
+    made with `revalidate=True` send If-None-Match/If-Modified-Since from
+    the previous response and reuse its body on a 304.
+    """
+
+    def __init__(self, pool_hosts=HTTP_POOL_HOSTS, pool_size=HTTP_POOL_SIZE, timeout=HTTP_TIMEOUT):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.dns = DNSCache()
+        self.adapter = DNSCachingAdapter(self.dns, pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.validators = OrderedDict()  # {url: Response with ETag/Last-Modified}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.revalidated = 0
+
+    def request(self, method, url, timeout=None, revalidate=False, **kwargs):
+        """Like requests.request(), on the shared session with a default timeout."""
+        kwargs['timeout'] = timeout or self.timeout
+        revalidate = revalidate and method.upper() == 'GET' and not kwargs.get('stream')
+        cached = None
+        if revalidate:
+            with self.lock:
+                cached = self.validators.get(url)
+            if cached is not None:
+                headers = dict(kwargs.get('headers') or {})
+                if cached.headers.get('ETag'):
+                    headers['If-None-Match'] = cached.headers['ETag']
+                if cached.headers.get('Last-Modified'):
+                    headers['If-Modified-Since'] = cached.headers['Last-Modified']
+                kwargs['headers'] = headers
+        with self.lock:
+            self.requests += 1
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            with self.lock:
+                self.errors += 1
+            raise
+        if revalidate:
+            response = self._revalidated(url, response, cached)
+        return response
+
+    def _revalidated(self, url, response, cached):
+        """Swap a 304 for the cached response, or remember a new validatable one."""
+        if response.status_code == 304 and cached is not None:
+            with self.lock:
+                self.revalidated += 1
+            response.close()
+            return cached
+        if response.status_code == 200 and ('ETag' in response.headers or 'Last-Modified' in response.headers):
+            if len(response.content) <= REVALIDATE_MAX_BYTES:
+                with self.lock:
+                    self.validators[url] = response
+                    self.validators.move_to_end(url)
+                    while len(self.validators) > REVALIDATE_MAX_ENTRIES:
+                        self.validators.popitem(last=False)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get_stats(self):
+        pools = list(getattr(self.adapter.poolmanager.pools, '_container', {}).values())
+        connections = sum(pool.num_connections for pool in pools)
+        pooled_requests = sum(pool.num_requests for pool in pools)
+        with self.lock:
+            counters = {'requests': self.requests, 'errors': self.errors, 'revalidated': self.revalidated}
+        return {
+            **counters,
+            'hosts': len(pools),
+            'connections_opened': connections,
+            'connection_reuse': round(1 - connections / pooled_requests, 4) if pooled_requests else 0.0,
+            'dns': self.dns.get_stats()
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """Return the process-wide HTTP client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HTTPClient()
+        return _client
@@ -4,43 +4,31 @@ import ssl
 import threading
 import time
 import logging
-import openai
-from models import BotSettings, AISettings, ChannelManagementSettings
+from models import BotSettings
 from extensions import app, db, socketio
+from emit_scheduler import EmitScheduler
 from datetime import datetime, timedelta
 from url_watcher import URLWatcher
 from module_loader import ModuleLoader
 from ai_utils import get_ai_response
-import re
+from settings_cache import ChannelSettingsCache
+from flood_detector import FloodDetector, max_nicks_per_channel
+from scrollback import Scrollback
+from history_store import get_history_store
+from worker_pool import WorkerPool
+from http_client import get_http_client
+from send_queue import OutboundQueue
+from channel_state import ChannelRegistry, ResyncQueue, parse_modes
+from connect_sequencer import ConnectSequencer
+from capabilities import CapNegotiator, WANTED_CAPS, server_time
+from collections import deque
 
 logger = logging.getLogger(__name__)
 
-class Channel:
-    """A class to represent an IRC channel and its users."""
-    def __init__(self, name):
-        self.name = name
-        self.users = {}  # {nick: mode}
-        logger.info(f"Created new Channel instance for {name}")
-        
-    def add_user(self, nick, mode=""):
-        """Add a user to the channel with their mode."""
-        logger.info(f"Adding user {nick} with mode {mode} to channel {self.name}")
-        self.users[nick] = mode
-        
-    def remove_user(self, nick):
-        """Remove a user from the channel."""
-        logger.info(f"Removing user {nick} from channel {self.name}")
-        if nick in self.users:
-            del self.users[nick]
-        
-    def get_users(self):
-        """Return a list of dicts: {nick, mode}."""
-        users = [
-            {"nick": nick, "mode": mode}
-            for nick, mode in self.users.items()
-        ]
-        logger.info(f"Getting users for channel {self.name}: {users}")
-        return users
+AI_WORKERS = 4  # Concurrent AI provider requests
+AI_MAX_QUEUE = 20  # AI requests allowed to wait for a worker
+AI_TIMEOUT = 30  # Seconds an AI request may wait plus run; the provider gets what is left
+BAN_HITS_SHOWN = 5  # Matching nicks listed in a ban's webchat message
 
 class Conversation:
     """A class to track conversation state with a user."""
@@ -59,7 +47,7 @@ class Conversation:
         self.last_interaction = datetime.now()
 
 class IRCBouncer(irc.bot.SingleServerIRCBot):
-    def __init__(self, server, port, nick, username, realname, use_ssl=True):
+    def __init__(self, server, port, nick, username, realname, use_ssl=True, client_cert=None):
         """Initialize the IRC bot."""
         self.server = server
         self.port = port
@@ -67,30 +55,40 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         self.username = username
         self.realname = realname
         self.use_ssl = use_ssl
+        self.client_cert = client_cert  # PEM with certificate and key, for SASL EXTERNAL
         self.is_connecting = False  # Add connection state tracking
-        self.webchat_channels = {}  # Store channels to join (custom)
+        self.webchat_channels = ChannelRegistry()  # Joined channels and the nick -> channels user table
+        self.sequencer = ConnectSequencer(self)  # Identify and batched JOINs after welcome
+        self.caps = CapNegotiator(self, WANTED_CAPS)  # IRCv3 capabilities and SASL during registration
         self.conversations = {}  # Store active conversations
-        self.webchat_messages = {}  # {channel: [ {nick, message, timestamp} ]}
-        self.topics = {}  # {channel: topic}
+        self.emitter = EmitScheduler(socketio)  # Coalesces webchat events into batched frames
+        self.ai_pool = WorkerPool('ai', max_workers=AI_WORKERS, max_queue=AI_MAX_QUEUE)  # AI requests, ordered per channel
+        self.reactor_calls = deque()  # Callbacks from worker threads, run in order on the reactor
+        self.history = get_history_store()  # Durable message log backing the scrollback
+        self.webchat_messages = Scrollback(loader=self._load_scrollback)  # {channel: RingBuffer of MessageRecord}
+        self.http = get_http_client()  # Shared pooled HTTP client for the URL watcher and modules
         self.url_watcher = URLWatcher(self)
         self.module_loader = ModuleLoader(self)  # Initialize module loader
-        self.message_history = {}  # Store message history for flood detection
-        self.channel_settings = {}  # Store channel management settings
+        self.flood_detector = FloodDetector(max_nicks_per_channel())  # Per-nick message rates for flood detection
+        self.channel_settings = ChannelSettingsCache()  # Channel management settings, reloaded only on change
         self.load_channel_settings()
         
         logger.info(f"Initializing IRC bot with server={server}, port={port}, nick={nick}, ssl={use_ssl}")
         
-        # Create IRC connection factory with SSL context that accepts invalid certificates
-        factory = irc.connection.Factory()
-        if use_ssl:
-            logger.info("Creating SSL context with self-signed certificate support")
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            factory = irc.connection.Factory(wrapper=lambda sock: ssl_context.wrap_socket(sock))
+        factory = self._connection_factory()
         
         # Initialize the bot
         super().__init__([(server, port)], nick, realname, connect_factory=factory)
+        self.reactor.scheduler.execute_every(0.05, self._run_reactor_calls)
+        # Modules that declare `events` get them after the bot's own on_<event> handlers
+        self.reactor.add_global_handler("all_events", self.module_loader.handle_event, 0)
+        self.reactor.scheduler.execute_every(1, self.module_loader.watchdog)
+        # Pace and prioritise everything written to the server
+        self.send_queue = OutboundQueue.attach(self.connection)
+        self.reactor.scheduler.execute_every(0.1, self.send_queue.drain)
+        # TOPIC/NAMES are only re-requested on demand, at a limited rate
+        self.resync = ResyncQueue(self._send_resync)
+        self.reactor.scheduler.execute_every(1, self.resync.drain)
         
         # Start the bot in a separate thread AFTER initialization
         self.thread = threading.Thread(target=self._connect_and_run)
@@ -98,38 +96,98 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         self.thread.start()
         logger.info("Bot thread started")
 
-    def get_chatgpt_response(self, message, conversation=None):
+    def get_chatgpt_response(self, message, conversation=None, timeout=None):
         """Get a response from the configured AI provider."""
-        return get_ai_response(message, conversation)
+        return get_ai_response(message, conversation, timeout)
+
+    def call_in_reactor(self, func, *args):
+        """Run func(*args) on the IRC reactor thread, in call order."""
+        self.reactor_calls.append((func, args))
+
+    def _run_reactor_calls(self):
+        """Drain callbacks queued by call_in_reactor (scheduled on the reactor)."""
+        while self.reactor_calls:
+            func, args = self.reactor_calls.popleft()
+            try:
+                func(*args)
+            except Exception as e:
+                logger.error(f"Error in reactor callback {getattr(func, '__name__', func)}: {e}")
+
+    def request_ai_response(self, connection, channel, message, conversation):
+        """Queue an AI reply; the answer is sent from the reactor when ready."""
+        deadline = time.monotonic() + AI_TIMEOUT
+        generation = self.sequencer.generation
+
+        def generate():
+            # The provider only gets what is left of AI_TIMEOUT after queueing
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            with app.app_context():
+                return self.get_chatgpt_response(message, conversation, remaining)
+
+        def finished(job):
+            self.call_in_reactor(self._send_ai_response, connection, channel, conversation, generation, job)
+
+        job = self.ai_pool.submit(generate, key=channel, callback=finished, timeout=AI_TIMEOUT)
+        if job is None:
+            logger.warning(f"AI queue full, dropping request from {channel}")
+            self.send_message(connection, channel, "I'm a bit busy right now, please try again in a moment.")
+
+    def _send_ai_response(self, connection, channel, conversation, generation, job):
+        if job.status == 'cancelled' or generation != self.sequencer.generation or not self.connection:
+            # Dropped by disconnect, or answering on a connection that is gone
+            logger.info(f"Discarding AI response for {channel} ({job.status})")
+            return
+        response = job.result if job.status == 'done' else None
+        if response:
+            # Use send_message to ensure proper IRC and webchat handling
+            self.send_message(connection, channel, response)
+            # Store bot's response in conversation
+            conversation.messages.append({"role": "assistant", "content": response})
+        else:
+            logger.warning(f"No AI response received ({job.status})")
+            self.send_message(connection, channel, "I'm sorry, I couldn't generate a response at this time.")
 
     def send_message(self, connection, channel, message):
         """Send a message to a channel and handle webchat updates."""
+        if self.module_loader.in_worker():
+            # Module hooks run on worker threads: send from the reactor, in call order
+            self.call_in_reactor(self._send_in_lane, self.send_queue.current_lane(), connection, channel, message)
+            return
+
         # Send the message to IRC
         connection.privmsg(channel, message)
         
-        # Store message in webchat_messages
-        if not hasattr(self, 'webchat_messages'):
-            self.webchat_messages = {}
-        if channel not in self.webchat_messages:
-            self.webchat_messages[channel] = []
-        
-        # Add the message to history
-        self.webchat_messages[channel].append({
-            'nick': self.nick,
-            'message': message,
-            'timestamp': datetime.now().strftime('%H:%M:%S')
-        })
-        
-        # Limit history to last 100 messages
-        if len(self.webchat_messages[channel]) > 100:
-            self.webchat_messages[channel] = self.webchat_messages[channel][-100:]
+        # Store message in webchat history
+        record = self.store_message(channel, self.nick, message)
         
         # Emit message to webchat
-        socketio.emit('webchat_message', {
-            'nick': self.nick,
-            'message': message,
-            'timestamp': datetime.now().strftime('%H:%M:%S')
-        }, room=channel)
+        self.emitter.emit('webchat_message', record.to_dict(), room=channel)
+
+    def _send_in_lane(self, lane, connection, channel, message):
+        with self.send_queue.lane(lane):
+            self.send_message(connection, channel, message)
+
+    def store_message(self, channel, nick, message, ts=None):
+        """Append a line to a channel's webchat scrollback and return its record."""
+        settings = self.channel_settings.get(channel)
+        depth = settings.get('history_depth') if settings else None
+        ts = ts or time.time()
+        # Create (and seed) the buffer before queueing the line, so a fast history
+        # write can't make the seed load this same line a second time
+        self.webchat_messages.buffer(channel, depth)
+        message_id = self.history.append(channel, nick, message, ts)
+        return self.webchat_messages.append(channel, nick, message, ts, message_id, depth)
+
+    def event_timestamp(self, event):
+        """HH:MM:SS for a system message, from the server-time tag when there is one."""
+        ts = server_time(event)
+        return (datetime.fromtimestamp(ts) if ts else datetime.now()).strftime('%H:%M:%S')
+
+    def _load_scrollback(self, channel, limit):
+        """Seed a new scrollback buffer from the history store."""
+        return self.history.recent(channel, limit)
 
     def on_join(self, connection, event):
         """Called when the bot joins a channel or a user joins."""
@@ -137,37 +195,68 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         nick = event.source.nick if hasattr(event.source, 'nick') else None
         logger.info(f"Join event for channel {channel} by {nick}")
         
-        if channel not in self.webchat_channels:
-            logger.info(f"Creating new channel tracking for {channel}")
-            self.webchat_channels[channel] = Channel(channel)
-            # Request NAMES list for the new channel
-            logger.info(f"Requesting NAMES list for {channel}")
-            connection.names([channel])
-            # Emit updated channel list to all clients
-            logger.info("Emitting updated channel list")
-            socketio.emit('webchat_channels', {
-                'channels': list(self.webchat_channels.keys())
-            })
+        if nick == connection.get_nickname():
+            # The server follows our own JOIN with the topic (332/333) and
+            # NAMES (353/366), so there is nothing to request here
+            self.sequencer.joined(channel)
+            if channel not in self.webchat_channels:
+                logger.info(f"Creating new channel tracking for {channel}")
+                self.webchat_channels.add(channel)
+                # Emit updated channel list to all clients
+                self.emitter.emit('webchat_channels', {
+                    'channels': list(self.webchat_channels.keys())
+                })
+        elif channel not in self.webchat_channels:
+            logger.debug(f"Ignoring join to untracked channel {channel}")
+            return
         
         if nick:
             # Default to no mode on join
-            logger.info(f"Adding user {nick} to channel {channel}")
-            self.webchat_channels[channel].add_user(nick, "")
-            # Broadcast updated userlist
-            socketio.emit('webchat_users', {
-                'users': self.webchat_channels[channel].get_users()
-            }, room=channel)
+            chan = self.webchat_channels[channel]
+            self.emit_user_changes(chan, chan.add_user(nick, ""))
+            # The JOIN prefix carries user@host; extended-join adds account and realname
+            self.webchat_channels.seen(event.source)
+            if len(event.arguments) >= 2:
+                account = event.arguments[0]
+                self.webchat_channels.update_user(nick, account=None if account == '*' else account,
+                                                  realname=event.arguments[1])
             # Emit system join message
-            timestamp = datetime.now().strftime('%H:%M:%S')
-            socketio.emit('webchat_message', {
+            timestamp = self.event_timestamp(event)
+            self.emitter.emit('webchat_message', {
                 'nick': '',
                 'message': f'* {nick} has joined {channel}',
                 'timestamp': timestamp
             }, room=channel)
-        
-        # Request topic
-        logger.info(f"Requesting TOPIC for {channel}")
-        connection.topic(channel)
+
+    def resync_channel(self, channel, names=False, topic=False, who=False, bans=False):
+        """Queue NAMES, TOPIC, WHO and/or ban list requests for a tracked channel (rate limited)."""
+        chan = self.webchat_channels.get(channel)
+        if chan is None:
+            return False
+        if names:
+            self.resync.request('names', chan.name)
+        if topic:
+            self.resync.request('topic', chan.name)
+        if who:
+            self.resync.request('who', chan.name)
+        if bans:
+            self.resync.request('bans', chan.name)
+        return True
+
+    def _send_resync(self, kind, channel):
+        """Send one queued resync request (called from ResyncQueue.drain on the reactor)."""
+        if not self.connection or not self.connection.is_connected() or channel not in self.webchat_channels:
+            return
+        logger.info(f"Resyncing {kind} for {channel}")
+        with self.send_queue.lane('bulk'):
+            if kind == 'names':
+                self.connection.names([channel])
+            elif kind == 'who':
+                self.connection.who(channel)
+            elif kind == 'bans':
+                self.connection.mode(channel, '+b')
+            else:
+                self.connection.topic(channel)
 
     def kick(self, connection, channel, nick, reason):
         """Kick a user from a channel with a reason."""
@@ -175,7 +264,7 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
             connection.kick(channel, nick, reason)
             logger.info(f"Kicked {nick} from {channel}: {reason}")
             # Emit system message to webchat
-            socketio.emit('webchat_message', {
+            self.emitter.emit('webchat_message', {
                 'nick': '',
                 'message': f'* {nick} has been kicked: {reason}',
                 'timestamp': datetime.now().strftime('%H:%M:%S')
@@ -189,9 +278,6 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         nick = event.source.nick
         message = event.arguments[0]
         
-        # Reload settings before checking
-        self.reload_channel_settings()
-        
         # Check for flood
         if self.check_flood(channel, nick):
             self.kick(connection, channel, nick, "Flooding detected")
@@ -204,27 +290,13 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         
         logger.info(f"Received message in {channel} from {nick}: {message}")
         
-        # Store message in webchat_messages
-        if not hasattr(self, 'webchat_messages'):
-            self.webchat_messages = {}
-        if channel not in self.webchat_messages:
-            self.webchat_messages[channel] = []
-        self.webchat_messages[channel].append({
-            'nick': nick,
-            'message': message,
-            'timestamp': datetime.now().strftime('%H:%M:%S')
-        })
+        self.webchat_channels.seen(event.source)
         
-        # Limit history to last 100 messages
-        if len(self.webchat_messages[channel]) > 100:
-            self.webchat_messages[channel] = self.webchat_messages[channel][-100:]
+        # Store message in webchat history, at the server's time when it sends one
+        record = self.store_message(channel, nick, message, server_time(event))
         
         # Emit message to webchat
-        socketio.emit('webchat_message', {
-            'nick': nick,
-            'message': message,
-            'timestamp': datetime.now().strftime('%H:%M:%S')
-        }, room=channel)
+        self.emitter.emit('webchat_message', record.to_dict(), room=channel)
         
         # Check if message is a command
         if message.startswith('!'):
@@ -232,13 +304,9 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
             args = message[1:].split()[1:]
             logger.info(f"Received command: {command} with args: {args}")
             
-            # Pass command to module loader
+            # Pass command to module loader; the module runs on its worker pool
             if hasattr(self, 'module_loader'):
-                try:
-                    self.module_loader.handle_command(connection, event, command, args, channel, nick)
-                except Exception as e:
-                    logger.error(f"Error handling command: {e}")
-                    self.send_message(connection, channel, "Error executing command.")
+                self.module_loader.handle_command(connection, event, command, args, channel, nick)
         # Check if message mentions the bot's name
         elif self.nick.lower() in message.lower():
             # Get or create conversation
@@ -248,17 +316,8 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
             conversation = self.conversations[conv_key]
             conversation.update()
             
-            # Get AI response within application context
-            with app.app_context():
-                response = self.get_chatgpt_response(message, conversation)
-                if response:
-                    # Use send_message to ensure proper IRC and webchat handling
-                    self.send_message(connection, channel, response)
-                    # Store bot's response in conversation
-                    conversation.messages.append({"role": "assistant", "content": response})
-                else:
-                    logger.warning("No AI response received")
-                    self.send_message(connection, channel, "I'm sorry, I couldn't generate a response at this time.")
+            # Get AI response on a worker thread so the reactor keeps running
+            self.request_ai_response(connection, channel, message, conversation)
         
         # URL Watcher integration
         self.url_watcher.handle_message(channel, nick, message)
@@ -280,6 +339,51 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
             del self.conversations[key]
             logger.info(f"Removed expired conversation: {key}")
 
+    def _connection_factory(self):
+        """Create IRC connection factory with SSL context that accepts invalid certificates."""
+        self.client_cert_loaded = False
+        if not self.use_ssl:
+            return irc.connection.Factory()
+        logger.info("Creating SSL context with self-signed certificate support")
+        ssl_context = ssl.create_default_context()
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+        if self.client_cert:
+            # Presented to the server for SASL EXTERNAL (CertFP)
+            try:
+                ssl_context.load_cert_chain(self.client_cert)
+                self.client_cert_loaded = True
+            except (OSError, ssl.SSLError) as e:
+                logger.error(f"Could not load client certificate {self.client_cert}: {e}; falling back to SASL PLAIN")
+        return irc.connection.Factory(wrapper=lambda sock: ssl_context.wrap_socket(sock))
+
+    def connect(self, *args, **kwargs):
+        """Connect to the server (also used by reconnects); starts the connect timer."""
+        self.sequencer.connecting()
+        with app.app_context():
+            settings = BotSettings.query.first()
+            password = settings.nickserv_password if settings else None
+        # Negotiate capabilities and authenticate with SASL before registering
+        self.caps.connecting(self.nick, password, external=self.client_cert_loaded)
+        return super().connect(*args, **kwargs)
+
+    def on_cap(self, connection, event):
+        self.caps.on_cap(connection, event)
+
+    def on_authenticate(self, connection, event):
+        self.caps.on_authenticate(connection, event)
+
+    def on_903(self, connection, event):
+        """RPL_SASLSUCCESS."""
+        self.caps.sasl_success(connection)
+
+    on_907 = on_903  # ERR_SASLALREADY
+
+    def _on_sasl_failed(self, connection, event):
+        self.caps.sasl_failed(connection, event.type, event.arguments[-1] if event.arguments else '')
+
+    on_902 = on_904 = on_905 = on_906 = _on_sasl_failed
+
     def _connect_and_run(self):
         """Connect to the server and start the bot."""
         if not self.is_connecting:
@@ -304,7 +408,7 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
                 logger.info("Updated connection status in database")
                 
                 # Emit status update with server information
-                socketio.emit('status_update', {
+                self.emitter.emit('status_update', {
                     'connected': True,
                     'server': settings.server,
                     'port': settings.port
@@ -314,34 +418,62 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
                 logger.info("Setting usermode +B")
                 connection.mode(connection.get_nickname(), "+B")
                 
-                # Identify with NickServ if password is set
-                if settings.nickserv_password:
-                    logger.info("Identifying with NickServ")
-                    connection.privmsg("nickserv", f"IDENTIFY {settings.nickserv_password}")
-                    # Wait a bit for identification to process
-                    time.sleep(2)
-                    
-                    # If we're using an alternate nick and have the original nick stored, try to reclaim it
-                    if hasattr(self, 'original_nick') and connection.get_nickname() != self.original_nick:
-                        logger.info(f"Attempting to reclaim original nickname: {self.original_nick}")
-                        connection.nick(self.original_nick)
-                        # Clear the stored original nick after attempting to reclaim
-                        delattr(self, 'original_nick')
-                
-                # Join channels
-                if settings.channels:
-                    channels = [chan.strip() for chan in settings.channels.split(',')]
-                    for channel in channels:
-                        if channel:
-                            logger.info(f"Joining channel: {channel}")
-                            print(f"[DEBUG] Assigning Channel({channel}) to self.webchat_channels[{channel}] in on_welcome")
-                            self.webchat_channels[channel] = Channel(channel)
-                            connection.join(channel)
+                # Join channels, starting from empty channel state on this connection
+                self.webchat_channels.clear()
+                channels = [chan.strip() for chan in (settings.channels or '').split(',') if chan.strip()]
+                for channel in channels:
+                    self.webchat_channels.add(channel)
+                # Identifies with NickServ first unless SASL already did, then sends batched JOINs
+                self.caps.registered()
+                password = settings.nickserv_password
+                if self.caps.sasl_result == 'success':
+                    password = None
+                    self.reclaim_nick(connection)
+                self.sequencer.welcome(connection, channels, password)
+
+    def reclaim_nick(self, connection):
+        """Take back the configured nick if we had to register with an alternate."""
+        # If we're using an alternate nick and have the original nick stored, try to reclaim it
+        if hasattr(self, 'original_nick') and connection.get_nickname() != self.original_nick:
+            logger.info(f"Attempting to reclaim original nickname: {self.original_nick}")
+            connection.nick(self.original_nick)
+            # Clear the stored original nick after attempting to reclaim
+            delattr(self, 'original_nick')
+
+    def on_privnotice(self, connection, event):
+        """Private notices; NickServ's settle a pending IDENTIFY."""
+        if event.source and event.source.nick and event.source.nick.lower() == 'nickserv':
+            self.sequencer.nickserv_notice(connection, event.arguments[0] if event.arguments else '')
+
+    def on_900(self, connection, event):
+        """RPL_LOGGEDIN: services confirmed our account."""
+        logger.info(f"Logged in: {event.arguments[-1] if event.arguments else ''}")
+        self.sequencer.identified(connection)
+
+    def _on_join_failed(self, connection, event):
+        """JOIN refused (full, invite only, banned, bad key, ...)."""
+        channel = event.arguments[0] if event.arguments else ''
+        reason = event.arguments[1] if len(event.arguments) > 1 else event.type
+        self.sequencer.join_failed(channel, reason)
+        if channel in self.webchat_channels and not self.webchat_channels[channel].members:
+            del self.webchat_channels[channel]
+            self.emitter.emit('webchat_channels', {'channels': list(self.webchat_channels.keys())})
+
+    on_channelisfull = on_inviteonlychan = on_bannedfromchan = _on_join_failed
+    on_badchannelkey = on_badchanmask = on_nosuchchannel = on_toomanychannels = _on_join_failed
+
+    def on_featurelist(self, connection, event):
+        """Called for each ISUPPORT (005) line; picks up the server's CASEMAPPING."""
+        casemapping = getattr(connection.features, 'casemapping', None)
+        if casemapping:
+            self.webchat_channels.set_casemapping(casemapping)
 
     def on_disconnect(self, connection, event):
         """Called when the bot disconnects from the server."""
         logger.info("Disconnected from server")
         self.is_connecting = False
+        self.send_queue.clear()
+        self.resync.clear()
         
         # Update connection status in database
         with app.app_context():
@@ -352,7 +484,7 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
                 logger.info("Updated connection status in database")
                 
                 # Emit status update
-                socketio.emit('status_update', {
+                self.emitter.emit('status_update', {
                     'connected': False,
                     'server': settings.server,
                     'port': settings.port
@@ -377,99 +509,118 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         nick = event.source.nick if hasattr(event.source, 'nick') else None
         logger.info(f"Part event for channel {channel} by {nick}")
         
+        if nick == connection.get_nickname():
+            self.url_watcher.cancel_channel(channel)
+        
         if channel in self.webchat_channels and nick:
             logger.info(f"Removing user {nick} from channel {channel}")
-            self.webchat_channels[channel].remove_user(nick)
-            # Clear message history for this user in this channel
-            if channel in self.message_history and nick in self.message_history[channel]:
-                del self.message_history[channel][nick]
-            # Broadcast updated userlist
-            socketio.emit('webchat_users', {
-                'users': self.webchat_channels[channel].get_users()
-            }, room=channel)
+            change = self.webchat_channels[channel].remove_user(nick)
+            # Stop tracking message rate for this user in this channel
+            self.flood_detector.forget(channel, nick)
+            # Broadcast the userlist change
+            self.emit_user_changes(self.webchat_channels[channel], change)
             # Emit system part message
-            timestamp = datetime.now().strftime('%H:%M:%S')
-            socketio.emit('webchat_message', {
+            timestamp = self.event_timestamp(event)
+            self.emitter.emit('webchat_message', {
                 'nick': '',
                 'message': f'* {nick} has left {channel}',
                 'timestamp': timestamp
             }, room=channel)
         
-        if channel in self.webchat_channels and not self.webchat_channels[channel].get_users():
-            logger.info(f"Removing empty channel {channel}")
+        if channel in self.webchat_channels and (nick == connection.get_nickname() or not self.webchat_channels[channel].members):
+            logger.info(f"Removing channel tracking for {channel}")
             del self.webchat_channels[channel]
+            self.flood_detector.forget_channel(channel)
 
     def on_namreply(self, connection, event):
-        """Called when receiving names list for a channel."""
+        """Called for each RPL_NAMREPLY (353) chunk of a channel's names list."""
         channel = event.arguments[1]
-        logger.info(f"Received NAMES list for {channel}")
-        logger.info(f"NAMES list arguments: {event.arguments}")
-        
-        # Ensure channel exists in our tracking
-        if channel not in self.webchat_channels:
-            logger.info(f"Creating new channel tracking for {channel}")
-            self.webchat_channels[channel] = Channel(channel)
-        
-        # Clear existing users for this channel
-        logger.info(f"Clearing existing users for {channel}")
-        self.webchat_channels[channel].users.clear()
-        
-        # Add each user to the channel
-        users = event.arguments[2].split()
-        logger.info(f"Raw users list: {users}")
-        logger.info(f"Adding {len(users)} users to {channel}")
-        
-        for nick in users:
-            mode = ""
-            if nick[0] in '~&@%+':
-                mode = nick[0]
-                nick = nick[1:]
-            logger.info(f"Adding user {nick} with mode {mode} to {channel}")
-            self.webchat_channels[channel].add_user(nick, mode)
-        
-        # Get current users and emit update
-        current_users = self.webchat_channels[channel].get_users()
-        logger.info(f"Current users in channel {channel}: {current_users}")
-        logger.info(f"Emitting userlist update for {channel} with {len(current_users)} users")
-        
-        # Emit to all clients in the channel
-        socketio.emit('webchat_users', {
-            'users': current_users
-        }, room=channel)
+        chan = self.webchat_channels.get(channel)
+        if chan is None:
+            logger.debug(f"Ignoring NAMES for untracked channel {channel}")
+            return
+        # Large channels span several 353 lines; stage them until RPL_ENDOFNAMES
+        chan.stage_names(event.arguments[2], connection.features.prefix)
+
+    def on_endofnames(self, connection, event):
+        """Called on RPL_ENDOFNAMES (366): swap in the staged names list."""
+        channel = event.arguments[0]
+        chan = self.webchat_channels.get(channel)
+        if chan is None or not chan.finish_names():
+            return
+        logger.info(f"Received NAMES list for {channel}: {len(chan.members)} users")
+        # Send the full list to all clients in the channel
+        self.emitter.emit('webchat_users', chan.snapshot(), room=chan.name)
+        # Without userhost-in-names, hostmasks (for ban matching) need one WHO per
+        # join; later NAMES resyncs must not trigger more (users that join after
+        # it get their hostmask from the JOIN itself)
+        if not self.caps.has('userhost-in-names') and not chan.who_requested and chan.missing_hosts():
+            chan.who_requested = True
+            self.resync_channel(channel, who=True)
+
+    def on_whoreply(self, connection, event):
+        """RPL_WHOREPLY (352): channel user host server nick flags :hops realname."""
+        if len(event.arguments) < 7:
+            return
+        _, user, host, _, nick, flags, rest = event.arguments[:7]
+        tracked = self.webchat_channels.get_user(nick)
+        if tracked is None:
+            return
+        away = (tracked.away or '') if 'G' in flags else None
+        self.webchat_channels.update_user(nick, user=user, host=host, away=away,
+                                          realname=rest.partition(' ')[2])
+
+    def on_away(self, connection, event):
+        """away-notify: AWAY with a message marks the user away, without one back."""
+        self.webchat_channels.update_user(event.source.nick, away=event.target)
+
+    def on_account(self, connection, event):
+        """account-notify: the user logged in to (or out of, '*') a services account."""
+        account = event.target
+        self.webchat_channels.update_user(event.source.nick, account=None if account in (None, '*') else account)
+
+    def on_chghost(self, connection, event):
+        """chghost: CHGHOST new_user new_host."""
+        if event.arguments:
+            self.webchat_channels.update_user(event.source.nick, user=event.target, host=event.arguments[0])
 
     def on_topic(self, connection, event):
         """Called when a channel topic is set or changed."""
         channel = event.target
         topic = event.arguments[0] if event.arguments else ''
         logger.info(f"Topic changed for {channel}: {topic}")
-        
-        # Store topic
-        if not hasattr(self, 'topics'):
-            self.topics = {}
-        self.topics[channel] = topic
-        
-        # Emit topic update to all clients in the channel
-        socketio.emit('webchat_topic', {
-            'topic': topic,
-            'channel': channel
-        }, room=channel)
+        self._set_topic(channel, topic, event.source.nick, int(server_time(event) or time.time()))
 
     def on_currenttopic(self, connection, event):
-        """Called when receiving current topic for a channel."""
+        """Called on RPL_TOPIC (332) after joining or a TOPIC query."""
         channel = event.arguments[0]
         topic = event.arguments[1] if len(event.arguments) > 1 else ''
         logger.info(f"Current topic for {channel}: {topic}")
-        
-        # Store topic
-        if not hasattr(self, 'topics'):
-            self.topics = {}
-        self.topics[channel] = topic
-        
+        self._set_topic(channel, topic)
+
+    def on_notopic(self, connection, event):
+        """Called on RPL_NOTOPIC (331)."""
+        self._set_topic(event.arguments[0], '')
+
+    def on_topicinfo(self, connection, event):
+        """Called on RPL_TOPICWHOTIME (333): who set the topic and when."""
+        chan = self.webchat_channels.get(event.arguments[0])
+        if chan is None or len(event.arguments) < 3:
+            return
+        try:
+            set_at = int(event.arguments[2])
+        except ValueError:
+            set_at = None
+        chan.set_topic(chan.topic, event.arguments[1], set_at)
+        self.emitter.emit('webchat_topic', chan.topic_info(), room=chan.name)
+
+    def _set_topic(self, channel, topic, set_by=None, set_at=None):
+        chan = self.webchat_channels.get(channel)
+        if chan is None:
+            return
+        chan.set_topic(topic, set_by, set_at)
         # Emit topic update to all clients in the channel
-        socketio.emit('webchat_topic', {
-            'topic': topic,
-            'channel': channel
-        }, room=channel)
+        self.emitter.emit('webchat_topic', chan.topic_info(), room=chan.name)
 
     def reconnect(self):
         """Reconnect to the IRC server with new settings."""
@@ -492,15 +643,9 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
                 self.username = settings.username
                 self.realname = settings.realname
                 self.use_ssl = settings.use_ssl
+                self.client_cert = settings.client_cert
                 
-                # Create IRC connection factory with SSL context that accepts invalid certificates
-                factory = irc.connection.Factory()
-                if self.use_ssl:
-                    logger.info("Creating SSL context with self-signed certificate support")
-                    ssl_context = ssl.create_default_context()
-                    ssl_context.check_hostname = False
-                    ssl_context.verify_mode = ssl.CERT_NONE
-                    factory = irc.connection.Factory(wrapper=lambda sock: ssl_context.wrap_socket(sock))
+                factory = self._connection_factory()
                 
                 # Update connection factory
                 self._connect_factory = factory
@@ -520,7 +665,11 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
             self.connection = None
             self.is_connecting = False
             self.webchat_channels.clear()
-            self.conversations.clear() 
+            self.conversations.clear()
+            self.ai_pool.shutdown()
+            self.url_watcher.shutdown()
+            self.emitter.shutdown()
+            self.module_loader.pool.shutdown()
 
     def is_actually_connected(self):
         """Check if the bot is actually connected to the IRC server."""
@@ -538,61 +687,42 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
 
     def load_channel_settings(self):
         """Load channel management settings from database."""
-        with app.app_context():
-            settings = ChannelManagementSettings.query.all()
-            for setting in settings:
-                self.channel_settings[setting.channel] = {
-                    'is_enabled': setting.is_enabled,
-                    'flood_threshold': setting.flood_threshold,
-                    'flood_timeframe': setting.flood_timeframe,
-                    'caps_percentage': setting.caps_percentage
-                }
-            logger.info(f"Loaded channel settings: {self.channel_settings}")
+        self.channel_settings.snapshot()
 
     def reload_channel_settings(self):
-        """Reload channel management settings from database."""
-        self.channel_settings.clear()  # Clear existing settings
-        with app.app_context():
-            settings = ChannelManagementSettings.query.all()
-            for setting in settings:
-                self.channel_settings[setting.channel] = {
-                    'is_enabled': setting.is_enabled,
-                    'flood_threshold': setting.flood_threshold,
-                    'flood_timeframe': setting.flood_timeframe,
-                    'caps_percentage': setting.caps_percentage
-                }
-            logger.info(f"Reloaded channel settings: {self.channel_settings}")
+        """Invalidate cached channel management settings after a change."""
+        self.channel_settings.invalidate()
+        logger.info("Channel settings cache invalidated")
+
+    def get_stats(self):
+        """Return runtime counters for the dashboard."""
+        return {
+            'channel_settings': self.channel_settings.get_stats(),
+            'scrollback': self.webchat_messages.get_stats(),
+            'history': self.history.get_stats(),
+            'ai': self.ai_pool.get_stats(),
+            'url_watcher': self.url_watcher.get_stats(),
+            'http': self.http.get_stats(),
+            'send_queue': self.send_queue.get_stats(),
+            'emitter': self.emitter.get_stats(),
+            'channels': self.webchat_channels.get_stats(),
+            'resync': self.resync.get_stats(),
+            'connect': self.sequencer.get_stats(),
+            'caps': self.caps.get_stats(),
+            'modules': self.module_loader.get_stats(),
+            'flood_detector': self.flood_detector.get_stats()
+        }
 
     def check_flood(self, channel, nick):
         """Check if a user is flooding in a channel."""
-        if not self.channel_settings.get(channel, {}).get('is_enabled', False):
+        settings = self.channel_settings.get(channel)
+        if not settings or not settings.get('is_enabled', False):
             return False
 
-        settings = self.channel_settings[channel]
         threshold = settings.get('flood_threshold', 5)
         timeframe = settings.get('flood_timeframe', 10)
 
-        # Initialize message history for this channel if not exists
-        if channel not in self.message_history:
-            self.message_history[channel] = {}
-
-        # Initialize message history for this user if not exists
-        if nick not in self.message_history[channel]:
-            self.message_history[channel][nick] = []
-
-        # Add current message timestamp
-        current_time = datetime.now()
-        self.message_history[channel][nick].append(current_time)
-
-        # Remove messages outside the timeframe
-        cutoff_time = current_time - timedelta(seconds=timeframe)
-        self.message_history[channel][nick] = [
-            t for t in self.message_history[channel][nick]
-            if t > cutoff_time
-        ]
-
-        # Check if user has exceeded the threshold
-        if len(self.message_history[channel][nick]) > threshold:
+        if self.flood_detector.check(channel, nick, threshold, timeframe):
             logger.warning(f"Flood detected from {nick} in {channel}")
             return True
 
@@ -600,10 +730,10 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
 
     def check_caps(self, channel, message):
         """Check if a message contains excessive caps."""
-        if not self.channel_settings.get(channel, {}).get('is_enabled', False):
+        settings = self.channel_settings.get(channel)
+        if not settings or not settings.get('is_enabled', False):
             return False
 
-        settings = self.channel_settings[channel]
         caps_percentage = settings.get('caps_percentage', 70)
 
         # Count uppercase letters
@@ -632,22 +762,26 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         
         logger.info(f"Kick event in {channel}: {kicker} kicked {kicked_nick}: {reason}")
         
+        if kicked_nick == connection.get_nickname():
+            self.url_watcher.cancel_channel(channel)
+        
         if channel in self.webchat_channels:
             # Remove user from channel
-            self.webchat_channels[channel].remove_user(kicked_nick)
-            # Clear message history for this user in this channel
-            if channel in self.message_history and kicked_nick in self.message_history[channel]:
-                del self.message_history[channel][kicked_nick]
-            # Broadcast updated userlist
-            socketio.emit('webchat_users', {
-                'users': self.webchat_channels[channel].get_users()
-            }, room=channel)
+            change = self.webchat_channels[channel].remove_user(kicked_nick)
+            # Stop tracking message rate for this user in this channel
+            self.flood_detector.forget(channel, kicked_nick)
+            # Broadcast the userlist change
+            self.emit_user_changes(self.webchat_channels[channel], change)
             # Emit system kick message
-            socketio.emit('webchat_message', {
+            self.emitter.emit('webchat_message', {
                 'nick': '',
                 'message': f'* {kicked_nick} was kicked by {kicker}: {reason}',
-                'timestamp': datetime.now().strftime('%H:%M:%S')
+                'timestamp': self.event_timestamp(event)
             }, room=channel)
+            if kicked_nick == connection.get_nickname():
+                # We are no longer in the channel, so stop tracking its members
+                del self.webchat_channels[channel]
+                self.flood_detector.forget_channel(channel)
 
     def on_mode(self, connection, event):
         """Called when channel modes are changed."""
@@ -658,60 +792,73 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         
         logger.info(f"Mode change in {channel} by {source}: {modes} {args}")
         
-        # Handle ban modes (+b/-b)
-        if 'b' in modes:
-            mode_type = modes[0]  # + or -
-            if mode_type == '+':
-                # Ban added
-                ban_mask = args[0]
-                socketio.emit('webchat_message', {
-                    'nick': '',
-                    'message': f'* {source} banned {ban_mask}',
-                    'timestamp': datetime.now().strftime('%H:%M:%S')
-                }, room=channel)
-            else:
-                # Ban removed
-                ban_mask = args[0]
-                socketio.emit('webchat_message', {
-                    'nick': '',
-                    'message': f'* {source} unbanned {ban_mask}',
-                    'timestamp': datetime.now().strftime('%H:%M:%S')
-                }, room=channel)
-
-    def on_ban(self, connection, event):
-        """Called when a user is banned from a channel."""
-        channel = event.target
-        ban_mask = event.arguments[0]
-        banner = event.source.nick
-        
-        logger.info(f"Ban event in {channel}: {banner} banned {ban_mask}")
-        
-        # Check if the banned user is in our channel
-        if channel in self.webchat_channels:
-            # Try to match the ban mask to a user in the channel
-            for nick in list(self.webchat_channels[channel].users.keys()):
-                if self._match_ban_mask(nick, ban_mask):
-                    # Remove user from channel
-                    self.webchat_channels[channel].remove_user(nick)
-                    # Broadcast updated userlist
-                    socketio.emit('webchat_users', {
-                        'users': self.webchat_channels[channel].get_users()
-                    }, room=channel)
-                    # Emit system ban message
-                    socketio.emit('webchat_message', {
-                        'nick': '',
-                        'message': f'* {nick} was banned by {banner}',
-                        'timestamp': datetime.now().strftime('%H:%M:%S')
-                    }, room=channel)
-
-    def _match_ban_mask(self, nick, ban_mask):
-        """Check if a nickname matches a ban mask."""
-        # Convert ban mask to regex pattern
-        pattern = ban_mask.replace('*', '.*').replace('?', '.')
-        try:
-            return bool(re.match(pattern, nick, re.IGNORECASE))
-        except re.error:
-            return False
+        # Track status prefixes (+o, +v, ...) and the ban list
+        chan = self.webchat_channels.get(channel)
+        if chan is None:
+            return
+        prefixes = connection.features.prefix  # {prefix: mode letter}, highest rank first
+        mode_prefixes = {mode: prefix for prefix, mode in prefixes.items()}
+        changes = []
+        for sign, mode, argument in parse_modes(modes, args, connection.features):
+            if not argument:
+                continue
+            if mode in mode_prefixes:
+                if not chan.has_user(argument) and chan.synced:
+                    # A status change for someone we do not know: our list is stale
+                    self.resync_channel(channel, names=True)
+                changes.append(chan.set_prefix(argument, mode_prefixes[mode], sign == '+', prefixes))
+                if mode == 'o' and sign == '+' and not chan.bans.synced and self._is_me(argument):
+                    # Opped: fetch the ban list so new bans can be matched against it
+                    self.resync_channel(channel, bans=True)
+            elif mode == 'b':
+                self._ban_changed(chan, sign, argument, source, event)
+        self.emit_user_changes(chan, *changes)
+
+    def _ban_changed(self, chan, sign, mask, source, event):
+        """Apply MODE +b/-b to the channel's ban list and tell the webchat who it hits."""
+        if sign == '+':
+            chan.bans.add(mask, source, int(server_time(event) or time.time()))
+            hits = [user.nick for user in chan.bans.hits(mask, list(chan.members.values()))]
+            message = f'* {source} banned {mask}'
+            if hits:
+                shown = ', '.join(hits[:BAN_HITS_SHOWN])
+                more = f' and {len(hits) - BAN_HITS_SHOWN} more' if len(hits) > BAN_HITS_SHOWN else ''
+                message += f' (matches {shown}{more})'
+        else:
+            chan.bans.remove(mask)
+            message = f'* {source} unbanned {mask}'
+        self.emitter.emit('webchat_message', {
+            'nick': '',
+            'message': message,
+            'timestamp': self.event_timestamp(event)
+        }, room=chan.name)
+
+    def _is_me(self, nick):
+        fold = self.webchat_channels.fold
+        return fold(nick) == fold(self.connection.get_nickname())
+
+    def ban_hits(self, channel, mask):
+        """Tracked users in `channel` whose nick!user@host `mask` matches."""
+        chan = self.webchat_channels.get(channel)
+        if chan is None:
+            return []
+        return chan.bans.hits(mask, list(chan.members.values()))
+
+    def on_banlist(self, connection, event):
+        """RPL_BANLIST (367): channel mask [set_by [set_at]]."""
+        chan = self.webchat_channels.get(event.arguments[0]) if event.arguments else None
+        if chan is None or len(event.arguments) < 2:
+            return
+        set_by = event.arguments[2] if len(event.arguments) > 2 else None
+        set_at = int(event.arguments[3]) if len(event.arguments) > 3 and event.arguments[3].isdigit() else None
+        chan.bans.stage(event.arguments[1], set_by, set_at)
+
+    def on_endofbanlist(self, connection, event):
+        """RPL_ENDOFBANLIST (368)."""
+        chan = self.webchat_channels.get(event.arguments[0]) if event.arguments else None
+        if chan is not None:
+            chan.bans.finish()
+            logger.info(f"Ban list for {chan.name}: {len(chan.bans)} entries")
 
     def on_quit(self, connection, event):
         """Called when a user quits the server."""
@@ -720,23 +867,18 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         
         logger.info(f"Quit event: {nick} quit: {reason}")
         
-        # Remove user from all channels
-        for channel in self.webchat_channels.values():
-            if nick in channel.users:
-                channel.remove_user(nick)
-                # Clear message history for this user in this channel
-                if channel.name in self.message_history and nick in self.message_history[channel.name]:
-                    del self.message_history[channel.name][nick]
-                # Broadcast updated userlist
-                socketio.emit('webchat_users', {
-                    'users': channel.get_users()
-                }, room=channel.name)
-                # Emit system quit message
-                socketio.emit('webchat_message', {
-                    'nick': '',
-                    'message': f'* {nick} has quit: {reason}',
-                    'timestamp': datetime.now().strftime('%H:%M:%S')
-                }, room=channel.name)
+        # Remove user from the channels they were in
+        for channel, change in self.webchat_channels.remove_user(nick):
+            # Stop tracking message rate for this user in this channel
+            self.flood_detector.forget(channel.name, nick)
+            # Broadcast the userlist change
+            self.emit_user_changes(channel, change)
+            # Emit system quit message
+            self.emitter.emit('webchat_message', {
+                'nick': '',
+                'message': f'* {nick} has quit: {reason}',
+                'timestamp': self.event_timestamp(event)
+            }, room=channel.name)
 
     def on_nick(self, connection, event):
         """Called when a user changes their nickname."""
@@ -750,31 +892,30 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
 
         logger.info(f"Nick change: {old_nick} -> {new_nick}")
 
-        for channel in self.webchat_channels.values():
-            if old_nick in channel.users:
-                mode = channel.users[old_nick]
-                channel.remove_user(old_nick)
-                channel.add_user(new_nick, mode)
-                # Emit system nick change message
-                socketio.emit('webchat_message', {
-                    'nick': '',
-                    'message': f'* {old_nick} is now known as {new_nick}',
-                    'timestamp': datetime.now().strftime('%H:%M:%S')
-                }, room=channel.name)
+        for channel, change in self.webchat_channels.rename_user(old_nick, new_nick):
+            self.emit_user_changes(channel, change)
+            if change['op'] != 'rename':
+                continue  # A stale entry for new_nick was dropped
+            # Emit system nick change message
+            self.emitter.emit('webchat_message', {
+                'nick': '',
+                'message': f'* {old_nick} is now known as {new_nick}',
+                'timestamp': self.event_timestamp(event)
+            }, room=channel.name)
 
         # If the bot's nickname changed, update it
         if old_nick == self.nick:
             self.nick = new_nick
             logger.info(f"Bot's nickname changed to {new_nick}")
 
-        # Force userlist refresh for all channels
-        self.emit_all_userlists()
-        logger.info(f"Userlist refreshed after nick change: {old_nick} -> {new_nick}")
-
-    def emit_all_userlists(self):
-        for channel in self.webchat_channels.values():
-            socketio.emit('webchat_users', {
-                'users': channel.get_users()
+    def emit_user_changes(self, channel, *changes):
+        """Send userlist deltas for a channel to its webchat room."""
+        changes = [change for change in changes if change]
+        if changes:
+            self.emitter.emit('webchat_users', {
+                'channel': channel.name,
+                'version': channel.version,
+                'changes': changes
             }, room=channel.name)
 
     def on_glined(self, connection, event):
@@ -784,20 +925,16 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         
         logger.info(f"G-line event: {user} was G-lined: {reason}")
         
-        # Remove user from all channels
-        for channel in self.webchat_channels.values():
-            if user in channel.users:
-                channel.remove_user(user)
-                # Broadcast updated userlist
-                socketio.emit('webchat_users', {
-                    'users': channel.get_users()
-                }, room=channel.name)
-                # Emit system G-line message
-                socketio.emit('webchat_message', {
-                    'nick': '',
-                    'message': f'* {user} was G-lined: {reason}',
-                    'timestamp': datetime.now().strftime('%H:%M:%S')
-                }, room=channel.name)
+        # Remove user from the channels they were in
+        for channel, change in self.webchat_channels.remove_user(user):
+            # Broadcast the userlist change
+            self.emit_user_changes(channel, change)
+            # Emit system G-line message
+            self.emitter.emit('webchat_message', {
+                'nick': '',
+                'message': f'* {user} was G-lined: {reason}',
+                'timestamp': self.event_timestamp(event)
+            }, room=channel.name)
 
     def on_zlined(self, connection, event):
         """Called when a user is Z-lined (IP ban)."""
@@ -808,10 +945,10 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         
         # Note: We can't directly match IPs to users, but we can notify channels
         for channel in self.webchat_channels.values():
-            socketio.emit('webchat_message', {
+            self.emitter.emit('webchat_message', {
                 'nick': '',
                 'message': f'* IP {ip} was Z-lined: {reason}',
-                'timestamp': datetime.now().strftime('%H:%M:%S')
+                'timestamp': self.event_timestamp(event)
             }, room=channel.name)
 
     def on_klined(self, connection, event):
@@ -821,20 +958,16 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         
         logger.info(f"K-line event: {user} was K-lined: {reason}")
         
-        # Remove user from all channels
-        for channel in self.webchat_channels.values():
-            if user in channel.users:
-                channel.remove_user(user)
-                # Broadcast updated userlist
-                socketio.emit('webchat_users', {
-                    'users': channel.get_users()
-                }, room=channel.name)
-                # Emit system K-line message
-                socketio.emit('webchat_message', {
-                    'nick': '',
-                    'message': f'* {user} was K-lined: {reason}',
-                    'timestamp': datetime.now().strftime('%H:%M:%S')
-                }, room=channel.name)
+        # Remove user from the channels they were in
+        for channel, change in self.webchat_channels.remove_user(user):
+            # Broadcast the userlist change
+            self.emit_user_changes(channel, change)
+            # Emit system K-line message
+            self.emitter.emit('webchat_message', {
+                'nick': '',
+                'message': f'* {user} was K-lined: {reason}',
+                'timestamp': self.event_timestamp(event)
+            }, room=channel.name)
 
     def on_invite(self, connection, event):
         """Called when a user is invited to a channel."""
@@ -843,10 +976,10 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         inviter = event.source.nick if hasattr(event.source, 'nick') else str(event.source)
         logger.info(f"Invite event: {inviter} invited {invited_nick} to {channel}")
         if channel:
-            socketio.emit('webchat_message', {
+            self.emitter.emit('webchat_message', {
                 'nick': '',
                 'message': f'* {inviter} invited {invited_nick} into {channel}',
-                'timestamp': datetime.now().strftime('%H:%M:%S')
+                'timestamp': self.event_timestamp(event)
             }, room=channel)
 
     def on_ctcp(self, connection, event):
@@ -857,10 +990,10 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
             action_message = event.arguments[1] if len(event.arguments) > 1 else ''
             logger.info(f"CTCP ACTION in {channel} from {nick}: {action_message}")
             # Emit as a system message in webchat
-            socketio.emit('webchat_message', {
+            self.emitter.emit('webchat_message', {
                 'nick': '',
                 'message': f'* {nick} {action_message}',
-                'timestamp': datetime.now().strftime('%H:%M:%S')
+                'timestamp': self.event_timestamp(event)
             }, room=channel)
 
     def on_pubnotice(self, connection, event):
@@ -871,8 +1004,8 @@ class IRCBouncer(irc.bot.SingleServerIRCBot):
         # Look for invite pattern
         if 'invited' in message and 'into the channel' in message:
             # Example: '*** TheGrimPody invited Ponysauce into the channel'
-            socketio.emit('webchat_message', {
+            self.emitter.emit('webchat_message', {
                 'nick': '',
                 'message': message.strip('* '),
-                'timestamp': datetime.now().strftime('%H:%M:%S')
+                'timestamp': self.event_timestamp(event)
             }, room=channel) 
\ No newline at end of file
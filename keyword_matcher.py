@@ -0,0 +1,129 @@
+import re
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Spot back-references, which stop meaning the same thing once a pattern is one
+# branch of a larger alternation
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+SCOPED_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over case-insensitive keywords.
+
+    add(keyword, owner) any number of times, then build(); find(text)
+    returns the set of owners with a keyword occurring anywhere in text,
+    in a single pass over the text whatever the number of keywords.
+    """
+
+    def __init__(self):
+        self.goto = [{}]  # Per state: {char: next state}
+        self.fail = [0]
+        self.output = [set()]  # Owners whose keyword ends in this state (fail chain merged in)
+        self.keywords = 0
+
+    def add(self, keyword, owner):
+        keyword = keyword.lower()
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            following = self.goto[state].get(char)
+            if following is None:
+                following = len(self.goto)
+                self.goto[state][char] = following
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+            state = following
+        self.output[state].add(owner)
+        self.keywords += 1
+
+    def build(self):
+        """Compute failure links breadth-first; call once after the last add()."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, following in self.goto[state].items():
+                queue.append(following)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[following] = target if target != following else 0
+                self.output[following] |= self.output[self.fail[following]]
+        return self
+
+    def find(self, text):
+        """Owners of every keyword found in text (matched case-insensitively)."""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text.lower():
+            following = goto[state].get(char)
+            while following is None and state:
+                state = fail[state]
+                following = goto[state].get(char)
+            state = following or 0
+            if output[state]:
+                found |= output[state]
+        return found
+
+    def __len__(self):
+        return self.keywords
+
+
+class PatternMatcher:
+    """Declared regexes behind one combined alternation used as a prefilter.
+
+    Most messages match none of the patterns, so a single search of
+    "(?:p1)|(?:p2)|..." settles them in one scan. Only when it hits are the
+    patterns tried one by one to see which owners matched. Patterns that
+    cannot safely join the alternation (back-references, or the combined
+    regex failing to compile) are always tried individually.
+    """
+
+    def __init__(self):
+        self.patterns = []  # [(compiled, owner)]
+        self.standalone = []  # [(compiled, owner)] checked on every message
+        self.prefilter = None
+
+    def add(self, pattern, owner):
+        """Add a pattern string or compiled regex; returns False if it does not compile."""
+        try:
+            compiled = pattern if isinstance(pattern, re.Pattern) else re.compile(pattern)
+        except re.error as e:
+            logger.error(f"Invalid message pattern {pattern!r}: {e}")
+            return False
+        if BACKREFERENCE.search(compiled.pattern) or not isinstance(compiled.pattern, str):
+            self.standalone.append((compiled, owner))
+        else:
+            self.patterns.append((compiled, owner))
+        return True
+
+    def build(self):
+        if not self.patterns:
+            return self
+        branches = []
+        for compiled, _ in self.patterns:
+            flags = ''.join(letter for flag, letter in SCOPED_FLAGS if compiled.flags & flag)
+            branches.append(f"(?{flags}:{compiled.pattern})" if flags else f"(?:{compiled.pattern})")
+        try:
+            self.prefilter = re.compile('|'.join(branches))
+        except re.error as e:
+            logger.warning(f"Could not combine {len(self.patterns)} message patterns ({e}), checking them one by one")
+            self.standalone.extend(self.patterns)
+            self.patterns = []
+        return self
+
+    def find(self, text):
+        found = {owner for compiled, owner in self.standalone if compiled.search(text)}
+        if self.prefilter is not None and self.prefilter.search(text):
+            found.update(owner for compiled, owner in self.patterns
+                         if owner not in found and compiled.search(text))
+        return found
+
+    def __len__(self):
+        return len(self.patterns) + len(self.standalone)
@@ -2,6 +2,7 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from extensions import db
 from datetime import datetime
+from sqlalchemy import inspect, text
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -24,6 +25,7 @@ class BotSettings(db.Model):
     username = db.Column(db.String(50), nullable=False)
     realname = db.Column(db.String(255), nullable=False)
     nickserv_password = db.Column(db.String(255))
+    client_cert = db.Column(db.String(255))  # Path to a PEM certificate and key for SASL EXTERNAL
     channels = db.Column(db.Text)  # Store channels as comma-separated string
     is_connected = db.Column(db.Boolean, default=False)
 
@@ -60,14 +62,38 @@ class ChannelManagementSettings(db.Model):
     flood_threshold = db.Column(db.Integer, default=8)  # Number of messages
     flood_timeframe = db.Column(db.Integer, default=60)  # Time in seconds
     caps_percentage = db.Column(db.Integer, default=70)  # Percentage of caps to trigger kick
+    history_depth = db.Column(db.Integer, default=100)  # Webchat scrollback lines kept in memory
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     def __repr__(self):
         return f'<ChannelManagementSettings {self.channel}>'
 
+def add_missing_columns():
+    """Add columns that were introduced after a table was first created."""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            statement = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+            default = column.default.arg if column.default is not None and column.default.is_scalar else None
+            if isinstance(default, bool):
+                statement += f' DEFAULT {int(default)}'
+            elif isinstance(default, (int, float)):
+                statement += f' DEFAULT {default}'
+            elif isinstance(default, str):
+                statement += " DEFAULT '{}'".format(default.replace("'", "''"))
+            db.session.execute(text(statement))
+            db.session.commit()
+
 def init_db():
     db.create_all()
+    add_missing_columns()
     
     # Create default AI settings if they don't exist
     if not AISettings.query.first():
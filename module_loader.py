@@ -1,12 +1,98 @@
-import importlib.util
 import sys
+import types
+import hashlib
+import re
+import dis
+import time
 import logging
+import threading
+from collections import deque
+from datetime import datetime
 from models import Module
 from extensions import app, db
+from worker_pool import Timing, WorkerPool
+from keyword_matcher import KeywordMatcher, PatternMatcher
+from compile_cache import get_compile_cache
 import traceback # Import traceback for better error details
 
 logger = logging.getLogger(__name__)
 
+HOOKS = ('handle_message', 'handle_command', 'handle_event')  # Module methods the loader dispatches to
+SLOWEST_SHOWN = 5  # Modules listed per hook in the slowest-handlers stats
+
+MODULE_WORKERS = 4  # Threads running module hooks, off the reactor
+MODULE_MAX_QUEUE = 200  # Hook calls allowed to wait for a worker
+MODULE_CONCURRENCY = 1  # Hook calls of one module running at once, which keeps its replies in order
+MODULE_DEADLINE = 10  # Seconds a hook call may wait for a worker before it is dropped
+LATENCY_BUDGET = 2.0  # Seconds one hook call may run before it counts against its module
+QUARANTINE_STRIKES = 3  # Budget overruns within QUARANTINE_WINDOW that quarantine a module
+QUARANTINE_WINDOW = 300  # Seconds over which strikes are counted
+QUARANTINE_TIME = 600  # Seconds a quarantined module is left out of dispatch
+
+# Bytecode of a body that does nothing but return None ("pass", a docstring, bare "return")
+NOOP_OPCODES = {'RESUME', 'NOP', 'LOAD_CONST', 'RETURN_VALUE', 'RETURN_CONST', 'CACHE'}
+
+
+def is_noop(func):
+    """True if `func` is a plain Python function/method whose body only returns None."""
+    code = getattr(getattr(func, '__func__', func), '__code__', None)
+    if code is None:
+        return False
+    for instruction in dis.get_instructions(code):
+        if instruction.opname not in NOOP_OPCODES:
+            return False
+        if instruction.opname in ('LOAD_CONST', 'RETURN_CONST') and instruction.argval is not None:
+            return False
+    return True
+
+
+class DispatchTable:
+    """Immutable snapshot of which loaded modules handle which hook.
+
+    Built once per load/unload from the loaded instances, keeping only
+    modules that define a hook with a real body, and replaced as a whole so
+    the reactor thread always sees a consistent table while the web thread
+    reloads modules. Modules that declare `keywords` or `patterns` are only
+    handed the messages those match; the rest see every message.
+    """
+    __slots__ = ('messages', 'subscribed', 'keywords', 'patterns', 'events', 'commands', 'skipped')
+
+    def __init__(self, messages=(), subscribed=(), keywords=None, patterns=None, events=None,
+                 commands=None, skipped=None):
+        self.messages = tuple(messages)  # ((module_id, name, bound handle_message), ...) called for every message
+        self.subscribed = tuple(subscribed)  # Same entries, called when keywords/patterns hit their index
+        self.keywords = keywords  # KeywordMatcher over every declared keyword, or None
+        self.patterns = patterns  # PatternMatcher over every declared regex, or None
+        self.events = events or {}  # {event type: ((module_id, name, bound handle_event), ...)}
+        self.commands = commands or {}  # {trigger: (module_id, name, bound handle_command)}
+        self.skipped = skipped or {}  # {hook: [module names whose hook is missing or a no-op]}
+
+    def matching(self, message):
+        """Entries of `subscribed` whose keywords or patterns occur in message, in load order."""
+        hits = self.keywords.find(message) if self.keywords else set()
+        if self.patterns:
+            hits |= self.patterns.find(message)
+        return [self.subscribed[index] for index in sorted(hits)]
+
+
+def module_filename(module_id):
+    """Filename module code is compiled under, shown in tracebacks and registered with linecache."""
+    return f"<module_{module_id}>"
+
+
+def module_version(module_data):
+    """Content hash of a module's code; a module is only re-executed when it changes."""
+    return hashlib.sha256(module_data.code.encode('utf-8')).hexdigest()
+
+
+def declared(module_instance, attribute):
+    """A module's declared keywords/patterns/events as a list (a single string is one entry)."""
+    values = getattr(module_instance, attribute, None) or ()
+    if isinstance(values, (str, re.Pattern)):
+        values = (values,)
+    return list(values)
+
+
 class ModuleLoader:
     def __init__(self, bot):
         self.bot = bot
@@ -14,41 +100,187 @@ class ModuleLoader:
         # Store instances of the module classes
         self.loaded_modules = {} # {module_id: module_instance}
         self.module_triggers = {} # {trigger: module_id}
+        self.module_names = {} # {module_id: name from the database}
+        self.module_versions = {} # {module_id: (code hash, raw trigger, name)} of the loaded instance
+        self.load_times = {} # {module_id: ms its last load took}
+        self.last_sync = None # Summary of the last sync_modules()
+        self.dispatch = DispatchTable()  # Rebuilt after every load/unload, swapped in whole
+        self.lock = threading.RLock()  # Serializes loads/unloads from the web and reactor threads
+        self.timings = {}  # {(hook, module_id): Timing}
+        self.hook_timings = {hook: Timing() for hook in HOOKS}
+        self.errors = {hook: 0 for hook in HOOKS}
+        self.compile_cache = get_compile_cache()  # Marshalled code objects, so unchanged modules are not recompiled
+        # Hooks run here, keyed by module ID so one module's calls run one at a time and in order
+        self.pool = WorkerPool('modules', max_workers=MODULE_WORKERS, max_queue=MODULE_MAX_QUEUE,
+                               per_key_limit=MODULE_CONCURRENCY)
+        self.local = threading.local()  # .module is set while a worker runs a hook
+        self.strikes = {}  # {module_id: deque of monotonic times it went over LATENCY_BUDGET}
+        self.quarantined = {}  # {module_id: monotonic time it may be dispatched to again}
+        self.overdue = set()  # Running jobs the watchdog already counted a strike for
+        # Guards strikes/quarantined, which the reactor updates while the web thread may be
+        # unloading; held only briefly, unlike self.lock, which is held across module exec/cleanup
+        self.quarantine_lock = threading.Lock()
+        self.dispatch_stale = False  # Quarantine changed while a load held self.lock
+        self.rejected = 0
+        self.expired = 0
         logger.info("[ModuleLoader] Initializing and loading modules.")
         self.load_modules()
 
     def load_modules(self):
         """Load all enabled modules from the database."""
         logger.info("[ModuleLoader] Starting to load modules from database.")
-        with app.app_context():
+        with app.app_context(), self.lock:
             modules = Module.query.filter_by(is_enabled=True).all()
             logger.info(f"[ModuleLoader] Found {len(modules)} enabled modules in database.")
             # Unload existing modules before loading new ones
-            self.unload_all_modules()
+            self.unload_all_modules(rebuild=False)
             for module_data in modules: # Renamed variable to avoid conflict with module object
                 logger.info(f"[ModuleLoader] Loading module from DB - ID: {module_data.id}, Name: {module_data.name}, Raw Trigger: {module_data.trigger}")
-                self.load_module(module_data)
+                self.load_module(module_data, rebuild=False)
+            self.rebuild_dispatch()
+        self.compile_cache.prune()
         logger.info("[ModuleLoader] Finished loading modules.")
 
-
-    def load_module(self, module_data):
+    def sync_modules(self):
+        """Bring the loaded modules in line with the database, touching only what changed.
+
+        Modules that were disabled or deleted are unloaded, new ones loaded and
+        ones whose code changed reloaded; a trigger or name change is applied in
+        place. Every other instance keeps running with its in-memory state.
+        """
+        start = time.perf_counter()
+        summary = {'loaded': [], 'reloaded': [], 'unloaded': [], 'updated': [], 'failed': [], 'unchanged': 0}
+        with app.app_context(), self.lock:
+            enabled = {module_data.id: module_data for module_data in Module.query.filter_by(is_enabled=True).all()}
+            for module_id in [module_id for module_id in self.loaded_modules if module_id not in enabled]:
+                summary['unloaded'].append(self.module_names.get(module_id, f"ID {module_id}"))
+                self._unload_module(module_id)
+            for module_id, module_data in enabled.items():
+                loaded = self.module_versions.get(module_id) if module_id in self.loaded_modules else None
+                if loaded is None:
+                    action = 'loaded'
+                elif loaded[0] != module_version(module_data):
+                    action = 'reloaded'
+                    self._unload_module(module_id)
+                elif loaded[1:] != (module_data.trigger, module_data.name):
+                    self._unmap_trigger(module_id)
+                    self._map_trigger(module_data)
+                    self.module_names[module_id] = module_data.name
+                    self.module_versions[module_id] = (loaded[0], module_data.trigger, module_data.name)
+                    summary['updated'].append(module_data.name)
+                    continue
+                else:
+                    summary['unchanged'] += 1
+                    continue
+                if self._load_module(module_data):
+                    summary[action].append(f"{module_data.name} ({self.load_times[module_id]} ms)")
+                else:
+                    summary['failed'].append(module_data.name)
+            if any(summary[key] for key in ('loaded', 'reloaded', 'unloaded', 'updated', 'failed')):
+                self.rebuild_dispatch()
+                self.compile_cache.prune()
+            elif self.dispatch_stale:
+                self.rebuild_dispatch()
+        summary['ms'] = round((time.perf_counter() - start) * 1000, 2)
+        summary['at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.last_sync = summary
+        logger.info(f"[ModuleLoader] Synced modules in {summary['ms']} ms: loaded {summary['loaded']}, reloaded {summary['reloaded']}, "
+                    f"unloaded {summary['unloaded']}, updated {summary['updated']}, failed {summary['failed']}, {summary['unchanged']} unchanged.")
+        return summary
+
+    def rebuild_dispatch(self):
+        """Build the per-hook dispatch table from the loaded modules and swap it in."""
+        with self.lock:
+            self.dispatch_stale = False
+            with self.quarantine_lock:
+                quarantined = set(self.quarantined)
+            messages = []
+            subscribed = []
+            keywords = KeywordMatcher()
+            patterns = PatternMatcher()
+            events = {}
+            commands = {}
+            skipped = {hook: [] for hook in HOOKS}
+            for module_id, module_instance in self.loaded_modules.items():
+                name = self.module_names.get(module_id, f"ID {module_id}")
+                if module_id in quarantined:
+                    continue
+                handlers = {}
+                for hook in HOOKS:
+                    handler = getattr(module_instance, hook, None)
+                    if callable(handler) and not is_noop(handler):
+                        handlers[hook] = handler
+                    else:
+                        skipped[hook].append(name)
+
+                handler = handlers.get('handle_message')
+                module_keywords = declared(module_instance, 'keywords')
+                module_patterns = declared(module_instance, 'patterns')
+                if handler and (module_keywords or module_patterns):
+                    # Only called when one of its keywords or patterns occurs in the message
+                    index = len(subscribed)
+                    subscribed.append((module_id, name, handler))
+                    for keyword in module_keywords:
+                        keywords.add(keyword, index)
+                    for pattern in module_patterns:
+                        patterns.add(pattern, index)
+                elif handler:
+                    messages.append((module_id, name, handler))
+
+                module_events = declared(module_instance, 'events')
+                if module_events and 'handle_event' not in handlers:
+                    logger.warning(f"[ModuleLoader] Module {name} (ID: {module_id}) declares events but has no handle_event method.")
+                elif module_events:
+                    for event_type in module_events:
+                        event_type = event_type.lower()
+                        if event_type.startswith('on_'):
+                            event_type = event_type[3:]
+                        events.setdefault(event_type, []).append((module_id, name, handlers['handle_event']))
+
+            for trigger, module_id in self.module_triggers.items():
+                if module_id in quarantined:
+                    continue
+                module_instance = self.loaded_modules.get(module_id)
+                handler = getattr(module_instance, 'handle_command', None)
+                if callable(handler) and not is_noop(handler):
+                    commands[trigger] = (module_id, self.module_names.get(module_id, f"ID {module_id}"), handler)
+
+            self.dispatch = DispatchTable(
+                messages, subscribed,
+                keywords.build() if len(keywords) else None,
+                patterns.build() if len(patterns) else None,
+                {event_type: tuple(entries) for event_type, entries in events.items()},
+                commands, skipped)
+        logger.info(f"[ModuleLoader] Dispatch table rebuilt: {len(messages)} modules see every message, "
+                    f"{len(subscribed)} subscribe to {len(keywords)} keywords and {len(patterns)} patterns, "
+                    f"{sum(len(entries) for entries in events.values())} event handlers, {len(commands)} command triggers.")
+
+
+    def load_module(self, module_data, rebuild=True):
         """Load a single module."""
+        with self.lock:
+            loaded = self._load_module(module_data)
+            if rebuild:
+                self.rebuild_dispatch()
+        return loaded
+
+    def _load_module(self, module_data):
         module_name = f"module_{module_data.id}"
+        start = time.perf_counter()
 
         try:
-            spec = importlib.util.spec_from_loader(
-                module_name,
-                loader=importlib.machinery.SourceFileLoader(module_name, "<string>")
-            )
+            # Compiled code comes from the cache unless this source is new
+            code = self.compile_cache.compile(module_data.code, module_filename(module_data.id))
 
             # Create a new module object
-            module_obj = importlib.util.module_from_spec(spec)
+            module_obj = types.ModuleType(module_name)
+            module_obj.__file__ = module_filename(module_data.id)
 
             # Add the module object to sys.modules
             sys.modules[module_name] = module_obj
 
             # Execute the module code within the module object's dictionary
-            exec(module_data.code, module_obj.__dict__)
+            exec(code, module_obj.__dict__)
 
             # *** MODIFIED: Find and instantiate the Module class within the loaded module ***
             module_class = None
@@ -75,19 +307,9 @@ class ModuleLoader:
 
             # Store the module instance and its trigger
             self.loaded_modules[module_data.id] = module_instance
-            # Use the module's trigger for command dispatch
-            # Ensure trigger is treated case-insensitively for lookup
-            processed_trigger = module_data.trigger.lower()
-            while processed_trigger and processed_trigger[0] in '!@#': # Remove common command prefixes
-                 processed_trigger = processed_trigger[1:]
-
-            if processed_trigger:
-                 if processed_trigger in self.module_triggers:
-                      logger.warning(f"[ModuleLoader] Duplicate trigger '{processed_trigger}' found. Module {module_data.name} (ID: {module_data.id}) will overwrite the previous mapping.")
-                 self.module_triggers[processed_trigger] = module_data.id
-                 logger.info(f"[ModuleLoader] Mapped processed trigger '{processed_trigger}' to module ID {module_data.id}.")
-            else:
-                 logger.warning(f"[ModuleLoader] Module {module_data.name} (ID: {module_data.id}) has no valid trigger defined after removing prefixes.")
+            self.module_names[module_data.id] = module_data.name
+            self.module_versions[module_data.id] = (module_version(module_data), module_data.trigger, module_data.name)
+            self._map_trigger(module_data)
 
 
             # Call the init method on the instance if it exists
@@ -100,33 +322,61 @@ class ModuleLoader:
             #         logger.error(f"[ModuleLoader] Error initializing module {module_data.name}: {e}")
 
 
-            logger.info(f"[ModuleLoader] Successfully loaded and instantiated module: {module_data.name}")
+            self.load_times[module_data.id] = round((time.perf_counter() - start) * 1000, 2)
+            logger.info(f"[ModuleLoader] Successfully loaded and instantiated module: {module_data.name} in {self.load_times[module_data.id]} ms")
             return True
         except Exception as e:
             logger.error(f"[ModuleLoader] Unexpected error loading module {module_data.name} (ID: {module_data.id}): {e}\n{traceback.format_exc()}") # Added traceback
             self.cleanup_failed_load(module_data.id, module_name)
             return False
 
+    def _map_trigger(self, module_data):
+        """Map the module's trigger (without !@# prefixes) to its ID for command dispatch."""
+        # Use the module's trigger for command dispatch
+        # Ensure trigger is treated case-insensitively for lookup
+        processed_trigger = module_data.trigger.lower()
+        while processed_trigger and processed_trigger[0] in '!@#': # Remove common command prefixes
+             processed_trigger = processed_trigger[1:]
+
+        if processed_trigger:
+             if processed_trigger in self.module_triggers:
+                  logger.warning(f"[ModuleLoader] Duplicate trigger '{processed_trigger}' found. Module {module_data.name} (ID: {module_data.id}) will overwrite the previous mapping.")
+             self.module_triggers[processed_trigger] = module_data.id
+             logger.info(f"[ModuleLoader] Mapped processed trigger '{processed_trigger}' to module ID {module_data.id}.")
+        else:
+             logger.warning(f"[ModuleLoader] Module {module_data.name} (ID: {module_data.id}) has no valid trigger defined after removing prefixes.")
+
+    def _unmap_trigger(self, module_id):
+        """Remove the trigger mapping pointing at module_id, returning the trigger."""
+        # Need to find the trigger by module ID to remove it from module_triggers
+        for trigger, mod_id in list(self.module_triggers.items()):
+            if mod_id == module_id:
+                del self.module_triggers[trigger]
+                return trigger
+        return None
+
     def cleanup_failed_load(self, module_id, module_name):
         """Helper to clean up resources if a module fails to load."""
         if module_id in self.loaded_modules:
             del self.loaded_modules[module_id]
-        # Need to find the trigger by module ID to remove it from module_triggers
-        trigger_to_remove = None
-        for trigger, mod_id in list(self.module_triggers.items()):
-            if mod_id == module_id:
-                trigger_to_remove = trigger
-                break
-        if trigger_to_remove:
-            del self.module_triggers[trigger_to_remove]
+        self.module_names.pop(module_id, None)
+        self.module_versions.pop(module_id, None)
+        self._unmap_trigger(module_id)
+        self.compile_cache.release(module_filename(module_id))
 
         if module_name in sys.modules:
             del sys.modules[module_name]
         logger.warning(f"[ModuleLoader] Cleaned up resources for failed module load ID: {module_id}")
 
 
-    def unload_module(self, module_id):
+    def unload_module(self, module_id, rebuild=True):
         """Unload a module instance."""
+        with self.lock:
+            self._unload_module(module_id)
+            if rebuild:
+                self.rebuild_dispatch()
+
+    def _unload_module(self, module_id):
         logger.info(f"[ModuleLoader] Attempting to unload module ID: {module_id}")
         if module_id in self.loaded_modules:
             module_instance = self.loaded_modules[module_id]
@@ -141,14 +391,19 @@ class ModuleLoader:
 
             # Remove module instance from loaded_modules
             del self.loaded_modules[module_id]
+            self.module_names.pop(module_id, None)
+            self.module_versions.pop(module_id, None)
+            self.load_times.pop(module_id, None)
+            self.timings = {key: timing for key, timing in self.timings.items() if key[1] != module_id}
+            self.compile_cache.release(module_filename(module_id))
+            # New code starts with a clean record; queued calls would reach the old instance
+            with self.quarantine_lock:
+                self.quarantined.pop(module_id, None)
+                self.strikes.pop(module_id, None)
+            self.pool.cancel(lambda job: job.key == module_id)
             # Find and remove the trigger mapping
-            trigger_to_remove = None
-            for trigger, mod_id in list(self.module_triggers.items()):
-                if mod_id == module_id:
-                    trigger_to_remove = trigger
-                    break
+            trigger_to_remove = self._unmap_trigger(module_id)
             if trigger_to_remove:
-                del self.module_triggers[trigger_to_remove]
                 logger.info(f"[ModuleLoader] Removed trigger '{trigger_to_remove}' for module ID {module_id}.")
 
 
@@ -165,77 +420,214 @@ class ModuleLoader:
         else:
             logger.warning(f"[ModuleLoader] Attempted to unload module ID {module_id}, but it was not found in loaded_modules.")
 
-    def unload_all_modules(self):
+    def unload_all_modules(self, rebuild=True):
         """Unload all currently loaded modules."""
         logger.info("[ModuleLoader] Unloading all modules.")
-        # Iterate over a copy of keys as unloading modifies the dictionary
-        for module_id in list(self.loaded_modules.keys()):
-            self.unload_module(module_id)
+        with self.lock:
+            # Iterate over a copy of keys as unloading modifies the dictionary
+            for module_id in list(self.loaded_modules.keys()):
+                self._unload_module(module_id)
+            if rebuild:
+                self.rebuild_dispatch()
         logger.info("[ModuleLoader] Finished unloading all modules.")
 
 
     def reload_module(self, module_data):
         """Reload a module."""
         logger.info(f"[ModuleLoader] Reloading module: {module_data.name} (ID: {module_data.id})")
-        self.unload_module(module_data.id)
-        # Fetch the latest data from the database before loading
-        with app.app_context():
-             updated_module_data = Module.query.get(module_data.id)
-             if updated_module_data:
-                  return self.load_module(updated_module_data)
-             else:
-                  logger.error(f"[ModuleLoader] Cannot reload module ID {module_data.id}: module not found in database.")
-                  return False
-
+        with self.lock:
+            self.unload_module(module_data.id, rebuild=False)
+            # Fetch the latest data from the database before loading
+            with app.app_context():
+                 updated_module_data = Module.query.get(module_data.id)
+                 if updated_module_data:
+                      return self.load_module(updated_module_data)
+                 else:
+                      logger.error(f"[ModuleLoader] Cannot reload module ID {module_data.id}: module not found in database.")
+                      self.rebuild_dispatch()
+                      return False
+
+
+    def in_worker(self):
+        """True on a worker thread while it runs a module hook."""
+        return getattr(self.local, 'module', None) is not None
+
+    def _submit(self, hook, module_id, name, handler, *args):
+        """Queue one module hook on the worker pool; its outcome is recorded on the reactor."""
+        if self.is_quarantined(module_id):
+            return  # Still in a table read before the quarantine
+        job = self.pool.submit(self._run_hook, hook, name, handler, args, key=module_id,
+                               callback=lambda job: self.bot.call_in_reactor(self._hook_done, hook, module_id, name, job),
+                               timeout=MODULE_DEADLINE)
+        if job is None:
+            self.rejected += 1
+            logger.warning(f"[ModuleLoader] Module queue full, dropping {hook} for module {name}.")
+
+    def is_quarantined(self, module_id):
+        with self.quarantine_lock:
+            return module_id in self.quarantined
+
+    def _run_hook(self, hook, name, handler, args):
+        """Worker thread: call the hook; returns False if it raised."""
+        self.local.module = name
+        try:
+            with self.bot.send_queue.lane('bulk'):
+                handler(*args)
+            return True
+        except Exception as e:
+            logger.error(f"[ModuleLoader] Error in module {name} running {hook}: {e}\n{traceback.format_exc()}")
+            return False
+        finally:
+            self.local.module = None
+
+    def _hook_done(self, hook, module_id, name, job):
+        """Reactor: record a finished (or dropped) hook call and count budget overruns."""
+        overdue = job in self.overdue
+        self.overdue.discard(job)
+        if job.status == 'expired':
+            self.expired += 1
+            logger.warning(f"[ModuleLoader] Dropped {hook} for module {name} after waiting {job.queue_wait:.1f}s for a worker.")
+            return
+        if job.finished is None:
+            return  # Cancelled while queued
+        if job.result is False:
+            self.errors[hook] += 1
+        elapsed = job.finished - job.started
+        self.hook_timings[hook].add(elapsed)
+        timing = self.timings.get((hook, module_id))
+        if timing is None:
+            timing = self.timings[(hook, module_id)] = Timing()
+        timing.add(elapsed)
+        if elapsed > LATENCY_BUDGET and not overdue:
+            self._strike(module_id, name, f"{hook} took {elapsed:.1f}s")
+
+    def watchdog(self):
+        """Reactor, every second: count hooks still running past the budget and end expired quarantines."""
+        now = time.monotonic()
+        for job in self.pool.running_jobs():
+            if job not in self.overdue and now - job.started > LATENCY_BUDGET:
+                self.overdue.add(job)
+                self._strike(job.key, self.module_names.get(job.key, f"ID {job.key}"),
+                             f"still running after {now - job.started:.1f}s")
+        with self.quarantine_lock:
+            released = [module_id for module_id, until in self.quarantined.items() if until <= now]
+            for module_id in released:
+                self.quarantined.pop(module_id, None)
+        for module_id in released:
+            logger.info(f"[ModuleLoader] Module {self.module_names.get(module_id, f'ID {module_id}')} released from quarantine.")
+        if released or self.dispatch_stale:
+            self._request_rebuild()
+
+    def _request_rebuild(self):
+        """Rebuild the dispatch table from the reactor without waiting on a load in progress.
+
+        If the web thread holds self.lock (running module code), the rebuild is
+        left to the end of that load or the next watchdog tick; _submit skips
+        quarantined modules in the meantime.
+        """
+        if self.lock.acquire(blocking=False):
+            try:
+                self.rebuild_dispatch()
+            finally:
+                self.lock.release()
+        else:
+            self.dispatch_stale = True
+
+    def _strike(self, module_id, name, reason):
+        now = time.monotonic()
+        with self.quarantine_lock:
+            strikes = self.strikes.setdefault(module_id, deque())
+            strikes.append(now)
+            while strikes[0] < now - QUARANTINE_WINDOW:
+                strikes.popleft()
+            count = len(strikes)
+        logger.warning(f"[ModuleLoader] Module {name} over its {LATENCY_BUDGET}s latency budget ({reason}), "
+                       f"strike {count} of {QUARANTINE_STRIKES}.")
+        if count >= QUARANTINE_STRIKES and module_id in self.loaded_modules:
+            self.quarantine(module_id)
+
+    def quarantine(self, module_id):
+        """Leave a module out of dispatch for QUARANTINE_TIME and drop its queued calls."""
+        with self.quarantine_lock:
+            self.quarantined[module_id] = time.monotonic() + QUARANTINE_TIME
+            self.strikes.pop(module_id, None)
+        cancelled = self.pool.cancel(lambda job: job.key == module_id)
+        logger.error(f"[ModuleLoader] Quarantined module {self.module_names.get(module_id, f'ID {module_id}')} for {QUARANTINE_TIME}s "
+                     f"after {QUARANTINE_STRIKES} latency budget overruns ({cancelled} queued calls dropped).")
+        self._request_rebuild()
 
     def handle_message(self, connection, event):
-        """Handle incoming messages by passing them to loaded module instances."""
+        """Handle incoming messages by passing them to the modules that implement handle_message."""
         channel = event.target
         nick = event.source.nick
         message = event.arguments[0]
 
-        # logger.debug(f"[ModuleLoader] handle_message received in {channel} from {nick}: {message}") # Optional: uncomment for verbose message logging
-
-        for module_id, module_instance in self.loaded_modules.items(): # Iterate over module instances
-            try:
-                if hasattr(module_instance, 'handle_message'):
-                    # Pass all required arguments to handle_message
-                    # logger.debug(f"[ModuleLoader] Attempting to call handle_message for module ID {module_id}") # Optional: uncomment for verbose message dispatch logging
-                    module_instance.handle_message(connection, event, channel, nick, message)
-            except Exception as e:
-                # Retrieve module name for better logging if possible
-                module_name = f"ID {module_id}"
-                # We can get the name from the instance if it has one
-                if hasattr(module_instance, 'name'):
-                    module_name = module_instance.name
-                logger.error(f"[ModuleLoader] Error in module {module_name} handling message: {e}\n{traceback.format_exc()}") # Added traceback
+        # Only modules with a real handle_message are in the table; read it once so a
+        # concurrent reload swaps the whole table rather than changing it under us
+        dispatch = self.dispatch
+        for module_id, name, handler in dispatch.messages:
+            self._submit('handle_message', module_id, name, handler, connection, event, channel, nick, message)
+        # Keyword/pattern subscribers, found with one pass over the message
+        for module_id, name, handler in dispatch.matching(message):
+            self._submit('handle_message', module_id, name, handler, connection, event, channel, nick, message)
 
+    def handle_event(self, connection, event):
+        """Reactor global handler: pass an event to the modules that declared its type."""
+        for module_id, name, handler in self.dispatch.events.get(event.type, ()):
+            self._submit('handle_event', module_id, name, handler, connection, event)
 
     def handle_command(self, connection, event, command, args, channel, nick):
         """Handle commands by passing them to the relevant loaded module instance based on trigger."""
         logger.info(f"[ModuleLoader] handle_command received: '{command}' with args {args} from {nick} in {channel}")
-        
+
         # Strip any command prefix from the command
         processed_command = command.lower()
         while processed_command and processed_command[0] in '!@#':
             processed_command = processed_command[1:]
-            
-        # Check if the processed command matches any loaded module's trigger
-        if processed_command in self.module_triggers:
-            module_id = self.module_triggers[processed_command]
-            module_instance = self.loaded_modules.get(module_id)
 
-            if module_instance and hasattr(module_instance, 'handle_command'):
-                try:
-                    logger.info(f"[ModuleLoader] Dispatching command '{processed_command}' to module ID {module_id}")
-                    # Pass the processed command (without prefix) to handle_command
-                    module_instance.handle_command(connection, event, processed_command, args, channel, nick)
-                except Exception as e:
-                    module_name = f"ID {module_id}"
-                    if hasattr(module_instance, 'name'):
-                        module_name = module_instance.name
-                    logger.error(f"[ModuleLoader] Error in module {module_name} handling command: {e}\n{traceback.format_exc()}")
-            else:
-                logger.warning(f"[ModuleLoader] Trigger for command '{processed_command}' found (module ID {module_id}), but module instance not found or handle_command missing on instance.")
+        entry = self.dispatch.commands.get(processed_command)
+        if entry:
+            module_id, name, handler = entry
+            logger.info(f"[ModuleLoader] Dispatching command '{processed_command}' to module ID {module_id}")
+            # Pass the processed command (without prefix) to handle_command
+            self._submit('handle_command', module_id, name, handler, connection, event, processed_command, args, channel, nick)
+        elif self.is_quarantined(self.module_triggers.get(processed_command)):
+            logger.warning(f"[ModuleLoader] Ignoring command '{processed_command}': module ID {self.module_triggers[processed_command]} is quarantined.")
+        elif processed_command in self.module_triggers:
+            logger.warning(f"[ModuleLoader] Trigger for command '{processed_command}' found (module ID {self.module_triggers[processed_command]}), but the module has no handle_command.")
         else:
-            logger.info(f"[ModuleLoader] No module found in module_triggers for command: {processed_command}")
\ No newline at end of file
+            logger.info(f"[ModuleLoader] No module found in module_triggers for command: {processed_command}")
+
+    def get_stats(self):
+        dispatch = self.dispatch
+        names = dict(self.module_names)
+        with self.quarantine_lock:
+            quarantined = list(self.quarantined)
+            strikes = {module_id: len(times) for module_id, times in self.strikes.items()}
+        hooks = {}
+        for hook in HOOKS:
+            per_module = [(timing, module_id) for (h, module_id), timing in list(self.timings.items()) if h == hook]
+            per_module.sort(key=lambda item: item[0].total, reverse=True)
+            hooks[hook] = dict(self.hook_timings[hook].to_dict(), errors=self.errors[hook], slowest=[
+                dict(timing.to_dict(), module=names.get(module_id, f"ID {module_id}"), total_ms=round(timing.total, 2))
+                for timing, module_id in per_module[:SLOWEST_SHOWN]
+            ])
+        return {
+            'loaded': len(names),
+            'message_handlers': len(dispatch.messages),
+            'subscribers': len(dispatch.subscribed),
+            'keywords': len(dispatch.keywords) if dispatch.keywords else 0,
+            'patterns': len(dispatch.patterns) if dispatch.patterns else 0,
+            'event_handlers': sum(len(entries) for entries in dispatch.events.values()),
+            'command_triggers': len(dispatch.commands),
+            'skipped': {hook: len(modules) for hook, modules in dispatch.skipped.items()},
+            'hooks': hooks,
+            'pool': self.pool.get_stats(),
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'quarantined': [names.get(module_id, f"ID {module_id}") for module_id in quarantined],
+            'strikes': {names.get(module_id, f"ID {module_id}"): count for module_id, count in strikes.items()},
+            'compile_cache': self.compile_cache.get_stats(),
+            'load_ms': {names.get(module_id, f"ID {module_id}"): ms for module_id, ms in list(self.load_times.items())},
+            'last_sync': self.last_sync
+        }
@@ -0,0 +1,145 @@
+import sys
+import logging
+from datetime import datetime
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEPTH = 100
+MAX_DEPTH = 20000
+
+
+def make_cursor(ts, message_id):
+    """Encode a (timestamp, id) position as an opaque history paging cursor."""
+    return f"{ts!r}:{message_id}"
+
+
+class MessageRecord:
+    """A single webchat line, kept compact for large scrollback buffers."""
+    __slots__ = ('id', 'ts', 'nick', 'message')
+
+    def __init__(self, nick, message, ts, message_id=None):
+        self.id = message_id
+        self.ts = ts
+        # Nicks repeat constantly, so share one string object per nick
+        self.nick = sys.intern(nick)
+        self.message = message
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'cursor': make_cursor(self.ts, self.id) if self.id is not None else None,
+            'nick': self.nick,
+            'message': self.message,
+            'timestamp': datetime.fromtimestamp(self.ts).strftime('%H:%M:%S')
+        }
+
+
+class RingBuffer:
+    """Fixed-capacity FIFO that overwrites its oldest entry when full."""
+    __slots__ = ('items', 'start', 'size')
+
+    def __init__(self, capacity):
+        self.items = [None] * capacity
+        self.start = 0
+        self.size = 0
+
+    @property
+    def capacity(self):
+        return len(self.items)
+
+    def append(self, item):
+        capacity = len(self.items)
+        if self.size < capacity:
+            self.items[(self.start + self.size) % capacity] = item
+            self.size += 1
+        else:
+            self.items[self.start] = item
+            self.start = (self.start + 1) % capacity
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        """Iterate oldest to newest without copying the buffer."""
+        items, capacity = self.items, len(self.items)
+        for i in range(self.size):
+            yield items[(self.start + i) % capacity]
+
+    def tail(self, count):
+        """Iterate over the newest `count` entries, oldest first."""
+        skip = max(self.size - count, 0)
+        return islice(iter(self), skip, None)
+
+    def resize(self, capacity):
+        """Change capacity, keeping the newest entries."""
+        if capacity == len(self.items):
+            return
+        kept = list(self.tail(capacity))
+        self.items = kept + [None] * (capacity - len(kept))
+        self.start = 0
+        self.size = len(kept)
+
+
+class Scrollback:
+    """Per-channel in-memory message history backed by ring buffers."""
+
+    def __init__(self, default_depth=DEFAULT_DEPTH, loader=None):
+        self.default_depth = default_depth
+        self.loader = loader  # callable(channel, limit) -> records, used to warm new buffers
+        self.buffers = {}  # {channel: RingBuffer}
+
+    def __contains__(self, channel):
+        return channel in self.buffers
+
+    def __getitem__(self, channel):
+        return self.buffers[channel]
+
+    def __delitem__(self, channel):
+        del self.buffers[channel]
+
+    def buffer(self, channel, depth=None):
+        """Return the buffer for a channel, creating or resizing it as needed."""
+        depth = min(depth or self.default_depth, MAX_DEPTH)
+        buf = self.buffers.get(channel)
+        if buf is None:
+            buf = self.buffers[channel] = RingBuffer(depth)
+            if self.loader:
+                try:
+                    for record in self.loader(channel, depth):
+                        buf.append(record)
+                except Exception as e:
+                    logger.error(f"Failed to load scrollback for {channel}: {e}")
+        elif buf.capacity != depth:
+            logger.info(f"Resizing scrollback for {channel} from {buf.capacity} to {depth} lines")
+            buf.resize(depth)
+        return buf
+
+    def append(self, channel, nick, message, ts, message_id=None, depth=None):
+        record = MessageRecord(nick, message, ts, message_id)
+        self.buffer(channel, depth).append(record)
+        return record
+
+    def iter_messages(self, channel, limit=None):
+        """Yield message dicts for a channel, oldest first."""
+        buf = self.buffers.get(channel)
+        if buf is not None:
+            records = buf.tail(limit) if limit else buf
+        elif self.loader:
+            # Read-only: names come from webchat input, so unknown ones must not create buffers
+            try:
+                records = self.loader(channel, min(limit or self.default_depth, MAX_DEPTH))
+            except Exception as e:
+                logger.error(f"Failed to load scrollback for {channel}: {e}")
+                return
+        else:
+            return
+        for record in records:
+            yield record.to_dict()
+
+    def get_stats(self):
+        return {
+            'channels': len(self.buffers),
+            'messages': sum(len(buf) for buf in self.buffers.values()),
+            'capacity': sum(buf.capacity for buf in self.buffers.values())
+        }
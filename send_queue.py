@@ -0,0 +1,231 @@
+import time
+import threading
+import logging
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from irc.client import InvalidCharacters, MessageTooLong, ServerNotConnectedError
+
+logger = logging.getLogger(__name__)
+
+# Lanes in priority order; a lane is only served once every lane before it is empty
+LANES = ('urgent', 'moderation', 'normal', 'bulk')
+URGENT_COMMANDS = {'PONG', 'PING', 'PASS', 'CAP', 'AUTHENTICATE', 'NICK', 'USER', 'QUIT'}
+REGISTRATION_COMMANDS = {'PASS', 'NICK'}  # The first line a client sends to register
+MODERATION_COMMANDS = {'KICK', 'MODE', 'REMOVE', 'KILL'}
+SPLITTABLE_COMMANDS = {'PRIVMSG', 'NOTICE'}
+LIST_MODES = set('beI')  # "MODE #chan +b" without a mask lists the bans instead of setting one
+
+LINE_LIMIT = 512  # Bytes per IRC line, including CR LF
+# Room for the ":nick!user@host " prefix the server adds when relaying our lines
+HOSTMASK_RESERVE = 100
+
+SEND_BURST = 10.0  # Seconds of penalty allowed to build up before lines are held back
+SEND_PENALTY = 2.0  # Seconds of penalty per line
+SEND_PENALTY_BYTES = 120  # Plus one second of penalty per this many bytes
+SEND_MAX_QUEUE = 500  # Lines allowed to wait before new ones are dropped
+
+
+def split_utf8(text, limit):
+    """Split text into pieces of at most `limit` UTF-8 bytes, preferring spaces.
+
+    A piece always holds at least one character, so a limit smaller than
+    a character gives pieces of one (over-long) character rather than none.
+    """
+    data = text.encode('utf-8')
+    pieces = []
+    while len(data) > max(limit, 0):
+        cut = max(limit, 0)
+        # Never cut inside a multi-byte character
+        while cut > 0 and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        if cut == 0:
+            cut = 1
+            while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+                cut += 1
+        space = data.rfind(b' ', 0, cut + 1)
+        if space > limit // 2:
+            cut = space
+        pieces.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+        if data.startswith(b' '):
+            data = data[1:]
+    if data or not pieces:
+        pieces.append(data.decode('utf-8'))
+    return pieces
+
+
+def is_mode_query(words):
+    """True for a MODE line that only asks for a channel's modes or a +b/+e/+I list."""
+    if len(words) < 3:
+        return True
+    modes = words[2]
+    return ' ' not in modes and modes[:1] == '+' and len(modes) > 1 and set(modes[1:]) <= LIST_MODES
+
+
+class OutboundQueue:
+    """Paced, prioritised queue in front of an IRC connection's send_raw.
+
+    Uses the ircu/irssi penalty model: every line adds SEND_PENALTY seconds
+    plus a second per SEND_PENALTY_BYTES bytes to a penalty clock, and lines
+    are held back while that clock is more than `burst` seconds ahead of
+    real time. Urgent lines (PONG, registration) are never held back.
+    Within a lane, targets are served round-robin so one busy channel
+    cannot starve the others. PRIVMSG/NOTICE text is split into lines that
+    stay under 512 bytes once relayed, on UTF-8 character boundaries.
+    """
+
+    def __init__(self, send, burst=SEND_BURST, penalty=SEND_PENALTY,
+                 penalty_bytes=SEND_PENALTY_BYTES, max_queue=SEND_MAX_QUEUE):
+        self.send = send  # The connection's original send_raw
+        self.burst = burst
+        self.penalty = penalty
+        self.penalty_bytes = penalty_bytes
+        self.max_queue = max_queue
+        self.lanes = {lane: OrderedDict() for lane in LANES}  # {lane: {target: deque of lines}}
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.penalty_until = 0.0
+        self.depth = 0
+        self.sent = dict.fromkeys(LANES, 0)
+        self.dropped = 0
+        self.split = 0
+        self.prelude = []  # Lines to send just before the next registration
+
+    @classmethod
+    def attach(cls, connection, **kwargs):
+        """Route everything the connection sends through a new queue."""
+        queue = cls(connection.send_raw, **kwargs)
+        connection.send_raw = queue.enqueue
+        return queue
+
+    def before_registration(self, *lines):
+        """Send `lines` ahead of the next PASS/NICK that registers a connection (e.g. CAP LS)."""
+        with self.lock:
+            self.prelude = list(lines)
+
+    @contextmanager
+    def lane(self, name):
+        """Send ordinary messages from this thread on lane `name` inside the block."""
+        previous = getattr(self.local, 'lane', None)
+        self.local.lane = name
+        try:
+            yield
+        finally:
+            self.local.lane = previous
+
+    def current_lane(self):
+        """The lane set by lane() on this thread, or None."""
+        return getattr(self.local, 'lane', None)
+
+    def enqueue(self, string):
+        """Queue a raw line (the send_raw replacement) and send what the penalty allows."""
+        words = string.split(' ', 2)
+        if words[0].startswith('@') and len(words) > 1:
+            words = words[1:]
+        command = words[0].upper()
+        target = words[1].lower() if len(words) > 1 else ''
+        if command in URGENT_COMMANDS:
+            lane = 'urgent'
+        elif command in MODERATION_COMMANDS and not (command == 'MODE' and is_mode_query(words)):
+            lane = 'moderation'
+        else:
+            lane = getattr(self.local, 'lane', None) or 'normal'
+        lines = self._split(command, string)
+        with self.lock:
+            if self.prelude and command in REGISTRATION_COMMANDS:
+                prelude, self.prelude = self.prelude, []
+                for line in prelude:
+                    self._send(line, 'urgent')
+            if lane == 'urgent':
+                for line in lines:
+                    self._send(line, lane)
+                return
+            if self.depth + len(lines) > self.max_queue:
+                self.dropped += len(lines)
+                logger.warning(f"Send queue full, dropped {len(lines)} line(s) for {target or command}")
+                return
+            self.lanes[lane].setdefault(target, deque()).extend(lines)
+            self.depth += len(lines)
+            self.drain()
+
+    def _split(self, command, string):
+        """Return the wire lines for `string`, splitting long or multi-line messages."""
+        if command not in SPLITTABLE_COMMANDS or ' :' not in string:
+            if '\n' in string or '\r' in string:
+                raise InvalidCharacters("Carriage returns not allowed in IRC lines")
+            if len(string.encode('utf-8')) + 2 > LINE_LIMIT:
+                raise MessageTooLong(f"Messages limited to {LINE_LIMIT} bytes including CR/LF")
+            return [string]
+        head, _, text = string.partition(' :')
+        prefix = suffix = ''
+        if text.startswith('\x01'):
+            # CTCP such as ACTION: split the body and frame every piece again
+            body = text[1:-1] if len(text) > 1 and text.endswith('\x01') else text[1:]
+            tag, space, text = body.partition(' ')
+            prefix, suffix = f"\x01{tag}{space}", '\x01'
+        limit = (LINE_LIMIT - 2 - HOSTMASK_RESERVE - len(head.encode('utf-8')) - 2
+                 - len(prefix.encode('utf-8')) - len(suffix))
+        lines = []
+        for part in text.splitlines() or ['']:
+            if part or not text:
+                lines.extend(f"{head} :{prefix}{piece}{suffix}" for piece in split_utf8(part, limit))
+        if len(lines) > 1:
+            self.split += len(lines) - 1
+        return lines
+
+    def _send(self, line, lane):
+        now = time.monotonic()
+        self.send(line)
+        self.sent[lane] += 1
+        cost = self.penalty + len(line.encode('utf-8')) / self.penalty_bytes
+        self.penalty_until = max(self.penalty_until, now) + cost
+
+    def _pop(self):
+        """Take the next line: highest lane first, round-robin over its targets."""
+        for lane in LANES:
+            targets = self.lanes[lane]
+            if targets:
+                target, lines = next(iter(targets.items()))
+                line = lines.popleft()
+                if lines:
+                    targets.move_to_end(target)
+                else:
+                    del targets[target]
+                self.depth -= 1
+                return lane, line
+        return None, None
+
+    def drain(self):
+        """Send queued lines while the penalty clock allows (also run on a timer)."""
+        with self.lock:
+            while self.depth:
+                if self.penalty_until - time.monotonic() > self.burst:
+                    return
+                lane, line = self._pop()
+                try:
+                    self._send(line, lane)
+                except ServerNotConnectedError:
+                    self.dropped += 1
+                    self.clear()
+                    return
+
+    def clear(self):
+        """Drop everything still queued, e.g. after a disconnect."""
+        with self.lock:
+            if self.depth:
+                logger.info(f"Dropping {self.depth} queued outbound line(s)")
+            self.dropped += self.depth
+            for targets in self.lanes.values():
+                targets.clear()
+            self.depth = 0
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'depth': self.depth,
+                'lanes': {lane: sum(len(lines) for lines in self.lanes[lane].values()) for lane in LANES},
+                'sent': dict(self.sent),
+                'dropped': self.dropped,
+                'split': self.split,
+                'penalty_ahead': round(max(self.penalty_until - time.monotonic(), 0.0), 2)
+            }
@@ -0,0 +1,111 @@
+import threading
+import logging
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import ChannelManagementSettings
+from extensions import app
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever a committed transaction touched ChannelManagementSettings.
+# Every ChannelSettingsCache compares its loaded version against this one.
+_settings_version = 0
+_version_lock = threading.Lock()
+
+
+def invalidate_channel_settings():
+    """Mark every channel settings cache as stale."""
+    global _settings_version
+    with _version_lock:
+        _settings_version += 1
+
+
+def _mark_session_dirty(mapper, connection, target):
+    """Flag the owning session so the cache is invalidated once it commits."""
+    session = Session.object_session(target)
+    if session is not None:
+        session.info['channel_settings_dirty'] = True
+
+
+def _after_commit(session):
+    if session.info.pop('channel_settings_dirty', False):
+        invalidate_channel_settings()
+
+
+def _after_rollback(session):
+    session.info.pop('channel_settings_dirty', None)
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(ChannelManagementSettings, _event_name, _mark_session_dirty)
+event.listen(Session, 'after_commit', _after_commit)
+event.listen(Session, 'after_rollback', _after_rollback)
+
+
+class ChannelSettingsCache:
+    """Versioned in-memory copy of the ChannelManagementSettings table.
+
+    The table is read once and only re-read after a writer commits a change.
+    A reload builds a new dict and swaps it in with a single assignment, so
+    readers on other threads never observe a partially filled mapping.
+    """
+
+    def __init__(self):
+        self._settings = {}
+        self._version = -1
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def _load(self):
+        with app.app_context():
+            rows = ChannelManagementSettings.query.all()
+            settings = {
+                row.channel: {
+                    'is_enabled': row.is_enabled,
+                    'flood_threshold': row.flood_threshold,
+                    'flood_timeframe': row.flood_timeframe,
+                    'caps_percentage': row.caps_percentage,
+                    'history_depth': row.history_depth
+                }
+                for row in rows
+            }
+        return settings
+
+    def snapshot(self):
+        """Return the current settings dict, reloading it if it is stale."""
+        if self._version == _settings_version:
+            self.hits += 1
+            return self._settings
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            version = _settings_version
+            if self._version != version:
+                self.misses += 1
+                self._settings = self._load()
+                self._version = version
+                self.loads += 1
+                logger.info(f"Loaded channel settings for {len(self._settings)} channels (version {version})")
+            else:
+                self.hits += 1
+        return self._settings
+
+    def get(self, channel):
+        """Return the settings dict for a channel, or None if it has none."""
+        return self.snapshot().get(channel)
+
+    def invalidate(self):
+        """Force the next lookup to reload from the database."""
+        invalidate_channel_settings()
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'loads': self.loads,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'version': self._version,
+            'channels': len(self._settings)
+        }
@@ -20,6 +20,7 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentChannel = window.initialChannel || null;
     let botNick = null;
     const channelMessages = {};
+    const historyState = {};  // {channel: {before, loading, exhausted}}
 
     // --- SocketIO Events ---
     socket.on('webchat_status', function(data) {
@@ -59,54 +60,203 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
-    socket.on('webchat_users', function(data) {
-        console.log('Received userlist update:', data.users);
+    // --- Userlist: full snapshots plus versioned add/remove/mode/rename deltas ---
+    const userState = {};  // {channel: {version, users: Map(nick -> mode), resyncing}}
+    const userItems = new Map();  // nick -> <li> for the channel on screen
+    const modePriority = {'~': 0, '&': 1, '@': 2, '%': 3, '+': 4, '': 5};
+
+    function compareUsers(modeA, nickA, modeB, nickB) {
+        const rankA = modePriority[modeA] !== undefined ? modePriority[modeA] : 99;
+        const rankB = modePriority[modeB] !== undefined ? modePriority[modeB] : 99;
+        if (rankA !== rankB) return rankA - rankB;
+        return nickA.localeCompare(nickB, undefined, {sensitivity: 'base'});
+    }
+
+    function createUserItem(nick, mode) {
+        const li = document.createElement('li');
+        let badgeClass = 'badge-none';
+        if (mode === '@') badgeClass = 'badge-op';
+        else if (mode === '+') badgeClass = 'badge-voice';
+        else if (mode === '%') badgeClass = 'badge-halfop';
+        else if (mode === '&') badgeClass = 'badge-admin';
+        else if (mode === '~') badgeClass = 'badge-owner';
+        li.innerHTML = `<span class="badge ${badgeClass}"></span>${nick}`;
+        li.className = 'px-4 py-1 cursor-pointer hover:bg-indigo-100 user-list-item';
+        li.dataset.nick = nick;
+        li.dataset.mode = mode;
+        li.onclick = function() {
+            if (nick !== botNick) {
+                socket.emit('webchat_open_query', { nick: nick });
+            }
+        };
+        return li;
+    }
+
+    function insertUserItem(nick, mode) {
+        // Binary search for the sorted position instead of re-rendering the list
+        const items = userList.children;
+        let lo = 0, hi = items.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1;
+            if (compareUsers(items[mid].dataset.mode, items[mid].dataset.nick, mode, nick) <= 0) lo = mid + 1;
+            else hi = mid;
+        }
+        const li = createUserItem(nick, mode);
+        userList.insertBefore(li, items[lo] || null);
+        userItems.set(nick, li);
+    }
+
+    function removeUserItem(nick) {
+        const li = userItems.get(nick);
+        if (li) {
+            li.remove();
+            userItems.delete(nick);
+        }
+    }
+
+    function renderUserList() {
         userList.innerHTML = '';
-        const modePriority = {'~': 0, '&': 1, '@': 2, '%': 3, '+': 4, '': 5};
-        data.users.sort((a, b) => {
-            const modeA = modePriority[a.mode] !== undefined ? modePriority[a.mode] : 99;
-            const modeB = modePriority[b.mode] !== undefined ? modePriority[b.mode] : 99;
-            if (modeA !== modeB) return modeA - modeB;
-            return a.nick.localeCompare(b.nick, undefined, {sensitivity: 'base'});
+        userItems.clear();
+        const state = userState[currentChannel];
+        if (!state) return;
+        const users = Array.from(state.users, ([nick, mode]) => ({nick, mode}));
+        users.sort((a, b) => compareUsers(a.mode, a.nick, b.mode, b.nick));
+        const fragment = document.createDocumentFragment();
+        users.forEach(user => {
+            const li = createUserItem(user.nick, user.mode);
+            userItems.set(user.nick, li);
+            fragment.appendChild(li);
         });
-        data.users.forEach(user => {
-            const li = document.createElement('li');
-            let badgeClass = 'badge-none';
-            if (user.mode === '@') badgeClass = 'badge-op';
-            else if (user.mode === '+') badgeClass = 'badge-voice';
-            else if (user.mode === '%') badgeClass = 'badge-halfop';
-            else if (user.mode === '&') badgeClass = 'badge-admin';
-            else if (user.mode === '~') badgeClass = 'badge-owner';
-            li.innerHTML = `<span class="badge ${badgeClass}"></span>${user.nick}`;
-            li.className = 'px-4 py-1 cursor-pointer hover:bg-indigo-100 user-list-item';
-            li.onclick = function() {
-                if (user.nick !== botNick) {
-                    socket.emit('webchat_open_query', { nick: user.nick });
-                }
+        userList.appendChild(fragment);
+    }
+
+    function applyUserChange(chan, state, change) {
+        const visible = chan === currentChannel;
+        if (change.op === 'add' || change.op === 'mode') {
+            state.users.set(change.nick, change.mode);
+            if (visible) {
+                removeUserItem(change.nick);
+                insertUserItem(change.nick, change.mode);
+            }
+        } else if (change.op === 'remove') {
+            state.users.delete(change.nick);
+            if (visible) removeUserItem(change.nick);
+        } else if (change.op === 'rename') {
+            const mode = state.users.get(change.nick) || '';
+            state.users.delete(change.nick);
+            state.users.set(change.new_nick, mode);
+            if (visible) {
+                removeUserItem(change.nick);
+                insertUserItem(change.new_nick, mode);
+            }
+        }
+    }
+
+    function requestUserSnapshot(chan) {
+        if (!userState[chan]) userState[chan] = {version: -1, users: new Map(), resyncing: false};
+        const state = userState[chan];
+        if (state.resyncing) return;
+        state.resyncing = true;
+        socket.emit('webchat_users_request', { channel: chan });
+    }
+
+    socket.on('webchat_users', function(data) {
+        const chan = data.channel || currentChannel;
+        if (!chan) return;
+        if (data.users) {
+            // Full snapshot: replaces whatever we had
+            userState[chan] = {
+                version: data.version,
+                users: new Map(data.users.map(user => [user.nick, user.mode])),
+                resyncing: false
             };
-            userList.appendChild(li);
-        });
+            if (chan === currentChannel) renderUserList();
+            return;
+        }
+        const state = userState[chan];
+        if (!state) {
+            requestUserSnapshot(chan);
+            return;
+        }
+        for (const change of data.changes) {
+            if (change.version <= state.version) continue;  // Already part of the snapshot
+            if (change.version !== state.version + 1) {
+                // Missed a change; wait for a fresh snapshot
+                requestUserSnapshot(chan);
+                return;
+            }
+            applyUserChange(chan, state, change);
+            state.version = change.version;
+        }
     });
 
     socket.on('webchat_messages', function(data) {
         // Store messages for the current channel
         if (currentChannel) {
             channelMessages[currentChannel] = data.messages;
+            historyState[currentChannel] = {
+                before: data.messages.length ? data.messages[0].cursor : null,
+                loading: false,
+                exhausted: false
+            };
+            renderMessagesForCurrentChannel();
+        }
+    });
+
+    // --- Scrollback paging ---
+    function loadOlderMessages() {
+        const state = historyState[currentChannel];
+        if (!state || state.loading || state.exhausted) return;
+        state.loading = true;
+        socket.emit('webchat_history_request', { channel: currentChannel, before: state.before, limit: 100 });
+    }
+
+    chatMessages.addEventListener('scroll', function() {
+        if (chatMessages.scrollTop === 0) loadOlderMessages();
+    });
+
+    socket.on('webchat_history', function(data) {
+        const state = historyState[data.channel];
+        if (!state) return;
+        state.loading = false;
+        state.exhausted = !data.has_more;
+        if (!data.messages.length) return;
+        state.before = data.before;
+        channelMessages[data.channel] = data.messages.concat(channelMessages[data.channel] || []);
+        if (data.channel === currentChannel) {
+            // Keep the view anchored on the line the user was reading
+            const fromBottom = chatMessages.scrollHeight - chatMessages.scrollTop;
             renderMessagesForCurrentChannel();
+            chatMessages.scrollTop = chatMessages.scrollHeight - fromBottom;
         }
     });
 
+    function storeMessage(msg, fallbackChannel) {
+        // Use msg.channel if present, else the batch's channel or currentChannel
+        const chan = msg.channel || fallbackChannel || currentChannel;
+        if (!channelMessages[chan]) channelMessages[chan] = [];
+        channelMessages[chan].push(msg);
+        return chan;
+    }
+
     socket.on('webchat_message', function(msg) {
         // Append message to the correct channel
         if (!msg || !currentChannel) return;
-        // Use msg.channel if present, else fallback to currentChannel
-        const chan = msg.channel || currentChannel;
-        if (!channelMessages[chan]) channelMessages[chan] = [];
-        channelMessages[chan].push(msg);
+        const chan = storeMessage(msg);
         // Only render if we're viewing this channel
         if (chan === currentChannel) renderMessagesForCurrentChannel();
     });
 
+    socket.on('webchat_message_batch', function(data) {
+        // Several messages for one room in a single frame; render once
+        if (!data || !currentChannel) return;
+        let visible = false;
+        data.messages.forEach(msg => {
+            if (storeMessage(msg, data.channel) === currentChannel) visible = true;
+        });
+        if (visible) renderMessagesForCurrentChannel();
+    });
+
     function renderMessagesForCurrentChannel() {
         chatMessages.innerHTML = '';
         const msgs = channelMessages[currentChannel] || [];
@@ -118,6 +268,9 @@ document.addEventListener('DOMContentLoaded', function() {
     socket.on('webchat_topic', function(data) {
         if (data.channel === currentChannel) {
             topicText.textContent = data.topic || 'No topic set';
+            topicText.title = data.set_by
+                ? `Set by ${data.set_by}` + (data.set_at ? ` on ${new Date(data.set_at * 1000).toLocaleString()}` : '')
+                : '';
         }
     });
 
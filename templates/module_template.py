@@ -1,6 +1,10 @@
 """
 This is a template for creating IRC bot modules.
 Copy this template and modify it to create your own module.
+
+The handle_* methods run on a worker thread, one call per module at a time.
+A module whose calls keep taking longer than a couple of seconds is
+quarantined for a while, so hand long jobs off instead of blocking.
 """
 
 class Module:
@@ -10,6 +14,16 @@ class Module:
         self.description = "An example module that demonstrates the module system"
         self.trigger = "!"  # The command trigger for this module
 
+    # Optional: declare what handle_message needs to see. With keywords and/or
+    # patterns set, handle_message is only called for messages that contain one
+    # of the keywords (case-insensitive) or match one of the regexes; without
+    # them it is called for every message.
+    keywords = ["hello"]
+    patterns = []  # e.g. [r"\bhttps?://\S+"]
+
+    # Optional: IRC event types to receive in handle_event (e.g. "join", "part", "nick")
+    events = []
+
     def init(self, bot):
         """
         Called when the module is loaded.
@@ -27,12 +41,19 @@ class Module:
 
     def handle_message(self, connection, event, channel, nick, message):
         """
-        Called for every message in channels the bot is in.
+        Called for messages in channels the bot is in that match `keywords`
+        or `patterns` (or for every message if neither is declared).
         Use this to handle general messages.
         """
-        # Example: Echo messages containing "hello"
-        if "hello" in message.lower():
-            self.bot.send_message(connection, channel, f"Hello {nick}!")
+        # Example: Greet messages containing "hello" (declared in keywords above)
+        self.bot.send_message(connection, channel, f"Hello {nick}!")
+
+    def handle_event(self, connection, event):
+        """
+        Called for IRC events whose type is listed in `events`.
+        """
+        if event.type == "join":
+            self.bot.send_message(connection, event.target, f"Welcome {event.source.nick}!")
 
     def handle_command(self, connection, event, command, args, channel, nick):
         """
@@ -44,4 +65,10 @@ class Module:
             if args:
                 self.bot.send_message(connection, channel, " ".join(args))
             else:
-                self.bot.send_message(connection, channel, "Usage: !echo <message>") 
\ No newline at end of file
+                self.bot.send_message(connection, channel, "Usage: !echo <message>")
+
+        # Example: Fetch a URL with the bot's shared HTTP client
+        # (pooled connections and default timeouts; don't create your own requests.Session)
+        if command == "status":
+            response = self.bot.http.get("https://example.com/")
+            self.bot.send_message(connection, channel, f"example.com answered {response.status_code}")
@@ -0,0 +1,97 @@
+import threading
+import time
+import types
+import pytest
+from irc_bouncer import AI_TIMEOUT, IRCBouncer
+from worker_pool import WorkerPool
+
+
+class Bot:
+    """The parts of IRCBouncer the AI reply path uses."""
+    request_ai_response = IRCBouncer.request_ai_response
+    _send_ai_response = IRCBouncer._send_ai_response
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.ai_pool = WorkerPool('ai-test', max_workers=1)
+        self.sequencer = types.SimpleNamespace(generation=1)
+        self.connection = object()
+        self.reactor_calls = []
+        self.sent = []
+        self.timeouts = []
+
+    def get_chatgpt_response(self, message, conversation=None, timeout=None):
+        self.timeouts.append(timeout)
+        return self.respond()
+
+    def call_in_reactor(self, func, *args):
+        self.reactor_calls.append((func, args))
+
+    def run_reactor_calls(self, count, wait=5):
+        end = time.monotonic() + wait
+        while len(self.reactor_calls) < count:
+            assert time.monotonic() < end
+            time.sleep(0.005)
+        for func, args in self.reactor_calls:
+            func(*args)
+
+    def send_message(self, connection, channel, message):
+        self.sent.append((channel, message))
+
+
+@pytest.fixture
+def conversation():
+    return types.SimpleNamespace(messages=[])
+
+
+def test_reply_sent_and_remembered(conversation):
+    bot = Bot(lambda: 'hello there')
+    bot.request_ai_response(bot.connection, '#c', 'hi', conversation)
+    bot.run_reactor_calls(1)
+    bot.ai_pool.shutdown()
+    assert bot.sent == [('#c', 'hello there')]
+    assert conversation.messages == [{'role': 'assistant', 'content': 'hello there'}]
+
+
+def test_provider_gets_only_the_time_left(conversation):
+    bot = Bot(lambda: 'late')
+    release = threading.Event()
+    bot.ai_pool.submit(release.wait, 5, key='#c')
+    bot.request_ai_response(bot.connection, '#c', 'hi', conversation)
+    time.sleep(0.3)
+    release.set()
+    bot.run_reactor_calls(1)
+    bot.ai_pool.shutdown()
+    assert len(bot.timeouts) == 1
+    assert bot.timeouts[0] <= AI_TIMEOUT - 0.3
+
+
+def test_failure_apologises(conversation):
+    bot = Bot(lambda: None)
+    bot.request_ai_response(bot.connection, '#c', 'hi', conversation)
+    bot.run_reactor_calls(1)
+    bot.ai_pool.shutdown()
+    assert bot.sent == [('#c', "I'm sorry, I couldn't generate a response at this time.")]
+
+
+def test_cancelled_on_disconnect_posts_nothing(conversation):
+    bot = Bot(lambda: 'never')
+    release = threading.Event()
+    bot.ai_pool.submit(release.wait, 5, key='#c')
+    bot.request_ai_response(bot.connection, '#c', 'hi', conversation)
+    bot.ai_pool.shutdown()
+    bot.connection = None
+    release.set()
+    bot.run_reactor_calls(1)
+    assert bot.sent == []
+    assert bot.timeouts == []
+
+
+def test_reply_for_an_earlier_connection_is_dropped(conversation):
+    bot = Bot(lambda: 'stale')
+    bot.request_ai_response(bot.connection, '#c', 'hi', conversation)
+    bot.sequencer.generation += 1
+    bot.run_reactor_calls(1)
+    bot.ai_pool.shutdown()
+    assert bot.sent == []
+    assert conversation.messages == []
@@ -0,0 +1,175 @@
+import base64
+import types
+
+import pytest
+
+from capabilities import SASL_CHUNK, CapNegotiator, parse_caps, server_time
+
+
+class Connection:
+    def __init__(self):
+        self.sent = []
+
+    def send_raw(self, line):
+        self.sent.append(line)
+
+    def take(self):
+        sent, self.sent = self.sent, []
+        return sent
+
+
+class Bot:
+    def __init__(self):
+        self.connection = Connection()
+        self.before = []
+        self.timers = []
+        self.send_queue = types.SimpleNamespace(before_registration=self.before.append)
+        self.reactor = types.SimpleNamespace(scheduler=types.SimpleNamespace(
+            execute_after=lambda delay, func: self.timers.append(func)))
+
+
+def cap(*arguments):
+    return types.SimpleNamespace(arguments=list(arguments), target='*', tags=None)
+
+
+@pytest.fixture
+def bot():
+    return Bot()
+
+
+def negotiator(bot, **credentials):
+    caps = CapNegotiator(bot, wanted={'multi-prefix', 'server-time', 'away-notify'})
+    caps.connecting(**credentials)
+    return caps, bot.connection
+
+
+def test_only_wanted_caps_are_requested(bot):
+    caps, connection = negotiator(bot)
+    assert bot.before == ['CAP LS 302']
+    caps.on_cap(connection, cap('LS', '*', 'multi-prefix sasl=PLAIN'))
+    assert connection.take() == []  # Wait for the last LS line
+    caps.on_cap(connection, cap('LS', 'server-time unknown-cap'))
+    assert connection.take() == ['CAP REQ :multi-prefix server-time']
+    caps.on_cap(connection, cap('ACK', 'multi-prefix server-time'))
+    assert connection.take() == ['CAP END']
+    assert caps.has('server-time') and not caps.has('sasl')
+
+
+def test_nothing_wanted_ends_at_once(bot):
+    caps, connection = negotiator(bot)
+    caps.on_cap(connection, cap('LS', 'unknown-cap'))
+    assert connection.take() == ['CAP END']
+
+
+def test_refused_request_is_retried_cap_by_cap(bot):
+    caps, connection = negotiator(bot, account='bot', password='secret')
+    caps.on_cap(connection, cap('LS', 'sasl away-notify multi-prefix'))
+    assert connection.take() == ['CAP REQ :away-notify multi-prefix sasl']
+    caps.on_cap(connection, cap('NAK', 'away-notify multi-prefix sasl'))
+    assert connection.take() == ['CAP REQ :away-notify', 'CAP REQ :multi-prefix', 'CAP REQ :sasl']
+    caps.on_cap(connection, cap('NAK', 'away-notify'))
+    caps.on_cap(connection, cap('ACK', 'multi-prefix'))
+    assert connection.take() == []  # sasl still outstanding
+    caps.on_cap(connection, cap('ACK', 'sasl'))
+    assert connection.take() == ['AUTHENTICATE PLAIN']
+    caps.sasl_success(connection)
+    assert connection.take() == ['CAP END']
+    assert caps.enabled == {'multi-prefix', 'sasl'}
+
+
+def test_single_refused_cap_ends_negotiation(bot):
+    caps, connection = negotiator(bot)
+    caps.on_cap(connection, cap('LS', 'away-notify'))
+    connection.take()
+    caps.on_cap(connection, cap('NAK', 'away-notify'))
+    assert connection.take() == ['CAP END']
+
+
+def test_sasl_plain(bot):
+    caps, connection = negotiator(bot, account='bot', password='secret')
+    caps.on_cap(connection, cap('LS', 'sasl=PLAIN,EXTERNAL'))
+    caps.on_cap(connection, cap('ACK', 'sasl'))
+    caps.on_authenticate(connection, types.SimpleNamespace(target='+'))
+    payload = base64.b64encode(b'bot\0bot\0secret').decode('ascii')
+    assert connection.take() == ['CAP REQ :sasl', 'AUTHENTICATE PLAIN', f'AUTHENTICATE {payload}']
+    caps.sasl_success(connection)
+    assert connection.take() == ['CAP END']
+    assert caps.sasl_result == 'success'
+
+
+def test_long_sasl_payload_is_chunked(bot):
+    # 3 * 300 bytes of credentials encode to exactly 3 chunks, so a closing "+" follows
+    caps, connection = negotiator(bot, account='a' * 299, password='p' * 300)
+    caps.on_cap(connection, cap('LS', 'sasl'))
+    caps.on_cap(connection, cap('ACK', 'sasl'))
+    connection.take()
+    caps.on_authenticate(connection, types.SimpleNamespace(target='+'))
+    sent = connection.take()
+    assert [len(line) - len('AUTHENTICATE ') for line in sent[:-1]] == [SASL_CHUNK] * 3
+    assert sent[-1] == 'AUTHENTICATE +'
+
+
+def test_external_falls_back_to_plain(bot):
+    caps, connection = negotiator(bot, account='bot', password='secret', external=True)
+    caps.on_cap(connection, cap('LS', 'sasl'))
+    caps.on_cap(connection, cap('ACK', 'sasl'))
+    caps.on_authenticate(connection, types.SimpleNamespace(target='+'))
+    assert connection.take() == ['CAP REQ :sasl', 'AUTHENTICATE EXTERNAL', 'AUTHENTICATE +']
+    caps.sasl_failed(connection, '904')
+    assert connection.take() == ['AUTHENTICATE PLAIN']
+    assert caps.last_error == 'EXTERNAL: authentication failed'
+    caps.sasl_failed(connection, '904', 'Invalid credentials')
+    assert connection.take() == ['CAP END']
+    assert caps.sasl_result == 'failed'
+    assert caps.last_error == 'PLAIN: Invalid credentials'
+
+
+def test_advertised_mechanisms_limit_what_is_tried(bot):
+    caps, connection = negotiator(bot, account='bot', password='secret', external=True)
+    caps.on_cap(connection, cap('LS', 'sasl=PLAIN'))
+    caps.on_cap(connection, cap('ACK', 'sasl'))
+    assert connection.take() == ['CAP REQ :sasl', 'AUTHENTICATE PLAIN']
+
+
+def test_sasl_not_requested_without_a_usable_mechanism(bot):
+    caps, connection = negotiator(bot, external=True)
+    caps.on_cap(connection, cap('LS', 'sasl=PLAIN'))
+    assert connection.take() == ['CAP END']
+
+
+def test_timeout_ends_a_stuck_negotiation(bot):
+    caps, connection = negotiator(bot, account='bot', password='secret')
+    caps.on_cap(connection, cap('LS', 'sasl'))
+    caps.on_cap(connection, cap('ACK', 'sasl'))
+    connection.take()
+    stale = bot.timers[0]
+    caps.connecting(account='bot', password='secret')  # Reconnected: the old timer must not fire
+    stale()
+    assert connection.take() == []
+    caps.on_cap(connection, cap('LS', 'sasl'))
+    caps.on_cap(connection, cap('ACK', 'sasl'))
+    connection.take()
+    bot.timers[1]()
+    assert connection.take() == ['CAP END']
+    assert caps.sasl_result == 'failed'
+
+
+def test_cap_new_and_del_after_registration(bot):
+    caps, connection = negotiator(bot)
+    caps.on_cap(connection, cap('LS', 'multi-prefix'))
+    caps.on_cap(connection, cap('ACK', 'multi-prefix'))
+    caps.registered()
+    connection.take()
+    caps.on_cap(connection, cap('NEW', 'away-notify sasl'))
+    assert connection.take() == ['CAP REQ :away-notify']
+    caps.on_cap(connection, cap('ACK', 'away-notify'))
+    caps.on_cap(connection, cap('DEL', 'multi-prefix'))
+    assert connection.take() == []  # No second CAP END
+    assert caps.enabled == {'away-notify'}
+
+
+def test_parse_caps_and_server_time():
+    assert parse_caps('a b=c -d') == {'a': None, 'b': 'c', '-d': None}
+    event = types.SimpleNamespace(tags=[{'key': 'time', 'value': '2024-01-01T00:00:00.000Z'}])
+    assert server_time(event) == 1704067200.0
+    assert server_time(types.SimpleNamespace(tags=None)) is None
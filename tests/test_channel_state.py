@@ -0,0 +1,232 @@
+import pytest
+from irc.client import NickMask
+from irc.features import FeatureSet
+import channel_state
+from channel_state import ChannelRegistry, ResyncQueue, compile_mask, normalize_mask, parse_modes, parse_names
+
+RANKS = '~&@%+'
+
+
+@pytest.fixture
+def features():
+    features = FeatureSet()
+    features.load_feature('PREFIX=(qaohv)~&@%+')
+    features.load_feature('CHANMODES=beI,k,l,imnpst')
+    return features
+
+
+def test_parse_modes_prefix_modes_take_arguments(features):
+    changes = list(parse_modes('+qaohv', ['q', 'a', 'o', 'h', 'v'], features))
+    assert changes == [('+', 'q', 'q'), ('+', 'a', 'a'), ('+', 'o', 'o'), ('+', 'h', 'h'), ('+', 'v', 'v')]
+
+
+def test_parse_modes_sign_carries_over(features):
+    changes = list(parse_modes('+o-v+m', ['alice', 'bob'], features))
+    assert changes == [('+', 'o', 'alice'), ('-', 'v', 'bob'), ('+', 'm', None)]
+
+
+def test_parse_modes_set_only_argument(features):
+    assert list(parse_modes('+l', ['10'], features)) == [('+', 'l', '10')]
+    assert list(parse_modes('-l+o', ['alice'], features)) == [('-', 'l', None), ('+', 'o', 'alice')]
+
+
+def test_parse_modes_list_and_key_modes_always_take_arguments(features):
+    changes = list(parse_modes('-bk+e', ['*!*@spam', 'secret', '*!*@friend'], features))
+    assert changes == [('-', 'b', '*!*@spam'), ('-', 'k', 'secret'), ('+', 'e', '*!*@friend')]
+
+
+def test_parse_modes_missing_arguments_are_none(features):
+    assert list(parse_modes('+ov', ['alice'], features)) == [('+', 'o', 'alice'), ('+', 'v', None)]
+
+
+def test_parse_modes_defaults_without_chanmodes():
+    features = FeatureSet()
+    changes = list(parse_modes('+bkl-o', ['mask', 'key', '5', 'alice'], features))
+    assert changes == [('+', 'b', 'mask'), ('+', 'k', 'key'), ('+', 'l', '5'), ('-', 'o', 'alice')]
+
+
+def test_parse_names_plain_and_prefixed():
+    assert list(parse_names('alice @bob +carol', RANKS)) == [('alice', '', ''), ('bob', '@', ''), ('carol', '+', '')]
+
+
+def test_parse_names_multi_prefix_in_rank_order():
+    assert list(parse_names('+@alice %~bob', RANKS)) == [('alice', '@+', ''), ('bob', '~%', '')]
+
+
+def test_parse_names_userhost_in_names():
+    names = '@+alice!al@example.com bob!~bob@10.0.0.1'
+    assert list(parse_names(names, RANKS)) == [('alice', '@+', 'al@example.com'), ('bob', '', '~bob@10.0.0.1')]
+
+
+def test_parse_names_skips_empty_entries():
+    assert list(parse_names('  @  alice ', RANKS)) == [('alice', '', '')]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(channel_state.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_resync_duplicates_are_dropped_until_sent(clock):
+    sent = []
+    queue = ResyncQueue(lambda kind, channel: sent.append((kind, channel)), rate=1, burst=5)
+    assert queue.request('names', '#a')
+    assert not queue.request('names', '#a')
+    assert queue.request('topic', '#a')
+    queue.drain()
+    assert sent == [('names', '#a'), ('topic', '#a')]
+    assert queue.request('names', '#a')
+    assert queue.get_stats() == {'pending': 1, 'requested': 4, 'deduplicated': 1, 'sent': 2}
+
+
+def test_resync_rate_limited_after_burst(clock):
+    sent = []
+    queue = ResyncQueue(lambda kind, channel: sent.append(channel), rate=0.5, burst=2)
+    for i in range(5):
+        queue.request('names', f"#c{i}")
+    queue.drain()
+    assert sent == ['#c0', '#c1']
+    clock[0] += 1
+    queue.drain()
+    assert sent == ['#c0', '#c1']
+    clock[0] += 1
+    queue.drain()
+    assert sent == ['#c0', '#c1', '#c2']
+    queue.request('names', '#c5')
+    clock[0] += 100  # Tokens never build up beyond the burst
+    queue.drain()
+    assert sent == ['#c0', '#c1', '#c2', '#c3', '#c4']
+    assert queue.get_stats()['pending'] == 1
+
+
+def test_resync_unknown_kind_rejected():
+    with pytest.raises(ValueError):
+        ResyncQueue(lambda kind, channel: None).request('mode', '#a')
+
+
+def test_resync_send_errors_do_not_stop_the_drain(clock):
+    sent = []
+
+    def send(kind, channel):
+        if channel == '#bad':
+            raise OSError('not connected')
+        sent.append(channel)
+
+    queue = ResyncQueue(send, burst=3)
+    for channel in ('#bad', '#good'):
+        queue.request('topic', channel)
+    queue.drain()
+    assert sent == ['#good']
+    assert queue.get_stats()['pending'] == 0
+
+
+@pytest.mark.parametrize('mask, expanded', [
+    ('alice', 'alice!*@*'),
+    ('example.com', '*!*@example.com'),
+    ('2001:db8::1', '*!*@2001:db8::1'),
+    ('user@host', '*!user@host'),
+    ('alice!user', 'alice!user@*'),
+    ('a!b@c', 'a!b@c'),
+])
+def test_normalize_mask(mask, expanded):
+    assert normalize_mask(mask) == expanded
+
+
+def test_compile_mask_wildcards():
+    match = compile_mask('*!?ser@*.example.com')
+    assert match('alice!user@host.example.com')
+    assert match('bob!xser@a.b.example.com')
+    assert not match('alice!uuser@host.example.com')
+    assert not match('alice!user@example.com')
+
+
+def test_compile_mask_is_anchored_and_literal():
+    assert not compile_mask('*!*@host.com')('a!b@host.com.evil')
+    assert not compile_mask('*!*@host.com')('a!b@hostxcom')
+    assert compile_mask('a+b!*@*')('a+b!u@h')
+
+
+def test_compile_mask_ignores_case():
+    assert compile_mask('ALICE!*@*.Example.COM')('alice!u@HOST.example.com')
+
+
+def test_compile_mask_rfc1459_equivalents():
+    match = compile_mask('[foo]\\bar~!*@*')
+    assert match('{foo}|bar^!u@h')
+    assert match('[FOO]\\BAR~!u@h')
+    assert compile_mask('{x}!*@*')('[x]!u@h')
+
+
+def test_compile_mask_casemapping():
+    assert not compile_mask('a~!*@*', 'strict-rfc1459')('a^!u@h')
+    assert not compile_mask('[x]!*@*', 'ascii')('{x}!u@h')
+    assert compile_mask('[x]!*@*', 'ascii')('[X]!u@h')
+
+
+@pytest.mark.parametrize('mask', ['$a:account', '~a:account', '~q:*!*@*'])
+def test_compile_mask_extbans_never_match(mask):
+    assert not compile_mask(mask)('account!*@*')
+    assert not compile_mask(mask)('a!b@c')
+
+
+@pytest.fixture
+def registry():
+    registry = ChannelRegistry()
+    for name, nicks in (('#a', ['alice', 'bob']), ('#b', ['alice'])):
+        channel = registry.add(name)
+        for nick in nicks:
+            channel.add_user(nick)
+    return registry
+
+
+def test_rename_user_moves_every_membership(registry):
+    changes = registry.rename_user('ALICE', 'Alicia')
+    assert sorted((channel.name, change['op'], change['new_nick']) for channel, change in changes) == [
+        ('#a', 'rename', 'Alicia'), ('#b', 'rename', 'Alicia')]
+    assert registry['#a'].has_user('alicia') and not registry['#a'].has_user('alice')
+    assert registry.get_user('alicia').nick == 'Alicia'
+    assert registry.get_user('alice') is None
+
+
+def test_rename_user_case_change_only(registry):
+    registry.rename_user('alice', 'Alice')
+    assert registry.get_user('alice').nick == 'Alice'
+    assert registry.channels_of('alice') == [registry['#a'], registry['#b']]
+
+
+def test_rename_onto_a_stale_entry_drops_it(registry):
+    registry['#b'].add_user('bob')  # bob's QUIT was missed; he is now only a stale entry
+    changes = registry.rename_user('alice', 'bob')
+    ops = sorted((channel.name, change['op']) for channel, change in changes)
+    assert ops == [('#a', 'remove'), ('#a', 'rename'), ('#b', 'remove'), ('#b', 'rename')]
+    user = registry.get_user('bob')
+    assert user.channels == {registry['#a']: '', registry['#b']: ''}
+    assert registry['#a'].members['bob'] is user
+    assert registry.get_stats()['users'] == 1
+
+
+def test_remove_user_from_every_channel(registry):
+    changes = registry.remove_user('alice')
+    assert sorted(channel.name for channel, _ in changes) == ['#a', '#b']
+    assert registry.get_user('alice') is None
+    assert '#b' in registry and not registry['#b'].members
+
+
+def test_seen_fills_in_hostmasks(registry):
+    registry.seen(NickMask('BOB!b@host.example'))
+    registry.seen(NickMask('stranger!s@elsewhere'))
+    registry.seen(NickMask('server.example'))
+    assert registry.get_user('bob').hostmask == 'bob!b@host.example'
+    assert registry.get_user('stranger') is None
+
+
+def test_rfc1459_casemapping_folds_nicks_and_channels():
+    registry = ChannelRegistry()
+    registry.add('#Chan[1]').add_user('Nick[a]')
+    assert '#chan{1}' in registry
+    assert registry.get_user('nick{A}').nick == 'Nick[a]'
+    registry.set_casemapping('ascii')
+    assert '#chan{1}' not in registry
+    assert '#chan[1]' in registry
@@ -0,0 +1,60 @@
+import types
+from irc.features import FeatureSet
+from irc_bouncer import IRCBouncer
+from channel_state import ChannelRegistry, ResyncQueue
+
+
+class Emitter:
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, data, room=None):
+        self.events.append((event, room))
+
+
+class Bot:
+    """The parts of IRCBouncer that handle NAMES replies."""
+    on_namreply = IRCBouncer.on_namreply
+    on_endofnames = IRCBouncer.on_endofnames
+    resync_channel = IRCBouncer.resync_channel
+
+    def __init__(self, caps=()):
+        self.webchat_channels = ChannelRegistry()
+        self.emitter = Emitter()
+        self.caps = types.SimpleNamespace(has=lambda cap: cap in caps)
+        self.requests = []
+        self.resync = ResyncQueue(lambda kind, channel: self.requests.append((kind, channel)))
+        self.connection = types.SimpleNamespace(features=FeatureSet())
+
+    def names(self, channel, names):
+        self.on_namreply(self.connection, types.SimpleNamespace(arguments=['=', channel, names]))
+        self.on_endofnames(self.connection, types.SimpleNamespace(arguments=[channel, 'End of /NAMES list.']))
+        self.resync.drain()
+
+
+def test_one_who_after_joining_not_after_every_names():
+    bot = Bot()
+    bot.webchat_channels.add('#c')
+    bot.names('#c', '@alice bob')
+    assert bot.requests == [('who', '#c')]
+    # A resync NAMES later, with some hosts still unknown, sends no further WHO
+    bot.names('#c', '@alice bob carol')
+    assert bot.requests == [('who', '#c')]
+
+
+def test_no_who_when_names_carry_hosts():
+    bot = Bot(caps=('userhost-in-names',))
+    bot.webchat_channels.add('#c')
+    bot.names('#c', '@alice!a@host.example bob!b@other.example')
+    assert bot.requests == []
+    assert bot.webchat_channels.get_user('alice').hostmask == 'alice!a@host.example'
+
+
+def test_rejoining_asks_again():
+    bot = Bot()
+    bot.webchat_channels.add('#c')
+    bot.names('#c', 'alice')
+    del bot.webchat_channels['#c']
+    bot.webchat_channels.add('#c')
+    bot.names('#c', 'alice')
+    assert bot.requests == [('who', '#c'), ('who', '#c')]
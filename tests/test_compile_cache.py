@@ -0,0 +1,81 @@
+import linecache
+import os
+
+import pytest
+
+from compile_cache import CACHE_SUFFIX, CompileCache
+
+SOURCE = 'def double(x):\n    return x * 2\n'
+
+
+def run(code):
+    namespace = {}
+    exec(code, namespace)
+    return namespace['double'](21)
+
+
+def entries(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(CACHE_SUFFIX))
+
+
+def test_second_compile_is_read_from_disk(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    assert run(cache.compile(SOURCE, '<module 1>')) == 42
+    again = CompileCache(str(tmp_path))  # As after a restart
+    assert run(again.compile(SOURCE, '<module 1>')) == 42
+    assert (cache.misses, cache.hits) == (1, 0)
+    assert (again.misses, again.hits) == (0, 1)
+    assert len(entries(tmp_path)) == 1
+
+
+def test_key_depends_on_source_and_filename(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    key = cache.key(SOURCE, '<module 1>')
+    assert cache.key(SOURCE, '<module 2>') != key
+    assert cache.key(SOURCE + '\n', '<module 1>') != key
+    # The filename is baked into the code object, so each gets its own entry
+    assert cache.compile(SOURCE, '<module 2>').co_filename == '<module 2>'
+    assert cache.compile(SOURCE, '<module 1>').co_filename == '<module 1>'
+    assert cache.misses == 2
+
+
+def test_corrupted_entry_is_discarded_and_recompiled(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    cache.compile(SOURCE, '<module 1>')
+    (name,) = entries(tmp_path)
+    (tmp_path / name).write_bytes(b'\xff not marshal')
+    assert run(cache.compile(SOURCE, '<module 1>')) == 42
+    assert cache.errors == 1
+    assert cache.misses == 2
+    assert entries(tmp_path) == [name]  # Rewritten with the fresh compile
+
+
+def test_syntax_errors_are_not_cached(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    with pytest.raises(SyntaxError):
+        cache.compile('def broken(:\n', '<module 1>')
+    assert entries(tmp_path) == []
+
+
+def test_prune_keeps_only_sources_in_use(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    cache.compile(SOURCE, '<module 1>')
+    cache.compile(SOURCE, '<module 2>')
+    cache.compile(SOURCE + '# edited\n', '<module 1>')  # Replaces module 1's first version
+    assert len(entries(tmp_path)) == 3
+    assert cache.prune() == 1
+    assert len(entries(tmp_path)) == 2
+    cache.release('<module 2>')
+    assert cache.prune() == 1
+    assert entries(tmp_path) == [cache.key(SOURCE + '# edited\n', '<module 1>') + CACHE_SUFFIX]
+
+
+def test_source_is_registered_for_tracebacks(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    cache.compile(SOURCE, '<module 7>')
+    assert linecache.getline('<module 7>', 2) == '    return x * 2\n'
+    linecache.checkcache('<module 7>')
+    assert linecache.getline('<module 7>', 1) == 'def double(x):\n'
+    cache.release('<module 7>')
+    assert linecache.getline('<module 7>', 1) == ''
+    assert cache.get_stats()['entries'] == 0
@@ -0,0 +1,40 @@
+from connect_sequencer import pack_joins
+from send_queue import LINE_LIMIT
+
+
+def test_no_channels_no_lines():
+    assert pack_joins([]) == []
+
+
+def test_channels_share_one_line():
+    assert pack_joins(['#a', '#b', '#c']) == ['JOIN #a,#b,#c']
+
+
+def test_lines_stay_within_the_line_limit():
+    channels = [f"#channel-{i:03d}" for i in range(200)]
+    lines = pack_joins(channels)
+    assert len(lines) > 1
+    for line in lines:
+        assert len(line.encode('utf-8')) + 2 <= LINE_LIMIT
+    assert [c for line in lines for c in line[len('JOIN '):].split(',')] == channels
+
+
+def test_exact_fit():
+    # "JOIN " + "#aaa,#bbb" is 14 bytes
+    assert pack_joins(['#aaa', '#bbb', '#c'], limit=14) == ['JOIN #aaa,#bbb', 'JOIN #c']
+
+
+def test_limit_counts_utf8_bytes():
+    lines = pack_joins(['#café', '#naïve', '#日本'], limit=20)
+    assert lines == ['JOIN #café,#naïve', 'JOIN #日本']
+    assert all(len(line.encode('utf-8')) <= 20 for line in lines)
+
+
+def test_targmax_caps_channels_per_line():
+    channels = [f"#c{i}" for i in range(7)]
+    assert pack_joins(channels, targmax=3) == ['JOIN #c0,#c1,#c2', 'JOIN #c3,#c4,#c5', 'JOIN #c6']
+
+
+def test_overlong_channel_gets_its_own_line():
+    long_name = '#' + 'x' * 30
+    assert pack_joins(['#a', long_name, '#b'], limit=20) == ['JOIN #a', f'JOIN {long_name}', 'JOIN #b']
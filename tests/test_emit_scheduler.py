@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from emit_scheduler import EmitScheduler, merge_user_events
+
+
+class SocketIO:
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, data, room=None):
+        self.sent.append((event, data, room))
+
+
+@pytest.fixture
+def scheduler():
+    # A long window: nothing flushes until flush() below shuts the scheduler down
+    scheduler = EmitScheduler(SocketIO(), window=60)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def flush(scheduler):
+    scheduler.shutdown()
+    scheduler.thread.join(5)
+    return scheduler.socketio.sent
+
+
+def delta(channel, version, *changes):
+    return {'channel': channel, 'version': version, 'changes': list(changes)}
+
+
+def test_events_keep_their_order_within_a_room(scheduler):
+    scheduler.emit('webchat_message', {'text': 'alice joined'}, room='#c')
+    scheduler.emit('webchat_users', delta('#c', 1, {'op': 'add', 'nick': 'alice'}), room='#c')
+    scheduler.emit('webchat_message', {'text': 'hi'}, room='#c')
+    assert [event for event, data, room in flush(scheduler)] == [
+        'webchat_message', 'webchat_users', 'webchat_message']
+
+
+def test_adjacent_messages_become_one_batch(scheduler):
+    for i in range(3):
+        scheduler.emit('webchat_message', {'text': str(i)}, room='#c')
+    scheduler.emit('webchat_message', {'text': 'other'}, room='#d')
+    sent = flush(scheduler)
+    assert sent == [
+        ('webchat_message_batch', {'channel': '#c', 'messages': [{'text': '0'}, {'text': '1'}, {'text': '2'}]}, '#c'),
+        ('webchat_message', {'text': 'other'}, '#d')]
+    assert scheduler.get_stats()['batched_messages'] == 3
+
+
+def test_adjacent_user_events_reduce_to_snapshot_and_one_delta(scheduler):
+    scheduler.emit('webchat_users', delta('#c', 1, {'op': 'add', 'nick': 'a'}), room='#c')
+    scheduler.emit('webchat_users', {'channel': '#c', 'version': 2, 'users': ['a', 'b']}, room='#c')
+    scheduler.emit('webchat_users', delta('#c', 3, {'op': 'add', 'nick': 'c'}), room='#c')
+    scheduler.emit('webchat_users', delta('#c', 4, {'op': 'remove', 'nick': 'a'}), room='#c')
+    assert [data for event, data, room in flush(scheduler)] == [
+        {'channel': '#c', 'version': 2, 'users': ['a', 'b']},
+        delta('#c', 4, {'op': 'add', 'nick': 'c'}, {'op': 'remove', 'nick': 'a'})]
+
+
+def test_state_event_is_replaced_where_it_sits(scheduler):
+    scheduler.emit('webchat_topic', {'topic': 'old'}, room='#c')
+    scheduler.emit('webchat_message', {'text': 'hi'}, room='#c')
+    scheduler.emit('webchat_topic', {'topic': 'new'}, room='#c')
+    assert flush(scheduler) == [
+        ('webchat_topic', {'topic': 'new'}, '#c'),
+        ('webchat_message', {'text': 'hi'}, '#c')]
+    assert scheduler.get_stats()['merged'] == 1
+
+
+def test_broadcast_and_rooms_flush_independently(scheduler):
+    scheduler.emit('status_update', {'connected': False})
+    scheduler.emit('webchat_message', {'text': 'hi'}, room='#c')
+    scheduler.emit('status_update', {'connected': True})
+    assert flush(scheduler) == [
+        ('status_update', {'connected': True}, None),
+        ('webchat_message', {'text': 'hi'}, '#c')]
+
+
+def test_window_flushes_without_shutdown():
+    scheduler = EmitScheduler(SocketIO(), window=0.01)
+    try:
+        scheduler.emit('webchat_message', {'text': 'hi'}, room='#c')
+        end = time.monotonic() + 5
+        while not scheduler.socketio.sent and time.monotonic() < end:
+            time.sleep(0.005)
+        assert scheduler.socketio.sent == [('webchat_message', {'text': 'hi'}, '#c')]
+    finally:
+        scheduler.shutdown()
+
+
+def test_emits_after_shutdown_go_straight_out(scheduler):
+    flush(scheduler)
+    scheduler.emit('webchat_message', {'text': 'late'}, room='#c')
+    assert scheduler.socketio.sent == [('webchat_message', {'text': 'late'}, '#c')]
+
+
+def test_merge_user_events_without_snapshot():
+    assert merge_user_events([delta('#c', 1, 'x'), delta('#c', 2, 'y')]) == [delta('#c', 2, 'x', 'y')]
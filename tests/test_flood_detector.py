@@ -0,0 +1,116 @@
+import pytest
+from flood_detector import MAX_NICKS_PER_CHANNEL, FloodDetector, max_nicks_per_channel
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_flags_more_than_threshold_messages_in_the_window(clock):
+    detector = FloodDetector(clock=clock)
+    results = []
+    for _ in range(4):
+        results.append(detector.check('#c', 'alice', 3, 10))
+        clock.now += 1
+    assert results == [False, False, False, True]
+
+
+def test_old_messages_leave_the_window(clock):
+    detector = FloodDetector(clock=clock)
+    for _ in range(3):
+        detector.check('#c', 'alice', 3, 10)
+    clock.now += 11
+    assert not detector.check('#c', 'alice', 3, 10)
+
+
+def test_nicks_and_channels_counted_separately(clock):
+    detector = FloodDetector(clock=clock)
+    for _ in range(3):
+        detector.check('#c', 'alice', 3, 10)
+    assert not detector.check('#c', 'bob', 3, 10)
+    assert not detector.check('#other', 'alice', 3, 10)
+
+
+def test_sweep_drops_idle_nicks_only(clock):
+    detector = FloodDetector(sweep_interval=60, clock=clock)
+    detector.check('#c', 'idle', 5, 10)
+    detector.check('#quiet', 'idle', 5, 10)
+    clock.now += 30
+    detector.check('#c', 'active', 5, 10)
+    detector.sweep()
+    assert list(detector.channels) == ['#c']
+    assert list(detector.channels['#c']) == ['active']
+    assert detector.get_stats()['evicted_idle'] == 2
+
+
+def test_sweep_runs_from_check(clock):
+    detector = FloodDetector(sweep_interval=60, clock=clock)
+    detector.check('#c', 'idle', 5, 10)
+    clock.now += 61
+    detector.check('#c', 'active', 5, 10)
+    assert list(detector.channels['#c']) == ['active']
+
+
+def test_threshold_change_keeps_lru_order(clock):
+    detector = FloodDetector(clock=clock)
+    detector.check('#c', 'alice', 5, 10)
+    clock.now += 1
+    detector.check('#c', 'bob', 5, 10)
+    clock.now += 5
+    # The channel's threshold changes; alice is now the most recently active
+    detector.check('#c', 'alice', 8, 10)
+    assert list(detector.channels['#c']) == ['bob', 'alice']
+    clock.now += 6
+    detector.sweep()
+    assert list(detector.channels['#c']) == ['alice']
+
+
+def test_threshold_change_keeps_recent_messages(clock):
+    detector = FloodDetector(clock=clock)
+    for _ in range(3):
+        detector.check('#c', 'alice', 5, 10)
+    assert detector.check('#c', 'alice', 3, 10)
+
+
+def test_cap_evicts_least_recently_active(clock):
+    detector = FloodDetector(max_nicks_per_channel=2, clock=clock)
+    detector.check('#c', 'a', 5, 10)
+    detector.check('#c', 'b', 5, 10)
+    detector.check('#c', 'a', 5, 10)
+    detector.check('#c', 'c', 5, 10)
+    assert list(detector.channels['#c']) == ['a', 'c']
+    assert detector.get_stats()['evicted_cap'] == 1
+
+
+def test_forget(clock):
+    detector = FloodDetector(clock=clock)
+    detector.check('#a', 'alice', 5, 10)
+    detector.check('#b', 'alice', 5, 10)
+    detector.check('#b', 'bob', 5, 10)
+    detector.forget_nick('alice')
+    assert list(detector.channels) == ['#b']
+    detector.forget_channel('#b')
+    assert detector.get_stats()['tracked_nicks'] == 0
+
+
+@pytest.mark.parametrize('value, cap', [
+    (None, MAX_NICKS_PER_CHANNEL),
+    ('250', 250),
+    ('0', MAX_NICKS_PER_CHANNEL),
+    ('lots', MAX_NICKS_PER_CHANNEL),
+])
+def test_cap_from_environment(monkeypatch, value, cap):
+    if value is None:
+        monkeypatch.delenv('FLOOD_MAX_NICKS_PER_CHANNEL', raising=False)
+    else:
+        monkeypatch.setenv('FLOOD_MAX_NICKS_PER_CHANNEL', value)
+    assert max_nicks_per_channel() == cap
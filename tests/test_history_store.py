@@ -0,0 +1,107 @@
+import pytest
+from history_store import MAX_PAGE_SIZE, HistoryStore, parse_cursor
+from scrollback import make_cursor
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    stores = []
+
+    def open_store(**kwargs):
+        store = HistoryStore(str(tmp_path / 'history.db'), flush_interval=0.01, **kwargs)
+        stores.append(store)
+        return store
+
+    yield open_store
+    for store in stores:
+        store.close()
+
+
+def fill(store, channel, count, start=1000.0):
+    ids = [store.append(channel, 'alice', f"line {i}", start + i) for i in range(count)]
+    return ids
+
+
+def texts(rows):
+    return [row[3] for row in rows]
+
+
+def test_close_flushes_queued_messages(open_store):
+    store = open_store(batch_size=7)
+    ids = fill(store, '#c', 50)
+    store.close()
+    assert ids == list(range(1, 51))
+    assert store.get_stats()['written'] == 50
+    assert store.get_stats()['batches'] >= 8
+    assert texts(store.page('#c', limit=100)) == [f"line {i}" for i in range(50)]
+
+
+def test_ids_continue_after_reopening(open_store):
+    store = open_store()
+    fill(store, '#c', 3)
+    store.close()
+    assert open_store().append('#c', 'bob', 'hi', 2000.0) == 4
+
+
+def test_newest_page_then_older_pages(open_store):
+    store = open_store()
+    fill(store, '#c', 25)
+    fill(store, '#other', 5)
+    store.close()
+    page = store.page('#c', limit=10)
+    assert texts(page) == [f"line {i}" for i in range(15, 25)]
+    older = store.page('#c', before=make_cursor(page[0][1], page[0][0]), limit=10)
+    assert texts(older) == [f"line {i}" for i in range(5, 15)]
+    oldest = store.page('#c', before=make_cursor(older[0][1], older[0][0]), limit=10)
+    assert texts(oldest) == [f"line {i}" for i in range(5)]
+
+
+def test_newer_page_after_a_cursor(open_store):
+    store = open_store()
+    fill(store, '#c', 25)
+    store.close()
+    first = store.page('#c', limit=1, before=make_cursor(1010.0, 11))
+    assert texts(first) == ['line 9']
+    newer = store.page('#c', after=make_cursor(first[0][1], first[0][0]), limit=3)
+    assert texts(newer) == ['line 10', 'line 11', 'line 12']
+
+
+def test_same_timestamp_ordered_by_id(open_store):
+    store = open_store()
+    for i in range(6):
+        store.append('#c', 'alice', f"burst {i}", 1000.0)
+    store.close()
+    page = store.page('#c', limit=3)
+    assert texts(page) == ['burst 3', 'burst 4', 'burst 5']
+    older = store.page('#c', before=make_cursor(page[0][1], page[0][0]), limit=3)
+    assert texts(older) == ['burst 0', 'burst 1', 'burst 2']
+
+
+def test_page_size_is_capped_but_recent_is_not(open_store):
+    store = open_store()
+    fill(store, '#c', MAX_PAGE_SIZE + 100)
+    store.close()
+    assert len(store.page('#c', limit=10 ** 6)) == MAX_PAGE_SIZE
+    recent = store.recent('#c', MAX_PAGE_SIZE + 50)
+    assert len(recent) == MAX_PAGE_SIZE + 50
+    assert recent[-1].message == f"line {MAX_PAGE_SIZE + 99}"
+    assert recent[0].id < recent[-1].id
+
+
+def test_malformed_cursor_treated_as_none(open_store):
+    assert parse_cursor('nonsense') is None
+    assert parse_cursor('1.5:x') is None
+    assert parse_cursor(make_cursor(1.5, 7)) == (1.5, 7)
+    store = open_store()
+    fill(store, '#c', 3)
+    store.close()
+    assert texts(store.page('#c', before='garbage')) == ['line 0', 'line 1', 'line 2']
+
+
+def test_full_write_queue_drops(open_store):
+    store = open_store(max_pending=1)
+    store.stopping.set()  # Hold the writer back so the queue fills
+    store.writer.join(1)
+    store.append('#c', 'alice', 'kept', 1.0)
+    store.append('#c', 'alice', 'dropped', 2.0)
+    assert store.get_stats()['dropped'] == 1
@@ -0,0 +1,79 @@
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+import urllib3.util.connection
+from urllib3.util.connection import allowed_gai_family
+from http_client import DNSCache, HTTPClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'ok'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Connection', 'close')  # Every request needs a new connection
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def test_dns_cache_reuses_and_expires(monkeypatch):
+    calls = []
+    monkeypatch.setattr(socket, 'getaddrinfo', lambda *args: calls.append(args) or [('addr',)])
+    now = [100.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = DNSCache(ttl=10, max_entries=2)
+    cache.resolve('a.example', 80)
+    cache.resolve('a.example', 80)
+    assert len(calls) == 1
+    now[0] += 11
+    cache.resolve('a.example', 80)
+    assert len(calls) == 2
+    cache.resolve('b.example', 80)
+    cache.resolve('c.example', 80)
+    assert cache.get_stats() == {'size': 2, 'hits': 1, 'misses': 4}
+
+
+def test_session_resolves_through_its_own_cache(server):
+    original = urllib3.util.connection.create_connection
+    client = HTTPClient()
+    for _ in range(3):
+        assert client.get(f"http://localhost:{server}/").text == 'ok'
+    assert client.dns.get_stats()['misses'] == 1
+    assert client.dns.get_stats()['hits'] == 2
+    # Nothing outside the shared session is affected
+    assert urllib3.util.connection.create_connection is original
+    requests.get(f"http://localhost:{server}/", timeout=5)
+    assert client.dns.get_stats()['misses'] + client.dns.get_stats()['hits'] == 3
+
+
+def test_next_cached_address_tried_when_one_refuses(server):
+    client = HTTPClient()
+    refused = (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.2', server))
+    working = (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', server))
+    client.dns.entries[('refusing.test', server, allowed_gai_family())] = (time.monotonic() + 60, [refused, working])
+    assert client.get(f"http://refusing.test:{server}/").text == 'ok'
+
+
+def test_unresolvable_host_raises_connection_error():
+    client = HTTPClient()
+    with pytest.raises(requests.ConnectionError):
+        client.get('http://does-not-exist.invalid/', timeout=2)
+    assert client.get_stats()['errors'] == 1
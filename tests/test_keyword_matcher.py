@@ -0,0 +1,95 @@
+import random
+import re
+from keyword_matcher import KeywordMatcher, PatternMatcher
+
+
+def keyword_matcher(keywords):
+    matcher = KeywordMatcher()
+    for owner, keyword in keywords.items():
+        matcher.add(keyword, owner)
+    return matcher.build()
+
+
+def test_keywords_found_anywhere():
+    matcher = keyword_matcher({1: 'deploy', 2: 'lunch'})
+    assert matcher.find('who broke the deployment?') == {1}
+    assert matcher.find('lunch after the deploy') == {1, 2}
+    assert matcher.find('nothing here') == set()
+
+
+def test_overlapping_keywords():
+    matcher = keyword_matcher({1: 'he', 2: 'she', 3: 'his', 4: 'hers'})
+    assert matcher.find('ushers') == {1, 2, 4}
+    assert matcher.find('this') == {3}
+
+
+def test_case_insensitive():
+    matcher = keyword_matcher({1: 'GitHub'})
+    assert matcher.find('see GITHUB.com') == {1}
+    assert matcher.find('see github') == {1}
+
+
+def test_shared_keyword_and_empty_keyword():
+    matcher = KeywordMatcher()
+    matcher.add('ping', 1)
+    matcher.add('PING', 2)
+    matcher.add('', 3)
+    matcher.build()
+    assert len(matcher) == 2
+    assert matcher.find('ping?') == {1, 2}
+
+
+def test_matches_brute_force():
+    rng = random.Random(3)
+    keywords = {i: ''.join(rng.choice('abc') for _ in range(rng.randint(1, 4))) for i in range(30)}
+    matcher = keyword_matcher(keywords)
+    for _ in range(500):
+        text = ''.join(rng.choice('abcABd ') for _ in range(rng.randint(0, 20)))
+        expected = {owner for owner, keyword in keywords.items() if keyword in text.lower()}
+        assert matcher.find(text) == expected, text
+
+
+def pattern_matcher(patterns):
+    matcher = PatternMatcher()
+    for owner, pattern in patterns.items():
+        matcher.add(pattern, owner)
+    return matcher.build()
+
+
+def test_patterns_matched_per_owner():
+    matcher = pattern_matcher({1: r'\bissue #(\d+)', 2: r'^!\w+', 3: re.compile('hello', re.IGNORECASE)})
+    assert matcher.find('see issue #12') == {1}
+    assert matcher.find('!help with issue #3') == {1, 2}
+    assert matcher.find('HELLO') == {3}
+    assert matcher.find('nothing') == set()
+    assert matcher.prefilter is not None
+
+
+def test_flags_stay_scoped_to_their_pattern():
+    matcher = pattern_matcher({1: re.compile('abc', re.IGNORECASE), 2: 'xyz'})
+    assert matcher.find('ABC XYZ') == {1}
+
+
+def test_backreferences_checked_on_their_own():
+    matcher = pattern_matcher({1: r'(\w)\1\1', 2: r'(?P<w>\w+) (?P=w)', 3: r'(x)y'})
+    assert len(matcher.standalone) == 2
+    assert matcher.find('aaa') == {1}
+    assert matcher.find('the the') == {2}
+    assert matcher.find('xy') == {3}
+
+
+def test_invalid_pattern_rejected():
+    matcher = PatternMatcher()
+    assert not matcher.add('(unclosed', 1)
+    assert matcher.add('fine', 2)
+    matcher.build()
+    assert len(matcher) == 1
+    assert matcher.find('fine (unclosed') == {2}
+
+
+def test_global_flag_falls_back_to_one_by_one():
+    # A global inline flag is only allowed at the start of the combined regex
+    matcher = pattern_matcher({1: 'abc', 2: '(?i)xyz'})
+    assert matcher.prefilter is None
+    assert len(matcher.standalone) == 2
+    assert matcher.find('abc XYZ') == {1, 2}
@@ -0,0 +1,275 @@
+import contextlib
+import threading
+import time
+import types
+
+import pytest
+
+import module_loader
+from compile_cache import CompileCache
+from module_loader import QUARANTINE_STRIKES, ModuleLoader, is_noop
+
+
+class Module:
+    def passes(self, connection, event):
+        pass
+
+    def documented(self, connection, event):
+        """Nothing to do."""
+
+    def returns(self, connection, event):
+        return
+
+    def returns_none(self, connection, event):
+        return None
+
+    def returns_value(self, connection, event):
+        return 1
+
+    def prints(self, connection, event):
+        print(event)
+
+    def raises(self, connection, event):
+        raise NotImplementedError
+
+
+def test_empty_bodies_are_noops():
+    module = Module()
+    for hook in (module.passes, module.documented, module.returns, module.returns_none):
+        assert is_noop(hook), hook.__name__
+
+
+def test_real_bodies_are_not_noops():
+    module = Module()
+    for hook in (module.returns_value, module.prints, module.raises):
+        assert not is_noop(hook), hook.__name__
+
+
+def test_unbound_functions_and_lambdas():
+    assert is_noop(Module.passes)
+    assert is_noop(lambda: None)
+    assert not is_noop(lambda: 0)
+
+
+def test_callables_without_bytecode_are_not_noops():
+    assert not is_noop(print)
+    assert not is_noop(object())
+
+
+class Bot:
+    def __init__(self):
+        self.reactor_calls = []
+        self.send_queue = types.SimpleNamespace(lane=lambda name: contextlib.nullcontext())
+
+    def call_in_reactor(self, func, *args):
+        self.reactor_calls.append((func, args))
+
+    def run_reactor_calls(self):
+        calls, self.reactor_calls = self.reactor_calls, []
+        for func, args in calls:
+            func(*args)
+
+
+class ModuleTable:
+    """Stands in for the Module model: query.filter_by(is_enabled=True).all()."""
+
+    def __init__(self):
+        self.rows = {}
+        self.query = self
+
+    def filter_by(self, is_enabled):
+        self.enabled = is_enabled
+        return self
+
+    def all(self):
+        return [row for row in self.rows.values() if row.is_enabled == self.enabled]
+
+    def add(self, module_id, name, trigger, code, is_enabled=True):
+        self.rows[module_id] = types.SimpleNamespace(id=module_id, name=name, trigger=trigger, code=code,
+                                                     is_enabled=is_enabled)
+        return self.rows[module_id]
+
+
+COMMAND_SOURCE = '''
+import time
+
+
+class Module:
+    delay = 0
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.calls = []
+
+    def handle_command(self, connection, event, command, args, channel, nick):
+        time.sleep(self.delay)
+        self.calls.append(args)
+'''
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = ModuleTable()
+    monkeypatch.setattr(module_loader, 'Module', table)
+    return table
+
+
+@pytest.fixture
+def loader(table, monkeypatch, tmp_path):
+    monkeypatch.setattr(module_loader, 'get_compile_cache', lambda: CompileCache(str(tmp_path / 'cache')))
+    loader = ModuleLoader(Bot())
+    yield loader
+    loader.pool.shutdown()
+
+
+def settle(loader, timeout=5):
+    """Wait for queued hook calls to finish, then run their reactor callbacks."""
+    end = time.monotonic() + timeout
+    while True:
+        stats = loader.pool.get_stats()
+        if not stats['pending'] and not stats['running']:
+            break
+        assert time.monotonic() < end
+        time.sleep(0.01)
+    time.sleep(0.02)  # The job callback runs just after the job leaves the running set
+    loader.bot.run_reactor_calls()
+
+
+def command(loader, name, *args):
+    loader.handle_command(None, None, name, list(args), '#c', 'alice')
+
+
+def test_commands_run_on_the_pool_in_order(loader, table):
+    table.add(1, 'echo', '!echo', COMMAND_SOURCE)
+    loader.sync_modules()
+    for i in range(5):
+        command(loader, 'echo', str(i))
+    settle(loader)
+    assert loader.loaded_modules[1].calls == [[str(i)] for i in range(5)]
+
+
+def test_strikes_quarantine_a_module_and_release_it(loader, table):
+    table.add(1, 'echo', '!echo', COMMAND_SOURCE)
+    loader.sync_modules()
+    for _ in range(QUARANTINE_STRIKES):
+        loader._strike(1, 'echo', 'test')
+    assert loader.is_quarantined(1)
+    assert 'echo' not in loader.dispatch.commands
+    command(loader, 'echo', 'ignored')
+    settle(loader)
+    assert loader.loaded_modules[1].calls == []
+    assert loader.get_stats()['quarantined'] == ['echo']
+    # Quarantine over: the next watchdog tick puts it back
+    loader.quarantined[1] = time.monotonic() - 1
+    loader.watchdog()
+    assert not loader.is_quarantined(1)
+    assert 'echo' in loader.dispatch.commands
+
+
+def test_slow_hooks_are_struck_once_each(loader, table, monkeypatch):
+    monkeypatch.setattr(module_loader, 'LATENCY_BUDGET', 0.05)
+    row = table.add(1, 'slow', '!slow', COMMAND_SOURCE.replace('delay = 0', 'delay = 0.3'))
+    loader.sync_modules()
+    command(loader, 'slow')
+    time.sleep(0.15)
+    loader.watchdog()  # Still running past the budget: one strike now...
+    settle(loader)  # ...and none more when it finishes
+    assert len(loader.strikes[1]) == 1
+    row.code = row.code.replace('delay = 0.3', 'delay = 0.1')
+    loader.sync_modules()
+    for _ in range(QUARANTINE_STRIKES):
+        command(loader, 'slow')
+    settle(loader)
+    assert loader.is_quarantined(1)
+
+
+def test_quarantine_while_a_load_holds_the_lock(loader, table):
+    table.add(1, 'echo', '!echo', COMMAND_SOURCE)
+    loader.sync_modules()
+    held = threading.Event()
+    release = threading.Event()
+
+    def load():
+        with loader.lock:
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=load)
+    thread.start()
+    held.wait(5)
+    loader.quarantine(1)  # Must not wait for the lock
+    assert loader.dispatch_stale
+    assert 'echo' in loader.dispatch.commands
+    command(loader, 'echo', 'skipped')  # Still in the old table, but not run
+    release.set()
+    thread.join(5)
+    loader.watchdog()
+    assert not loader.dispatch_stale
+    assert 'echo' not in loader.dispatch.commands
+    settle(loader)
+    assert loader.loaded_modules[1].calls == []
+
+
+def test_unloading_clears_quarantine(loader, table):
+    row = table.add(1, 'echo', '!echo', COMMAND_SOURCE)
+    loader.sync_modules()
+    loader.quarantine(1)
+    row.code += '\n'
+    loader.sync_modules()
+    assert not loader.is_quarantined(1)
+    assert 'echo' in loader.dispatch.commands
+
+
+def test_sync_touches_only_what_changed(loader, table):
+    echo = table.add(1, 'echo', '!echo', COMMAND_SOURCE)
+    other = table.add(2, 'other', '!other', COMMAND_SOURCE)
+    summary = loader.sync_modules()
+    assert [entry.split()[0] for entry in summary['loaded']] == ['echo', 'other']
+    first = loader.loaded_modules[1]
+    first.calls.append('state')
+
+    summary = loader.sync_modules()
+    assert summary['unchanged'] == 2
+    assert loader.loaded_modules[1] is first
+
+    # A new trigger or name is applied in place, keeping the instance and its state
+    echo.trigger, echo.name = '!say', 'say'
+    summary = loader.sync_modules()
+    assert summary['updated'] == ['say']
+    assert loader.loaded_modules[1] is first
+    assert set(loader.dispatch.commands) == {'say', 'other'}
+    assert loader.module_names[1] == 'say'
+
+    # New code reloads only that module
+    second = loader.loaded_modules[2]
+    other.code += '\n# changed\n'
+    summary = loader.sync_modules()
+    assert [entry.split()[0] for entry in summary['reloaded']] == ['other']
+    assert loader.loaded_modules[2] is not second
+    assert loader.loaded_modules[1] is first
+
+    echo.is_enabled = False
+    summary = loader.sync_modules()
+    assert summary['unloaded'] == ['say']
+    assert 1 not in loader.loaded_modules
+    assert set(loader.dispatch.commands) == {'other'}
+
+
+def test_sync_reports_modules_that_fail_to_load(loader, table):
+    table.add(1, 'broken', '!broken', 'class Module(:\n')
+    table.add(2, 'echo', '!echo', COMMAND_SOURCE)
+    summary = loader.sync_modules()
+    assert summary['failed'] == ['broken']
+    assert 1 not in loader.loaded_modules
+    assert set(loader.dispatch.commands) == {'echo'}
+    assert loader.last_sync is summary
+
+
+def test_sync_unloads_deleted_modules(loader, table):
+    table.add(1, 'echo', '!echo', COMMAND_SOURCE)
+    loader.sync_modules()
+    del table.rows[1]
+    summary = loader.sync_modules()
+    assert summary['unloaded'] == ['echo']
+    assert loader.module_triggers == {}
+    assert loader.dispatch.commands == {}
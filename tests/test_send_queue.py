@@ -0,0 +1,166 @@
+import pytest
+from irc.client import MessageTooLong
+import send_queue
+from send_queue import HOSTMASK_RESERVE, LINE_LIMIT, OutboundQueue, split_utf8
+
+
+def test_short_text_is_one_piece():
+    assert split_utf8('hello', 10) == ['hello']
+
+
+def test_empty_text_is_one_empty_piece():
+    assert split_utf8('', 10) == ['']
+
+
+def test_prefers_splitting_at_a_space():
+    assert split_utf8('hello world again', 12) == ['hello world', 'again']
+
+
+def test_long_word_is_cut_at_the_limit():
+    assert split_utf8('a' * 25, 10) == ['a' * 10, 'a' * 10, 'a' * 5]
+
+
+@pytest.mark.parametrize('text', [
+    'é' * 50,
+    '日本語のテキスト' * 10,
+    '😀 mixed ascii and emoji 😀' * 5,
+    'x' + '😀' * 30,
+])
+@pytest.mark.parametrize('limit', [5, 7, 16, 31])
+def test_multibyte_characters_are_never_split(text, limit):
+    pieces = split_utf8(text, limit)
+    for piece in pieces:
+        assert len(piece.encode('utf-8')) <= limit
+    # Only the spaces the split happened at are dropped
+    assert ''.join(pieces).replace(' ', '') == text.replace(' ', '')
+
+
+@pytest.mark.parametrize('limit', [-1, 0, 1, 3])
+def test_limit_smaller_than_a_character_still_makes_progress(limit):
+    assert split_utf8('😀é😀', limit) == ['😀', 'é', '😀']
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(send_queue.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def make_queue(penalty_bytes=10 ** 6, **kwargs):
+    sent = []
+    return OutboundQueue(sent.append, penalty_bytes=penalty_bytes, **kwargs), sent
+
+
+def test_lines_held_back_once_the_burst_is_used(clock):
+    queue, sent = make_queue(burst=4, penalty=2)
+    for i in range(5):
+        queue.enqueue(f"PRIVMSG #c :line {i}")
+    # Each line adds two seconds; sending stops once the clock is over four seconds ahead
+    assert sent == ['PRIVMSG #c :line 0', 'PRIVMSG #c :line 1']
+    clock[0] += 2
+    queue.drain()
+    assert sent[-1] == 'PRIVMSG #c :line 2'
+    clock[0] += 10
+    queue.drain()
+    assert len(sent) == 5
+    assert queue.get_stats()['depth'] == 0
+
+
+def test_urgent_lines_are_never_held_back(clock):
+    queue, sent = make_queue(burst=0, penalty=2)
+    queue.enqueue('PRIVMSG #c :first')
+    queue.enqueue('PRIVMSG #c :held')
+    queue.enqueue('PONG :server')
+    assert sent == ['PRIVMSG #c :first', 'PONG :server']
+
+
+def test_lanes_served_in_priority_order(clock):
+    queue, sent = make_queue(burst=0, penalty=1)
+    queue.enqueue('PRIVMSG #c :blocker')
+    with queue.lane('bulk'):
+        queue.enqueue('PRIVMSG #c :bulk')
+    queue.enqueue('PRIVMSG #c :normal')
+    queue.enqueue('KICK #c spammer :bye')
+    for _ in range(3):
+        clock[0] += 2
+        queue.drain()
+    assert sent == ['PRIVMSG #c :blocker', 'KICK #c spammer :bye', 'PRIVMSG #c :normal', 'PRIVMSG #c :bulk']
+
+
+def test_targets_served_round_robin(clock):
+    queue, sent = make_queue(burst=0, penalty=1)
+    queue.enqueue('PRIVMSG #busy :blocker')
+    for i in range(3):
+        queue.enqueue(f"PRIVMSG #busy :{i}")
+    queue.enqueue('PRIVMSG #quiet :hello')
+    for _ in range(4):
+        clock[0] += 2
+        queue.drain()
+    assert sent[1:3] == ['PRIVMSG #busy :0', 'PRIVMSG #quiet :hello']
+
+
+@pytest.mark.parametrize('line, lane', [
+    ('MODE #c +b', 'bulk'),
+    ('MODE #c +bI', 'bulk'),
+    ('MODE #c', 'bulk'),
+    ('MODE #c +b *!*@spam', 'moderation'),
+    ('MODE #c -b', 'moderation'),
+    ('MODE #c +o alice', 'moderation'),
+    ('MODE #c +m', 'moderation'),
+])
+def test_mode_queries_keep_the_callers_lane(clock, line, lane):
+    queue, sent = make_queue(burst=0, penalty=1)
+    queue.enqueue('PRIVMSG #x :blocker')
+    with queue.lane('bulk'):
+        queue.enqueue(line)
+    assert queue.get_stats()['lanes'][lane] == 1
+
+
+def test_full_queue_drops_new_lines(clock):
+    queue, sent = make_queue(burst=0, penalty=1, max_queue=2)
+    for i in range(5):
+        queue.enqueue(f"PRIVMSG #c :{i}")
+    assert queue.get_stats()['depth'] == 2
+    assert queue.get_stats()['dropped'] == 2
+
+
+def test_long_privmsg_split_within_line_limit(clock):
+    queue, sent = make_queue(burst=10 ** 6)
+    queue.enqueue('PRIVMSG #c :' + 'word ' * 300)
+    assert len(sent) > 1
+    for line in sent:
+        assert line.startswith('PRIVMSG #c :')
+        assert len(line.encode('utf-8')) + 2 + HOSTMASK_RESERVE <= LINE_LIMIT
+
+
+def test_multi_line_privmsg_sent_as_separate_lines(clock):
+    queue, sent = make_queue(burst=10 ** 6)
+    queue.enqueue('PRIVMSG #c :one\ntwo\r\n\nthree')
+    assert sent == ['PRIVMSG #c :one', 'PRIVMSG #c :two', 'PRIVMSG #c :three']
+
+
+def test_long_ctcp_action_keeps_its_framing(clock):
+    queue, sent = make_queue(burst=10 ** 6)
+    queue.enqueue('PRIVMSG #c :\x01ACTION ' + 'waves ' * 150 + '\x01')
+    assert len(sent) > 1
+    for line in sent:
+        assert line.startswith('PRIVMSG #c :\x01ACTION ')
+        assert line.endswith('\x01')
+        assert line.count('\x01') == 2
+        assert len(line.encode('utf-8')) + 2 + HOSTMASK_RESERVE <= LINE_LIMIT
+    body = ' '.join(line[len('PRIVMSG #c :\x01ACTION '):-1] for line in sent)
+    assert body.split() == ['waves'] * 150
+
+
+def test_short_ctcp_unchanged(clock):
+    queue, sent = make_queue(burst=10 ** 6)
+    queue.enqueue('NOTICE bob :\x01VERSION\x01')
+    queue.enqueue('PRIVMSG #c :\x01ACTION waves\x01')
+    assert sent == ['NOTICE bob :\x01VERSION\x01', 'PRIVMSG #c :\x01ACTION waves\x01']
+
+
+def test_raw_line_too_long_rejected(clock):
+    queue, sent = make_queue()
+    with pytest.raises(MessageTooLong):
+        queue.enqueue('TOPIC #c ' + 'x' * 600)
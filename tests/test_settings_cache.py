@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+from flask import Flask
+
+import settings_cache
+from extensions import db
+from models import ChannelManagementSettings
+from settings_cache import ChannelSettingsCache
+
+
+@pytest.fixture
+def test_app(monkeypatch, tmp_path):
+    """A throwaway app on its own SQLite file, so the bot's database is never touched."""
+    test_app = Flask(__name__)
+    test_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'settings.db'}"
+    db.init_app(test_app)
+    with test_app.app_context():
+        ChannelManagementSettings.__table__.create(db.engine)
+    monkeypatch.setattr(settings_cache, 'app', test_app)
+    yield test_app
+    with test_app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+def add_channel(test_app, channel, **values):
+    with test_app.app_context():
+        db.session.add(ChannelManagementSettings(channel=channel, **values))
+        db.session.commit()
+
+
+def test_table_is_read_once_until_a_commit(test_app):
+    add_channel(test_app, '#a', flood_threshold=5)
+    cache = ChannelSettingsCache()
+    assert cache.get('#a')['flood_threshold'] == 5
+    assert cache.get('#b') is None
+    assert cache.loads == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_committed_change_invalidates_every_cache(test_app):
+    add_channel(test_app, '#a')
+    first, second = ChannelSettingsCache(), ChannelSettingsCache()
+    first.snapshot()
+    second.snapshot()
+    with test_app.app_context():
+        row = ChannelManagementSettings.query.filter_by(channel='#a').first()
+        row.caps_percentage = 50
+        db.session.commit()
+    assert first.get('#a')['caps_percentage'] == 50
+    assert second.get('#a')['caps_percentage'] == 50
+    assert (first.loads, second.loads) == (2, 2)
+
+
+def test_deleting_a_row_invalidates(test_app):
+    add_channel(test_app, '#a')
+    cache = ChannelSettingsCache()
+    assert cache.get('#a') is not None
+    with test_app.app_context():
+        db.session.delete(ChannelManagementSettings.query.filter_by(channel='#a').first())
+        db.session.commit()
+    assert cache.get('#a') is None
+
+
+def test_rolled_back_change_does_not_invalidate(test_app):
+    add_channel(test_app, '#a')
+    cache = ChannelSettingsCache()
+    cache.snapshot()
+    with test_app.app_context():
+        row = ChannelManagementSettings.query.filter_by(channel='#a').first()
+        row.is_enabled = False
+        db.session.flush()
+        db.session.rollback()
+        db.session.commit()  # Nothing left to commit; must not pick up the rolled back flag
+    cache.snapshot()
+    assert cache.loads == 1
+
+
+def test_explicit_invalidate_forces_a_reload(test_app):
+    cache = ChannelSettingsCache()
+    cache.snapshot()
+    cache.invalidate()
+    cache.snapshot()
+    assert cache.loads == 2
+
+
+def test_concurrent_readers_share_one_reload(test_app, monkeypatch):
+    add_channel(test_app, '#a')
+    cache = ChannelSettingsCache()
+    load = cache._load
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_load():
+        started.set()
+        release.wait(5)
+        return load()
+
+    monkeypatch.setattr(cache, '_load', slow_load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get('#a'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert cache.loads == 1
+    assert len(results) == 4 and all(result['is_enabled'] for result in results)
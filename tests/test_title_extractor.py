@@ -0,0 +1,77 @@
+import pytest
+from title_extractor import detect_charset, extract_title, is_html, parse_content_type
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_title_in_one_chunk():
+    assert extract_title([b'<html><head><title> Hello\n  world </title>']) == 'Hello world'
+
+
+@pytest.mark.parametrize('size', [1, 3, 7, 16, 50])
+def test_title_split_across_chunks(size):
+    page = b'<html><head>' + b'<!-- padding -->' * 10 + b'<TITLE lang="en">Split &amp; joined</TITLE></head>'
+    assert extract_title(chunked(page, size)) == 'Split & joined'
+
+
+OG_TAG = b'<meta property="og:title" content="' + b'A fairly long open graph title' * 3 + b'">'
+
+
+@pytest.mark.parametrize('cut', [1, 5, 20, len(OG_TAG) // 2, len(OG_TAG) - 1])
+def test_og_title_split_across_chunks(cut):
+    page = b'<html><head>' + OG_TAG + b'<body>' + b'x' * 100
+    split = len(b'<html><head>') + cut
+    assert extract_title([page[:split], page[split:]]) == 'A fairly long open graph title' * 3
+
+
+def test_og_title_closing_far_into_the_next_chunk():
+    page = b'<head><meta property="og:title"' + b' ' * 40 + b'content="Late close"' + b' ' * 40 + b'>'
+    assert extract_title(chunked(page, 32)) == 'Late close'
+
+
+def test_og_title_content_before_property():
+    assert extract_title([b"<meta content='Reversed' property='og:title'>"]) == 'Reversed'
+
+
+def test_og_title_outside_meta_is_ignored():
+    page = b'<script>var k = "og:title";</script><meta property="og:title" content="Real">'
+    assert extract_title(chunked(page, 10)) == 'Real'
+
+
+def test_stops_reading_after_max_bytes():
+    read = []
+
+    def chunks():
+        for _ in range(100):
+            read.append(1)
+            yield b'x' * 100
+        yield b'<title>Too late</title>'
+
+    assert extract_title(chunks(), max_bytes=1000) is None
+    assert len(read) == 10
+
+
+def test_title_truncated_to_max_bytes_is_not_found():
+    assert extract_title([b'<title>' + b'x' * 50, b'</title>'], max_bytes=40) is None
+
+
+def test_charset_from_header_meta_and_bom():
+    latin1 = '<title>Café</title>'.encode('latin-1')
+    assert extract_title([latin1], 'iso-8859-1') == 'Café'
+    assert extract_title([b'<meta charset="iso-8859-1">' + latin1]) == 'Café'
+    assert extract_title(['<title>Café</title>'.encode('utf-8')]) == 'Café'
+    assert detect_charset(b'\xef\xbb\xbf<html>') == 'utf-8-sig'
+
+
+def test_unknown_charset_falls_back_to_utf8():
+    assert extract_title(['<title>Café</title>'.encode('utf-8')], 'no-such-charset') == 'Café'
+
+
+def test_content_type_parsing():
+    assert parse_content_type('text/HTML; charset="UTF-8"') == ('text/html', 'UTF-8')
+    assert parse_content_type(None) == ('', None)
+    assert is_html('application/xhtml+xml')
+    assert is_html(None)
+    assert not is_html('image/png')
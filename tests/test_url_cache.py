@@ -0,0 +1,135 @@
+import pytest
+
+import url_cache
+from url_cache import TTLCache, normalize_url
+
+
+def test_scheme_and_host_lowercased():
+    assert normalize_url('HTTPS://Example.COM/Path') == 'https://example.com/Path'
+
+
+def test_default_port_dropped_other_port_kept():
+    assert normalize_url('http://example.com:80/a') == 'http://example.com/a'
+    assert normalize_url('https://example.com:443/a') == 'https://example.com/a'
+    assert normalize_url('http://example.com:8080/a') == 'http://example.com:8080/a'
+
+
+def test_fragment_dropped_and_empty_path_is_root():
+    assert normalize_url('https://example.com#top') == 'https://example.com/'
+
+
+def test_tracking_parameters_removed():
+    url = 'https://example.com/a?id=3&utm_source=x&UTM_Medium=y&fbclid=z'
+    assert normalize_url(url) == 'https://example.com/a?id=3'
+
+
+def test_other_parameters_keep_their_order():
+    assert normalize_url('https://example.com/?b=2&a=1&c=') == 'https://example.com/?b=2&a=1&c='
+
+
+def test_cosmetic_variants_share_a_key():
+    assert normalize_url(' https://Example.com:443/a?utm_campaign=x#frag ') == normalize_url('https://example.com/a')
+
+
+def test_youtube_share_parameters_only_dropped_on_youtube():
+    assert normalize_url('https://youtu.be/dQw4w9WgXcQ?si=abc') == 'https://youtu.be/dQw4w9WgXcQ'
+    assert normalize_url('https://example.com/?si=abc') == 'https://example.com/?si=abc'
+
+
+def test_invalid_port_returned_unchanged():
+    assert normalize_url('http://example.com:99999/') == 'http://example.com:99999/'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(url_cache.time, 'time', lambda: now[0])
+    monkeypatch.setattr(url_cache.atexit, 'register', lambda func: None)
+    return now
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache(ttl=60, negative_ttl=10)
+    cache.set('a', 'title')
+    cache.set('b', None)
+    clock[0] += 30
+    assert cache.get('a') == (True, 'title')
+    assert cache.get('b') == (False, None)
+    clock[0] += 31
+    assert cache.get('a') == (False, None)
+    stats = cache.get_stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (1, 2, 2, 0)
+
+
+def test_negative_entries_are_found_until_they_expire(clock):
+    cache = TTLCache(ttl=60, negative_ttl=10)
+    cache.set('gone', None)
+    assert cache.get('gone') == (True, None)
+    assert cache.get_stats()['negative_hits'] == 1
+    cache.set('custom', None, ttl=100)
+    clock[0] += 50
+    assert cache.get('custom') == (True, None)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = TTLCache(max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+    assert cache.get_stats()['evictions'] == 1
+
+
+def test_saved_entries_are_reloaded_without_expired_ones(clock, tmp_path):
+    path = str(tmp_path / 'urls.json')
+    cache = TTLCache(ttl=60, negative_ttl=10, persist_path=path)
+    cache.set('a', 'title')
+    cache.set('b', None)
+    cache.save()
+    clock[0] += 30
+    reloaded = TTLCache(ttl=60, persist_path=path)
+    assert reloaded.get('a') == (True, 'title')
+    assert reloaded.get('b') == (False, None)
+    assert list(reloaded.entries) == ['a']
+
+
+def test_load_keeps_the_newest_entries_up_to_max_entries(clock, tmp_path):
+    path = str(tmp_path / 'urls.json')
+    cache = TTLCache(persist_path=path)
+    for i in range(5):
+        cache.set(str(i), i)
+    cache.save()
+    reloaded = TTLCache(max_entries=2, persist_path=path)
+    assert list(reloaded.entries) == ['3', '4']
+
+
+def test_unreadable_file_is_ignored(clock, tmp_path):
+    path = tmp_path / 'urls.json'
+    path.write_text('{not json')
+    cache = TTLCache(persist_path=str(path))
+    assert cache.get_stats()['size'] == 0
+
+
+def test_set_saves_once_the_interval_has_passed(clock, tmp_path):
+    path = tmp_path / 'urls.json'
+    cache = TTLCache(persist_path=str(path), save_interval=300)
+    cache.set('a', 1)
+    assert not path.exists()
+    clock[0] += 301
+    cache.set('b', 2)
+    assert path.exists()
+    assert not cache.dirty
+
+
+def test_failed_save_is_retried(clock, tmp_path):
+    cache = TTLCache(persist_path=str(tmp_path / 'missing' / 'urls.json'))
+    cache.set('a', 1)
+    cache.save()
+    assert cache.dirty
+    (tmp_path / 'missing').mkdir()
+    cache.save()
+    assert not cache.dirty
+    assert TTLCache(persist_path=cache.persist_path).get('a') == (True, 1)
@@ -0,0 +1,60 @@
+import time
+import pytest
+from url_watcher import UNAVAILABLE_VIDEO, URLWatcher
+from youtube_batcher import LOOKUP_FAILED, YouTubeBatcher
+
+VIDEO_URL = 'https://youtu.be/dQw4w9WgXcQ'
+CACHE_KEY = 'youtube:dQw4w9WgXcQ'
+COLORS = {'irc_url': '', 'irc_youtube': '', 'web_url': '#2196f3', 'web_youtube': '#e91e63'}
+
+
+class Bot:
+    http = None
+
+    def __init__(self):
+        self.posted = []
+
+    def call_in_reactor(self, func, *args):
+        self.posted.append(args)
+
+
+@pytest.fixture
+def watcher(monkeypatch):
+    monkeypatch.delenv('URL_CACHE_PATH', raising=False)
+    watcher = URLWatcher(Bot())
+    yield watcher
+    watcher.shutdown()
+
+
+def finish_video(watcher, info):
+    deadline = time.monotonic() + 10
+    watcher._video_finished('#c', VIDEO_URL, CACHE_KEY, COLORS, 0, deadline, info)
+
+
+def test_failed_video_lookup_posts_placeholder_without_caching(watcher):
+    finish_video(watcher, LOOKUP_FAILED)
+    assert watcher.cache.get(CACHE_KEY) == (False, None)
+    assert watcher.bot.posted == [('#c', ('youtube', UNAVAILABLE_VIDEO), COLORS)]
+
+
+def test_missing_video_is_negative_cached(watcher):
+    finish_video(watcher, None)
+    assert watcher.cache.get(CACHE_KEY) == (True, None)
+    assert watcher.bot.posted == []
+
+
+def test_found_video_is_cached_and_posted(watcher):
+    info = dict(UNAVAILABLE_VIDEO, title='A video')
+    finish_video(watcher, info)
+    assert watcher.cache.get(CACHE_KEY) == (True, ('youtube', info))
+    assert watcher.bot.posted == [('#c', ('youtube', info), COLORS)]
+
+
+def test_shutdown_clears_pending_video_lookups(watcher):
+    watcher.youtube.shutdown()
+    watcher.youtube = YouTubeBatcher(None, lambda: 'key', window=60)
+    watcher.submit('#c', VIDEO_URL, COLORS)
+    assert ('#c', VIDEO_URL) in watcher.in_flight
+    watcher.shutdown()
+    assert watcher.in_flight == {}
+    assert watcher.cache.get(CACHE_KEY) == (False, None)
@@ -0,0 +1,129 @@
+import threading
+import time
+from worker_pool import WorkerPool
+
+
+def wait_for(jobs, timeout=5):
+    end = time.monotonic() + timeout
+    while any(job.status in ('queued', 'running') for job in jobs):
+        assert time.monotonic() < end, [job.status for job in jobs]
+        time.sleep(0.005)
+
+
+def test_jobs_with_one_key_run_in_order():
+    pool = WorkerPool('test', max_workers=4)
+    order = []
+    try:
+        jobs = [pool.submit(order.append, i, key='#c') for i in range(50)]
+        wait_for(jobs)
+    finally:
+        pool.shutdown()
+    assert order == list(range(50))
+    assert pool.get_stats()['completed'] == 50
+
+
+def test_one_key_does_not_hold_up_another():
+    pool = WorkerPool('test', max_workers=2)
+    release = threading.Event()
+    try:
+        slow = pool.submit(release.wait, 5, key='#slow')
+        fast = pool.submit(lambda: 'done', key='#fast')
+        wait_for([fast])
+        assert fast.result == 'done'
+        assert slow.status == 'running'
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_per_key_limit_caps_concurrency_per_key():
+    pool = WorkerPool('test', max_workers=6, per_key_limit=2)
+    lock = threading.Lock()
+    running = {}
+    peak = {}
+
+    def work(key):
+        with lock:
+            running[key] = running.get(key, 0) + 1
+            peak[key] = max(peak.get(key, 0), running[key])
+        time.sleep(0.02)
+        with lock:
+            running[key] -= 1
+
+    try:
+        jobs = [pool.submit(work, key, key=key) for _ in range(6) for key in ('#a', '#b')]
+        jobs.append(pool.submit(work, None))
+        wait_for(jobs)
+    finally:
+        pool.shutdown()
+    assert peak == {'#a': 2, '#b': 2, None: 1}
+    assert pool.get_stats()['completed'] == 13
+
+
+def test_full_queue_rejects():
+    pool = WorkerPool('test', max_workers=1, max_queue=2)
+    release = threading.Event()
+    try:
+        running = pool.submit(release.wait, 5)
+        while running.status != 'running':
+            time.sleep(0.005)
+        assert pool.submit(time.sleep, 0) is not None
+        assert pool.submit(time.sleep, 0) is not None
+        assert pool.submit(time.sleep, 0) is None
+        assert pool.get_stats()['rejected'] == 1
+    finally:
+        release.set()
+        pool.shutdown()
+
+
+def test_job_past_its_deadline_is_expired_not_run():
+    pool = WorkerPool('test', max_workers=1)
+    release = threading.Event()
+    ran = []
+    finished = []
+    try:
+        pool.submit(release.wait, 5)
+        late = pool.submit(ran.append, 1, timeout=0.05, callback=finished.append)
+        time.sleep(0.1)
+        release.set()
+        wait_for([late])
+    finally:
+        pool.shutdown()
+    assert late.status == 'expired'
+    assert ran == []
+    assert finished == [late]
+
+
+def test_errors_are_reported_to_the_callback():
+    pool = WorkerPool('test', max_workers=1)
+    finished = []
+    try:
+        job = pool.submit(lambda: 1 / 0, callback=finished.append)
+        wait_for([job])
+    finally:
+        pool.shutdown()
+    assert job.status == 'error'
+    assert isinstance(job.error, ZeroDivisionError)
+    assert finished == [job]
+
+
+def test_cancel_and_shutdown_skip_queued_jobs_but_call_back():
+    pool = WorkerPool('test', max_workers=1)
+    release = threading.Event()
+    ran = []
+    finished = []
+    running = pool.submit(release.wait, 5)
+    while running.status != 'running':
+        time.sleep(0.005)
+    first = pool.submit(ran.append, '#a', key='#a', callback=finished.append)
+    second = pool.submit(ran.append, '#b', key='#b', callback=finished.append)
+    assert pool.cancel(lambda job: job.key == '#a') == 1
+    pool.shutdown()
+    assert pool.submit(ran.append, 'late') is None
+    release.set()
+    wait_for([first, second])
+    for thread in pool.threads:
+        thread.join(5)
+    assert ran == []
+    assert (first.status, second.status) == ('cancelled', 'cancelled')
+    assert sorted(finished, key=id) == sorted([first, second], key=id)
@@ -0,0 +1,134 @@
+import threading
+from functools import partial
+import pytest
+from youtube_batcher import LOOKUP_FAILED, YouTubeBatcher, parse_video_id
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+
+@pytest.mark.parametrize('url', [
+    f'https://www.youtube.com/watch?v={VIDEO_ID}',
+    f'https://youtube.com/watch?feature=share&v={VIDEO_ID}&t=42',
+    f'https://m.youtube.com/watch?v={VIDEO_ID}',
+    f'https://music.youtube.com/watch?v={VIDEO_ID}&list=RD',
+    f'https://youtu.be/{VIDEO_ID}',
+    f'https://youtu.be/{VIDEO_ID}?si=abc&t=10',
+    f'https://www.youtube.com/shorts/{VIDEO_ID}',
+    f'https://www.youtube.com/embed/{VIDEO_ID}?autoplay=1',
+    f'https://www.youtube.com/live/{VIDEO_ID}',
+    f'https://www.youtube.com/v/{VIDEO_ID}',
+    f'https://www.youtube-nocookie.com/embed/{VIDEO_ID}',
+    f'HTTPS://WWW.YOUTUBE.COM/watch?v={VIDEO_ID}',
+])
+def test_video_links(url):
+    assert parse_video_id(url) == VIDEO_ID
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.youtube.com/',
+    'https://www.youtube.com/watch',
+    'https://www.youtube.com/channel/UCuAXFkgsw1L7xaCfnd5JJOw',
+    'https://www.youtube.com/playlist?list=PL0123456789',
+    'https://www.youtube.com/shorts/',
+    'https://youtu.be/',
+    'https://www.youtube.com/watch?v=short',
+    f'https://www.youtube.com/watch?v={VIDEO_ID}x',
+    f'https://notyoutube.com/watch?v={VIDEO_ID}',
+    f'https://example.com/embed/{VIDEO_ID}',
+    'http://[::1',
+])
+def test_non_video_links(url):
+    assert parse_video_id(url) is None
+
+
+class Response:
+    def __init__(self, status_code, items=(), text=''):
+        self.status_code = status_code
+        self.items = list(items)
+        self.text = text
+
+    def json(self):
+        return {'items': self.items}
+
+
+class Http:
+    def __init__(self, response):
+        self.response = response
+        self.calls = []
+
+    def get(self, url, timeout=None, params=None):
+        self.calls.append(params)
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+def resolve(batcher, *video_ids):
+    results = {}
+    done = threading.Event()
+
+    def callback(video_id, info):
+        results[video_id] = info
+        if len(results) == len(video_ids):
+            done.set()
+
+    for video_id in video_ids:
+        batcher.lookup(video_id, partial(callback, video_id))
+    assert done.wait(5)
+    return results
+
+
+def item(video_id):
+    return {'id': video_id, 'snippet': {'title': 'A video'}, 'contentDetails': {'duration': 'PT1M5S'},
+            'statistics': {'viewCount': '1500', 'likeCount': '7'}}
+
+
+def test_found_and_missing_videos_in_one_call():
+    http = Http(Response(200, [item(VIDEO_ID)]))
+    batcher = YouTubeBatcher(http, lambda: 'key', window=0.01)
+    try:
+        results = resolve(batcher, VIDEO_ID, 'aaaaaaaaaaa')
+    finally:
+        batcher.shutdown()
+    assert results[VIDEO_ID]['title'] == 'A video'
+    assert results[VIDEO_ID]['duration'] == '00:01:05'
+    assert results['aaaaaaaaaaa'] is None
+    assert len(http.calls) == 1
+    assert http.calls[0]['id'] == f'{VIDEO_ID},aaaaaaaaaaa'
+
+
+@pytest.mark.parametrize('http, api_key', [
+    (Http(Response(500)), 'key'),
+    (Http(Response(403, text='quotaExceeded')), 'key'),
+    (Http(TimeoutError('read timed out')), 'key'),
+    (Http(Response(200, [item(VIDEO_ID)])), ''),
+])
+def test_failed_lookups_are_not_reported_as_missing(http, api_key):
+    batcher = YouTubeBatcher(http, lambda: api_key, window=0.01)
+    try:
+        assert resolve(batcher, VIDEO_ID) == {VIDEO_ID: LOOKUP_FAILED}
+    finally:
+        batcher.shutdown()
+
+
+def test_quota_exhaustion_skips_later_calls():
+    http = Http(Response(403, text='quotaExceeded'))
+    batcher = YouTubeBatcher(http, lambda: 'key', window=0.01)
+    try:
+        resolve(batcher, VIDEO_ID)
+        assert resolve(batcher, 'aaaaaaaaaaa') == {'aaaaaaaaaaa': LOOKUP_FAILED}
+    finally:
+        batcher.shutdown()
+    assert len(http.calls) == 1
+    assert batcher.get_stats()['quota_exhausted']
+
+
+def test_shutdown_fails_pending_lookups():
+    http = Http(Response(200, [item(VIDEO_ID)]))
+    batcher = YouTubeBatcher(http, lambda: 'key', window=60)
+    results = []
+    batcher.lookup(VIDEO_ID, results.append)
+    batcher.shutdown()
+    assert results == [LOOKUP_FAILED]
+    assert not batcher.lookup(VIDEO_ID, results.append)
+    assert http.calls == []
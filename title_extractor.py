@@ -0,0 +1,121 @@
+import re
+import html
+import codecs
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_TITLE_BYTES = 256 * 1024  # Stop reading a page after this much body
+MAX_TITLE_LENGTH = 300  # Characters of title worth sending to IRC
+CHUNK_SIZE = 16384
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
+CONTENT_ATTR_RE = re.compile(rb'content\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))', re.I)
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([a-z0-9_.:-]+)', re.I)
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def parse_content_type(header):
+    """Split a Content-Type header into (mime type, charset or None)."""
+    if not header:
+        return '', None
+    mime, _, params = header.partition(';')
+    charset = None
+    for param in params.split(';'):
+        name, _, value = param.partition('=')
+        if name.strip().lower() == 'charset':
+            charset = value.strip().strip('"\'') or None
+    return mime.strip().lower(), charset
+
+
+def is_html(content_type_header):
+    """True if a Content-Type header names an HTML document (or is missing)."""
+    mime, _ = parse_content_type(content_type_header)
+    return not mime or mime in HTML_CONTENT_TYPES
+
+
+def detect_charset(prefix, header_charset=None):
+    """Pick a charset from the header, a BOM or a <meta> in the bytes read so far."""
+    if header_charset:
+        return header_charset
+    if prefix.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    match = META_CHARSET_RE.search(prefix)
+    if match:
+        return match.group(1).decode('ascii')
+    return 'utf-8'
+
+
+def _decode(raw, charset):
+    try:
+        text = raw.decode(charset, errors='replace')
+    except LookupError:
+        text = raw.decode('utf-8', errors='replace')
+    text = WHITESPACE_RE.sub(' ', html.unescape(text)).strip()
+    return text[:MAX_TITLE_LENGTH] or None
+
+
+def _find_title(buf, lower, start):
+    """Return the raw <title> contents if a closing tag appears after `start`."""
+    end = lower.find(b'</title', start)
+    if end == -1:
+        return None
+    open_tag = lower.rfind(b'<title', 0, end)
+    if open_tag == -1:
+        return None
+    gt = lower.find(b'>', open_tag, end)
+    if gt == -1:
+        return None
+    return bytes(buf[gt + 1:end])
+
+
+def _find_og_title(buf, lower, start):
+    """Look for a complete og:title meta tag after `start`.
+
+    Returns (raw content or None, offset to resume from once more data
+    arrives): an og:title whose tag has not closed yet is scanned again
+    from its own offset, however far the next chunk carries the tag.
+    """
+    pos = lower.find(b'og:title', start)
+    while pos != -1:
+        tag_start = lower.rfind(b'<meta', 0, pos)
+        tag_end = lower.find(b'>', pos)
+        if tag_end == -1:
+            return None, pos
+        if tag_start != -1 and lower.find(b'>', tag_start, pos) == -1:
+            match = CONTENT_ATTR_RE.search(buf, tag_start, tag_end)
+            if match:
+                return next(group for group in match.groups() if group is not None), pos
+        pos = lower.find(b'og:title', pos + 8)
+    # "og:title" may be split across chunks
+    return None, max(len(lower) - len(b'og:title') + 1, start)
+
+
+def extract_title(chunks, header_charset=None, max_bytes=MAX_TITLE_BYTES):
+    """Read HTML body chunks until a title is found and return it.
+
+    Stops at the first </title> or complete og:title meta tag, or after
+    `max_bytes`, so only a prefix of a large document is ever read or held.
+    """
+    buf = bytearray()
+    lower = bytearray()
+    og_start = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        # Re-scan a little of the previous data so a "</title" split across chunks is found
+        start = max(len(buf) - 16, 0)
+        chunk = chunk[:max_bytes - len(buf)]
+        buf += chunk
+        lower += chunk.lower()
+        raw = _find_title(buf, lower, start)
+        if raw is None:
+            raw, og_start = _find_og_title(buf, lower, og_start)
+        if raw is not None:
+            return _decode(raw, detect_charset(bytes(buf[:4096]), header_charset))
+        if len(buf) >= max_bytes:
+            logger.debug(f"No title in the first {max_bytes} bytes")
+            break
+    return None
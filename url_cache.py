@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import atexit
+import threading
+import logging
+import urllib.parse
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that only track where a link was shared from
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'igshid', 'mc_cid', 'mc_eid',
+    'ref_src', 'ref_url', '_hsenc', '_hsmi', 'yclid'
+}
+# Share-link parameters that only mean "tracking" on YouTube
+YOUTUBE_TRACKING_PARAMS = {'si', 'feature', 'pp'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """Return a cache key for `url` that ignores cosmetic differences.
+
+    Scheme and host are lowercased, default ports and fragments dropped and
+    tracking parameters (utm_*, fbclid, ...) removed.
+    """
+    try:
+        parts = urllib.parse.urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').lower()
+        port = parts.port
+    except ValueError:
+        return url
+    netloc = host
+    if port and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+    dropped = TRACKING_PARAMS
+    if host.endswith(('youtube.com', 'youtu.be')):
+        dropped = TRACKING_PARAMS | YOUTUBE_TRACKING_PARAMS
+    query = [
+        (key, value)
+        for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in dropped
+    ]
+    return urllib.parse.urlunsplit((
+        scheme,
+        netloc,
+        parts.path or '/',
+        urllib.parse.urlencode(query),
+        ''
+    ))
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after a time-to-live.
+
+    A value of None is a negative entry (the lookup failed or found
+    nothing) and is kept for the shorter `negative_ttl`. Expiry uses wall
+    clock time so entries can be saved to `persist_path` and reloaded.
+    """
+
+    def __init__(self, max_entries=5000, ttl=6 * 3600, negative_ttl=300, persist_path=None, save_interval=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.persist_path = persist_path
+        self.save_interval = save_interval
+        self.entries = OrderedDict()  # {key: (expires_at, value)}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.dirty = False
+        self.last_save = time.time()
+        if persist_path:
+            self.load()
+            atexit.register(self.save)
+
+    def get(self, key):
+        """Return (found, value); value is None for a cached negative result."""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            if entry[0] <= now:
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(key)
+            if entry[1] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl if value is not None else self.negative_ttl
+        with self.lock:
+            self.entries[key] = (time.time() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.dirty = True
+        if self.persist_path and time.time() - self.last_save > self.save_interval:
+            self.save()
+
+    def load(self):
+        """Read unexpired entries from persist_path."""
+        try:
+            with open(self.persist_path, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load URL cache from {self.persist_path}: {e}")
+            return
+        now = time.time()
+        with self.lock:
+            for key, expires_at, value in data[-self.max_entries:]:
+                if expires_at > now:
+                    self.entries[key] = (expires_at, value)
+        logger.info(f"Loaded {len(self.entries)} URL cache entries from {self.persist_path}")
+
+    def save(self):
+        """Write the cache to persist_path, replacing the file atomically."""
+        if not self.persist_path:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            data = [[key, expires_at, value] for key, (expires_at, value) in self.entries.items()]
+            self.dirty = False
+            self.last_save = time.time()
+        tmp_path = f"{self.persist_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            logger.warning(f"Could not save URL cache to {self.persist_path}: {e}")
+            with self.lock:
+                self.dirty = True  # Try again on the next save
+
+    def get_stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'size': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'persistent': bool(self.persist_path)
+        }
@@ -1,13 +1,27 @@
+import os
 import re
-import requests
+import time
+import threading
 import urllib.parse
-from bs4 import BeautifulSoup
-from extensions import socketio, db, app
+from functools import partial
+import requests
+from extensions import db, app
 from models import URLWatcherSettings
+from worker_pool import WorkerPool
+from url_cache import TTLCache, normalize_url
+from youtube_batcher import LOOKUP_FAILED, YouTubeBatcher, parse_video_id
+from title_extractor import CHUNK_SIZE, extract_title, is_html, parse_content_type
 import logging
 
 logger = logging.getLogger(__name__)
 
+URL_WORKERS = 8  # Concurrent URL fetches across all domains
+URL_PER_DOMAIN = 2  # Concurrent URL fetches against one domain
+URL_MAX_QUEUE = 50  # URLs allowed to wait for a worker
+URL_FETCH_DEADLINE = 10  # Seconds from paste to posted title, including queueing
+# Posted (and not cached) when the YouTube API could not be asked about a video
+UNAVAILABLE_VIDEO = {'title': 'N/A', 'duration': 'N/A', 'view_count': 'N/A', 'likes': 'N/A', 'dislikes': 'N/A'}
+
 IRC_COLORS = {
     'red': '\x0304',
     'blue': '\x0302',
@@ -15,9 +29,30 @@ IRC_COLORS = {
     'reset': '\x0f',
 }
 
+# Convert IRC colors to hex for webchat
+IRC_TO_HEX = {
+    '00': '#FFFFFF', '01': '#000000', '02': '#00007F', '03': '#009300',
+    '04': '#FF0000', '05': '#7F0000', '06': '#9C009C', '07': '#FC7F00',
+    '08': '#FFFF00', '09': '#00FC00', '10': '#009393', '11': '#00FFFF',
+    '12': '#0000FC', '13': '#FF00FF', '14': '#7F7F7F', '15': '#D2D2D2'
+}
+
 class URLWatcher:
     def __init__(self, bot):
         self.bot = bot
+        # Fetches run on a pool keyed by domain: the worker count is the
+        # global cap and per_key_limit the per-domain cap.
+        self.pool = WorkerPool('url', max_workers=URL_WORKERS, max_queue=URL_MAX_QUEUE, per_key_limit=URL_PER_DOMAIN)
+        self.lock = threading.Lock()
+        self.in_flight = {}  # {(channel, url): Job, or video ID for batched YouTube lookups}
+        self.generations = {}  # {channel: int}, bumped to cancel a channel's fetches
+        self.deduplicated = 0
+        self.stale = 0
+        # Titles and video info by normalized URL; failures are cached briefly.
+        # Set URL_CACHE_PATH to keep the cache across restarts.
+        self.cache = TTLCache(persist_path=os.getenv('URL_CACHE_PATH'))
+        # Video links skip the pool and are resolved in batched API calls
+        self.youtube = YouTubeBatcher(bot.http, self._get_youtube_api_key)
 
     def get_settings(self):
         with app.app_context():
@@ -28,119 +63,174 @@ class URLWatcher:
                 db.session.commit()
             return settings
 
-    def _get_title(self, url):
+    @staticmethod
+    def _remaining(deadline):
+        """Seconds left before `deadline`, capped at the usual 5 second timeout."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("URL fetch deadline exceeded")
+        return min(5, remaining)
+
+    def _read_chunks(self, response, deadline):
+        # A slow server can keep each read under the timeout, so check the
+        # overall deadline between chunks as well
+        for chunk in response.iter_content(CHUNK_SIZE):
+            yield chunk
+            self._remaining(deadline)
+
+    def _get_title(self, url, deadline):
         try:
-            response = requests.get(url, timeout=(5, 5))
-            soup = BeautifulSoup(response.text, 'html.parser')
-            title_tag = soup.find('title')
-            if title_tag:
-                return title_tag.get_text().strip()
+            timeout = self._remaining(deadline)
+            with self.bot.http.get(url, timeout=(timeout, timeout), stream=True) as response:
+                content_type = response.headers.get('Content-Type')
+                if not is_html(content_type):
+                    logger.debug(f"Skipping {url} with content type {content_type}")
+                    return None
+                _, charset = parse_content_type(content_type)
+                return extract_title(self._read_chunks(response, deadline), charset)
+        except (TimeoutError, requests.exceptions.Timeout):
+            raise  # Transient: the caller must not cache it as "no title"
         except Exception as e:
             logger.warning(f"Error fetching URL {url}: {e}")
         return None
 
-    def _get_youtube_video_info(self, url):
-        video_info = {'title': 'N/A', 'duration': 'N/A', 'view_count': 'N/A', 'likes': 'N/A', 'dislikes': 'N/A'}
-        try:
-            parsed_url = urllib.parse.urlparse(url)
-            query = urllib.parse.parse_qs(parsed_url.query)
-            if 'v' in query:
-                video_id = query['v'][0]
-                with app.app_context():
-                    api_key = self.get_settings().youtube_api_key or ''
-                api_url = f'https://www.googleapis.com/youtube/v3/videos?part=snippet,contentDetails,statistics&id={video_id}&key={api_key}'
-                response = requests.get(api_url, timeout=(5, 5))
-                if response.status_code == 200:
-                    data = response.json()
-                    items = data.get('items')
-                    if items:
-                        video_item = items[0]
-                        statistics = video_item.get('statistics', {})
-                        snippet = video_item.get('snippet', {})
-                        content_details = video_item.get('contentDetails', {})
-                        
-                        # Format duration (PT1H2M3S -> 01:02:03)
-                        duration = content_details.get('duration', 'PT0S')
-                        duration = duration.replace('PT', '')
-                        hours = '00'
-                        minutes = '00'
-                        seconds = '00'
-                        if 'H' in duration:
-                            hours, duration = duration.split('H')
-                            hours = hours.zfill(2)
-                        if 'M' in duration:
-                            minutes, duration = duration.split('M')
-                            minutes = minutes.zfill(2)
-                        if 'S' in duration:
-                            seconds = duration.replace('S', '').zfill(2)
-                        formatted_duration = f"{hours}:{minutes}:{seconds}"
-                        
-                        # Format view count
-                        view_count = statistics.get('viewCount', '0')
-                        if view_count.isdigit():
-                            view_count = int(view_count)
-                            if view_count >= 1000000:
-                                view_count = f"{view_count/1000000:.1f}M"
-                            elif view_count >= 1000:
-                                view_count = f"{view_count/1000:.1f}K"
-                        
-                        video_info['title'] = snippet.get('title', 'N/A')
-                        video_info['duration'] = formatted_duration
-                        video_info['view_count'] = view_count
-                        video_info['likes'] = statistics.get('likeCount', 'N/A')
-                        video_info['dislikes'] = statistics.get('dislikeCount', 'N/A')
-        except Exception as e:
-            logger.warning(f"Error fetching YouTube info for {url}: {e}")
-        return video_info
+    def _get_youtube_api_key(self):
+        with app.app_context():
+            return self.get_settings().youtube_api_key or ''
 
     def handle_message(self, channel, nick, message):
+        """Queue title lookups for every URL in a message."""
         urls = re.findall(r'(https?://\S+)', message)
         if not urls:
             return
         with app.app_context():
             settings = self.get_settings()
-            for url in urls:
-                parsed_url = urllib.parse.urlparse(url)
-                domain = parsed_url.netloc
+            colors = {
                 # IRC color codes
-                irc_url_color = f'\x03{settings.url_color}' if settings.url_color else ''
-                irc_youtube_color = f'\x03{settings.youtube_color}' if settings.youtube_color else ''
-                irc_bold = '\x02'
-                irc_reset = '\x0f'
-                # Convert IRC colors to hex for webchat
-                irc_to_hex = {
-                    '00': '#FFFFFF', '01': '#000000', '02': '#00007F', '03': '#009300',
-                    '04': '#FF0000', '05': '#7F0000', '06': '#9C009C', '07': '#FC7F00',
-                    '08': '#FFFF00', '09': '#00FC00', '10': '#009393', '11': '#00FFFF',
-                    '12': '#0000FC', '13': '#FF00FF', '14': '#7F7F7F', '15': '#D2D2D2'
-                }
-                web_url_color = irc_to_hex.get(settings.url_color, '#2196f3')
-                web_youtube_color = irc_to_hex.get(settings.youtube_color, '#e91e63')
-                # --- YouTube ---
-                if 'youtube.com' in domain or 'youtu.be' in domain:
-                    video_info = self._get_youtube_video_info(url)
-                    # IRC formatted message
-                    irc_output = f"{irc_youtube_color}{irc_bold}{video_info['title']}{irc_reset} {irc_bold}::{irc_reset} {irc_bold}{video_info['duration']}{irc_reset} {irc_bold}::{irc_reset} {irc_bold}{video_info['view_count']}{irc_reset} {irc_bold}::{irc_reset} {irc_bold}+{video_info['likes']} -{video_info['dislikes']}{irc_reset}"
-                    # Send to IRC
-                    self.bot.connection.privmsg(channel, irc_output)
-                    # Send to webchat with HTML formatting
-                    socketio.emit('webchat_message', {
-                        'nick': self.bot.nick,
-                        'message': f"<span style='color:{web_youtube_color};font-weight:bold'>{video_info['title']}</span> <b>::</b> <b>{video_info['duration']}</b> <b>::</b> <b>{video_info['view_count']}</b> <b>::</b> <b>+{video_info['likes']} -{video_info['dislikes']}</b>",
-                        'timestamp': self.bot.now_str(),
-                        'channel': channel
-                    }, room=channel)
-                else:
-                    title = self._get_title(url)
-                    if title:
-                        # IRC formatted message
-                        irc_output = f"{irc_url_color}{irc_bold}{title}{irc_reset}"
-                        # Send to IRC
-                        self.bot.connection.privmsg(channel, irc_output)
-                        # Send to webchat with HTML formatting
-                        socketio.emit('webchat_message', {
-                            'nick': self.bot.nick,
-                            'message': f"<span style='color:{web_url_color};font-weight:bold'>{title}</span>",
-                            'timestamp': self.bot.now_str(),
-                            'channel': channel
-                        }, room=channel) 
\ No newline at end of file
+                'irc_url': f'\x03{settings.url_color}' if settings.url_color else '',
+                'irc_youtube': f'\x03{settings.youtube_color}' if settings.youtube_color else '',
+                'web_url': IRC_TO_HEX.get(settings.url_color, '#2196f3'),
+                'web_youtube': IRC_TO_HEX.get(settings.youtube_color, '#e91e63')
+            }
+        for url in dict.fromkeys(urls):
+            self.submit(channel, url, colors)
+
+    def submit(self, channel, url, colors):
+        """Queue a single URL lookup whose result will be posted to `channel`."""
+        video_id = parse_video_id(url)
+        # Videos are cached by ID so every link form for one video shares an entry
+        cache_key = f"youtube:{video_id}" if video_id else normalize_url(url)
+        found, cached = self.cache.get(cache_key)
+        if found:
+            if cached:
+                self.bot.call_in_reactor(self._post, channel, cached, colors)
+            return
+        domain = urllib.parse.urlparse(url).netloc.lower()
+        deadline = time.monotonic() + URL_FETCH_DEADLINE
+        with self.lock:
+            if (channel, url) in self.in_flight:
+                # Already being resolved for this channel, e.g. a repeat paste
+                self.deduplicated += 1
+                return
+            generation = self.generations.get(channel, 0)
+            if video_id:
+                callback = partial(self._video_finished, channel, url, cache_key, colors, generation, deadline)
+                if self.youtube.lookup(video_id, callback):
+                    self.in_flight[(channel, url)] = video_id
+                return
+            callback = partial(self._finished, channel, url, colors, generation, deadline)
+            job = self.pool.submit(self._resolve, url, cache_key, deadline, key=domain,
+                                   callback=callback, timeout=URL_FETCH_DEADLINE)
+            if job is None:
+                logger.warning(f"URL queue full, skipping {url} in {channel}")
+                return
+            self.in_flight[(channel, url)] = job
+
+    def _resolve(self, url, cache_key, deadline):
+        """Fetch the page title for a URL (runs on a worker thread)."""
+        try:
+            title = self._get_title(url, deadline)
+        except (TimeoutError, requests.exceptions.Timeout) as e:
+            # One slow response should not hide a working URL's title for the negative TTL
+            logger.warning(f"Timed out fetching URL {url}: {e}")
+            return None
+        result = ('title', title) if title else None
+        self.cache.set(cache_key, result)
+        return result
+
+    def _finished(self, channel, url, colors, generation, deadline, job):
+        result = job.result if job.status == 'done' else None
+        self._deliver(channel, url, colors, generation, deadline, result)
+
+    def _video_finished(self, channel, url, cache_key, colors, generation, deadline, video_info):
+        """Handle a batched video lookup (runs on the YouTube batcher thread)."""
+        if video_info is LOOKUP_FAILED:
+            # The API was unreachable or out of quota, which says nothing about the video
+            result = ('youtube', UNAVAILABLE_VIDEO)
+        else:
+            result = ('youtube', video_info) if video_info else None
+            self.cache.set(cache_key, result)
+        self._deliver(channel, url, colors, generation, deadline, result)
+
+    def _deliver(self, channel, url, colors, generation, deadline, result):
+        with self.lock:
+            self.in_flight.pop((channel, url), None)
+            current = self.generations.get(channel, 0)
+        if not result:
+            return
+        if generation != current or time.monotonic() > deadline:
+            # The channel was left or the answer arrived too late to be useful
+            self.stale += 1
+            return
+        self.bot.call_in_reactor(self._post, channel, result, colors)
+
+    def _post(self, channel, result, colors):
+        """Send a resolved URL to IRC and webchat (runs on the reactor)."""
+        if not self.bot.connection or not self.bot.connection.is_connected():
+            return
+        irc_bold = '\x02'
+        irc_reset = '\x0f'
+        kind, info = result
+        # --- YouTube ---
+        if kind == 'youtube':
+            video_info = info
+            # IRC formatted message
+            irc_output = f"{colors['irc_youtube']}{irc_bold}{video_info['title']}{irc_reset} {irc_bold}::{irc_reset} {irc_bold}{video_info['duration']}{irc_reset} {irc_bold}::{irc_reset} {irc_bold}{video_info['view_count']}{irc_reset} {irc_bold}::{irc_reset} {irc_bold}+{video_info['likes']} -{video_info['dislikes']}{irc_reset}"
+            web_output = f"<span style='color:{colors['web_youtube']};font-weight:bold'>{video_info['title']}</span> <b>::</b> <b>{video_info['duration']}</b> <b>::</b> <b>{video_info['view_count']}</b> <b>::</b> <b>+{video_info['likes']} -{video_info['dislikes']}</b>"
+        else:
+            title = info
+            # IRC formatted message
+            irc_output = f"{colors['irc_url']}{irc_bold}{title}{irc_reset}"
+            web_output = f"<span style='color:{colors['web_url']};font-weight:bold'>{title}</span>"
+        # Send to IRC behind interactive traffic
+        with self.bot.send_queue.lane('bulk'):
+            self.bot.connection.privmsg(channel, irc_output)
+        # Send to webchat with HTML formatting
+        self.bot.emitter.emit('webchat_message', {
+            'nick': self.bot.nick,
+            'message': web_output,
+            'timestamp': self.bot.now_str(),
+            'channel': channel
+        }, room=channel)
+
+    def cancel_channel(self, channel):
+        """Drop pending lookups for a channel the bot is no longer in."""
+        with self.lock:
+            self.generations[channel] = self.generations.get(channel, 0) + 1
+            jobs = {job for (chan, _), job in self.in_flight.items() if chan == channel}
+        cancelled = self.pool.cancel(lambda job: job in jobs)
+        if cancelled:
+            logger.info(f"Cancelled {cancelled} pending URL lookups for {channel}")
+
+    def shutdown(self):
+        self.pool.shutdown()
+        self.youtube.shutdown()
+        self.cache.save()
+
+    def get_stats(self):
+        stats = self.pool.get_stats()
+        stats['deduplicated'] = self.deduplicated
+        stats['stale'] = self.stale
+        stats['cache'] = self.cache.get_stats()
+        stats['youtube'] = self.youtube.get_stats()
+        return stats
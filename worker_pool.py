@@ -0,0 +1,227 @@
+import time
+import threading
+import logging
+import traceback
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Timing:
+    """Running count/average/max of a duration, in milliseconds."""
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 2) if self.count else 0.0,
+            'max_ms': round(self.max, 2)
+        }
+
+
+class Job:
+    """A unit of work submitted to a WorkerPool."""
+    __slots__ = ('func', 'args', 'kwargs', 'key', 'callback', 'submitted', 'deadline',
+                 'started', 'finished', 'status', 'result', 'error')
+
+    def __init__(self, func, args, kwargs, key, callback, deadline):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.callback = callback
+        self.submitted = time.monotonic()
+        self.deadline = deadline
+        self.started = None
+        self.finished = None
+        self.status = 'queued'  # queued, running, done, error, expired, cancelled
+        self.result = None
+        self.error = None
+
+    def cancel(self):
+        """Cancel the job if it has not started yet."""
+        if self.status == 'queued':
+            self.status = 'cancelled'
+            return True
+        return False
+
+    @property
+    def queue_wait(self):
+        return (self.started or time.monotonic()) - self.submitted
+
+
+class WorkerPool:
+    """Bounded thread pool with per-key FIFO ordering.
+
+    Jobs that share a key run in submission order, with at most
+    `per_key_limit` of them running at once. Jobs without a key are
+    unordered. Submissions beyond `max_queue` waiting jobs are rejected
+    instead of piling up, and a job that is still queued past its deadline
+    is dropped rather than run late. `callback(job)` is called from the
+    worker thread once a job finishes, fails, expires or is cancelled.
+    """
+
+    def __init__(self, name, max_workers=4, max_queue=100, per_key_limit=1):
+        self.name = name
+        self.max_queue = max_queue
+        self.per_key_limit = per_key_limit
+        self.cond = threading.Condition()
+        self.queues = {}  # {key: deque of Job}
+        self.active = {}  # {key: jobs running or granted a worker}
+        self.ready = deque()  # keys granted a worker, one entry per grant
+        self.pending = 0
+        self.running = set()
+        self.closed = False
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.cancelled = 0
+        self.queue_wait = Timing()
+        self.run_time = Timing()
+        self.threads = []
+        for i in range(max_workers):
+            thread = threading.Thread(target=self._worker, name=f"{name}-worker-{i}")
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, func, *args, key=None, callback=None, timeout=None, **kwargs):
+        """Queue func(*args, **kwargs); return the Job, or None if the queue is full."""
+        deadline = time.monotonic() + timeout if timeout else None
+        job = Job(func, args, kwargs, key if key is not None else object(), callback, deadline)
+        with self.cond:
+            if self.closed or self.pending >= self.max_queue:
+                self.rejected += 1
+                return None
+            self.queues.setdefault(job.key, deque()).append(job)
+            self.pending += 1
+            self.submitted += 1
+            self._grant(job.key)
+        return job
+
+    def _grant(self, key):
+        """Hand a worker slot to `key` if it has queued jobs and spare concurrency."""
+        if self.queues.get(key) and self.active.get(key, 0) < self.per_key_limit:
+            self.active[key] = self.active.get(key, 0) + 1
+            self.ready.append(key)
+            self.cond.notify()
+
+    def _release(self, key):
+        self.active[key] -= 1
+        if not self.active[key]:
+            del self.active[key]
+        if key in self.queues and not self.queues[key]:
+            del self.queues[key]
+        self._grant(key)
+
+    def _worker(self):
+        while True:
+            with self.cond:
+                while not self.ready and not self.closed:
+                    self.cond.wait()
+                if self.closed and not self.ready:
+                    return
+                key = self.ready.popleft()
+                job = self.queues[key].popleft()
+                self.pending -= 1
+                if job.status == 'queued':
+                    job.status = 'running'
+                    job.started = time.monotonic()
+                    self.running.add(job)
+            if job.status == 'running':
+                self._run(job)
+            with self.cond:
+                self._record(job)
+                self.running.discard(job)
+                self._release(key)
+            if job.callback:
+                try:
+                    job.callback(job)
+                except Exception as e:
+                    logger.error(f"[{self.name}] Error in job callback: {e}\n{traceback.format_exc()}")
+
+    def _run(self, job):
+        if job.deadline is not None and job.started > job.deadline:
+            job.status = 'expired'
+            logger.warning(f"[{self.name}] Job for {job.key!r} expired after waiting {job.queue_wait:.2f}s")
+            return
+        try:
+            job.result = job.func(*job.args, **job.kwargs)
+            job.status = 'done'
+        except Exception as e:
+            job.error = e
+            job.status = 'error'
+            logger.error(f"[{self.name}] Job failed: {e}\n{traceback.format_exc()}")
+        finally:
+            job.finished = time.monotonic()
+
+    def _record(self, job):
+        """Update counters for a job that left the queue (called with the lock held)."""
+        if job.started is not None:
+            self.queue_wait.add(job.started - job.submitted)
+        if job.finished is not None:
+            self.run_time.add(job.finished - job.started)
+        if job.status == 'done':
+            self.completed += 1
+        elif job.status == 'error':
+            self.failed += 1
+        elif job.status == 'expired':
+            self.expired += 1
+        elif job.status == 'cancelled':
+            self.cancelled += 1
+
+    def running_jobs(self):
+        """Snapshot of the jobs currently running."""
+        with self.cond:
+            return list(self.running)
+
+    def cancel(self, predicate):
+        """Cancel every queued job for which predicate(job) is true."""
+        count = 0
+        with self.cond:
+            for queue in self.queues.values():
+                for job in queue:
+                    if job.status == 'queued' and predicate(job) and job.cancel():
+                        count += 1
+        return count
+
+    def shutdown(self):
+        """Cancel queued jobs and let the workers exit."""
+        with self.cond:
+            self.closed = True
+            for queue in self.queues.values():
+                for job in queue:
+                    job.cancel()
+            self.cond.notify_all()
+
+    def get_stats(self):
+        with self.cond:
+            pending = self.pending
+            running = len(self.running)
+        return {
+            'workers': len(self.threads),
+            'pending': pending,
+            'running': running,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'cancelled': self.cancelled,
+            'queue_wait': self.queue_wait.to_dict(),
+            'run_time': self.run_time.to_dict()
+        }
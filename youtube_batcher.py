@@ -0,0 +1,244 @@
+import re
+import time
+import threading
+import logging
+import traceback
+import urllib.parse
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+try:
+    from zoneinfo import ZoneInfo
+    QUOTA_TZ = ZoneInfo('America/Los_Angeles')  # YouTube quota resets at midnight Pacific
+except Exception:
+    QUOTA_TZ = timezone.utc
+
+API_URL = 'https://www.googleapis.com/youtube/v3/videos'
+API_PARTS = 'snippet,contentDetails,statistics'
+API_FIELDS = 'items(id,snippet/title,contentDetails/duration,statistics(viewCount,likeCount,dislikeCount))'
+MAX_IDS_PER_CALL = 50  # videos.list limit
+VIDEOS_LIST_COST = 1  # Quota units per videos.list call, whatever the number of IDs
+BATCH_WINDOW = 0.25  # Seconds to gather IDs before calling the API
+
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+YOUTUBE_HOSTS = ('youtube.com', 'youtube-nocookie.com')
+# Path prefixes followed by the video ID, e.g. /shorts/<id>
+PATH_PREFIXES = ('shorts', 'embed', 'live', 'v', 'e')
+# Passed to callbacks when the lookup itself failed (API error, timeout, quota,
+# no key), as opposed to None for a video the API says does not exist
+LOOKUP_FAILED = object()
+
+
+def parse_video_id(url):
+    """Return the YouTube video ID in `url`, or None if it is not a video link.
+
+    Understands watch?v=, youtu.be/<id>, /shorts/, /embed/, /live/ and /v/
+    links on www., m., music. and youtube-nocookie.com hosts.
+    """
+    try:
+        parts = urllib.parse.urlsplit(url)
+        host = (parts.hostname or '').lower()
+    except ValueError:
+        return None
+    segments = [segment for segment in parts.path.split('/') if segment]
+    video_id = None
+    if host == 'youtu.be' or host.endswith('.youtu.be'):
+        video_id = segments[0] if segments else None
+    elif host in YOUTUBE_HOSTS or host.endswith(tuple('.' + h for h in YOUTUBE_HOSTS)):
+        if segments[:1] == ['watch']:
+            video_id = urllib.parse.parse_qs(parts.query).get('v', [None])[0]
+        elif len(segments) >= 2 and segments[0] in PATH_PREFIXES:
+            video_id = segments[1]
+    if video_id and VIDEO_ID_RE.match(video_id):
+        return video_id
+    return None
+
+
+def format_video_info(item):
+    """Turn a videos.list item into the fields shown in channels."""
+    statistics = item.get('statistics', {})
+    snippet = item.get('snippet', {})
+    content_details = item.get('contentDetails', {})
+
+    # Format duration (PT1H2M3S -> 01:02:03)
+    duration = content_details.get('duration', 'PT0S')
+    duration = duration.replace('PT', '')
+    hours = '00'
+    minutes = '00'
+    seconds = '00'
+    if 'H' in duration:
+        hours, duration = duration.split('H')
+        hours = hours.zfill(2)
+    if 'M' in duration:
+        minutes, duration = duration.split('M')
+        minutes = minutes.zfill(2)
+    if 'S' in duration:
+        seconds = duration.replace('S', '').zfill(2)
+    formatted_duration = f"{hours}:{minutes}:{seconds}"
+
+    # Format view count
+    view_count = statistics.get('viewCount', '0')
+    if view_count.isdigit():
+        view_count = int(view_count)
+        if view_count >= 1000000:
+            view_count = f"{view_count/1000000:.1f}M"
+        elif view_count >= 1000:
+            view_count = f"{view_count/1000:.1f}K"
+
+    return {
+        'title': snippet.get('title', 'N/A'),
+        'duration': formatted_duration,
+        'view_count': view_count,
+        'likes': statistics.get('likeCount', 'N/A'),
+        'dislikes': statistics.get('dislikeCount', 'N/A')
+    }
+
+
+def quota_day():
+    return datetime.now(QUOTA_TZ).strftime('%Y-%m-%d')
+
+
+class YouTubeBatcher:
+    """Resolves video IDs through batched videos.list calls.
+
+    IDs requested within `window` seconds of each other, from any message
+    or channel, are looked up together in one call of up to 50 IDs.
+    `callback(info)` runs on the batcher thread with the formatted video
+    info, None if the video was not found (or is private), or LOOKUP_FAILED
+    if the call failed and nothing is known about the video.
+    """
+
+    def __init__(self, http, get_api_key, window=BATCH_WINDOW, timeout=5):
+        self.http = http
+        self.get_api_key = get_api_key
+        self.window = window
+        self.timeout = timeout
+        self.cond = threading.Condition()
+        self.pending = {}  # {video_id: [callback, ...]}, in request order
+        self.first_pending = None
+        self.closed = False
+        self.ids_requested = 0
+        self.ids_resolved = 0
+        self.ids_sent = 0
+        self.api_calls = 0
+        self.api_errors = 0
+        self.quota_day = quota_day()
+        self.quota_used = 0
+        self.quota_exhausted = False
+        self.thread = threading.Thread(target=self._run, name='youtube-batcher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def lookup(self, video_id, callback):
+        """Queue a video ID; callback(info, None or LOOKUP_FAILED) is called once it resolves."""
+        with self.cond:
+            if self.closed:
+                return False
+            if not self.pending:
+                self.first_pending = time.monotonic()
+            self.pending.setdefault(video_id, []).append(callback)
+            self.ids_requested += 1
+            self.cond.notify()
+        return True
+
+    def _next_batch(self):
+        """Wait for the batch window to close, then take up to 50 IDs."""
+        with self.cond:
+            while not self.closed:
+                if self.pending:
+                    wait = self.first_pending + self.window - time.monotonic()
+                    if wait <= 0 or len(self.pending) >= MAX_IDS_PER_CALL:
+                        break
+                    self.cond.wait(wait)
+                else:
+                    self.cond.wait()
+            if self.closed:
+                return None
+            batch = {}
+            for video_id in list(self.pending)[:MAX_IDS_PER_CALL]:
+                batch[video_id] = self.pending.pop(video_id)
+            self.first_pending = time.monotonic() if self.pending else None
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                found = self._fetch(list(batch))
+            except Exception as e:
+                self.api_errors += 1
+                logger.warning(f"Error fetching YouTube info for {len(batch)} videos: {e}")
+                found = None
+            if found is None:
+                self._fail(batch)
+                continue
+            self.ids_resolved += len(found)
+            for video_id, callbacks in batch.items():
+                for callback in callbacks:
+                    self._call(callback, found.get(video_id))
+
+    def _fail(self, batch):
+        for callbacks in batch.values():
+            for callback in callbacks:
+                self._call(callback, LOOKUP_FAILED)
+
+    def _call(self, callback, info):
+        try:
+            callback(info)
+        except Exception as e:
+            logger.error(f"Error in YouTube callback: {e}\n{traceback.format_exc()}")
+
+    def _fetch(self, video_ids):
+        """Call videos.list once for up to 50 IDs; return {video_id: info}, or None if it failed."""
+        today = quota_day()
+        if today != self.quota_day:
+            self.quota_day = today
+            self.quota_used = 0
+            self.quota_exhausted = False
+        if self.quota_exhausted:
+            return None
+        api_key = self.get_api_key()
+        if not api_key:
+            logger.warning("No YouTube API key configured, skipping video lookup")
+            return None
+        self.api_calls += 1
+        self.ids_sent += len(video_ids)
+        self.quota_used += VIDEOS_LIST_COST
+        response = self.http.get(API_URL, timeout=self.timeout, params={
+            'part': API_PARTS,
+            'fields': API_FIELDS,
+            'id': ','.join(video_ids),
+            'key': api_key
+        })
+        if response.status_code != 200:
+            self.api_errors += 1
+            if response.status_code == 403 and 'quotaExceeded' in response.text:
+                self.quota_exhausted = True
+                logger.warning(f"YouTube API quota exhausted for {self.quota_day}")
+            else:
+                logger.warning(f"YouTube API returned {response.status_code} for {len(video_ids)} videos")
+            return None
+        return {item['id']: format_video_info(item) for item in response.json().get('items', [])}
+
+    def shutdown(self):
+        """Stop the batcher; lookups still waiting get LOOKUP_FAILED."""
+        with self.cond:
+            self.closed = True
+            batch, self.pending = self.pending, {}
+            self.cond.notify_all()
+        self._fail(batch)
+
+    def get_stats(self):
+        return {
+            'ids_requested': self.ids_requested,
+            'ids_resolved': self.ids_resolved,
+            'api_calls': self.api_calls,
+            'api_errors': self.api_errors,
+            'ids_per_call': round(self.ids_sent / self.api_calls, 2) if self.api_calls else 0.0,
+            'quota_day': self.quota_day,
+            'quota_used': self.quota_used,
+            'quota_exhausted': self.quota_exhausted
+        }